@@ -0,0 +1,87 @@
+"""Bandwidth and CPU cost of the client audio transport codecs.
+
+Pushes a synthetic utterance (or a PCM file) through each codec this server
+can use, frame by frame as a client would stream it, and reports kbit/s on the
+wire and CPU per session (CPU seconds per second of audio). Codecs whose
+native libraries are missing (libopus, ffmpeg) are reported and skipped; raw
+PCM at 16 kHz mono is 256 kbit/s for reference.
+
+    python -m benchmarks.audio_codecs --seconds 30
+"""
+import argparse
+import time
+
+from benchmarks.fakes import load_pcm, synthetic_utterance
+from voicebot.audio_codecs import MP3, OPUS, PCM, CodecUnavailable, get_codec, supported_codecs
+from voicebot.voicebot import CHUNK_DURATION_MS, RATE
+
+
+def measure_uplink(codec, pcm, frame_bytes):
+    """Encode and decode `pcm` one VAD frame at a time; returns (wire bytes, encode cpu s, decode cpu s)"""
+    wire = 0
+    encode_cpu = 0.0
+    decode_cpu = 0.0
+    for start in range(0, len(pcm) - frame_bytes + 1, frame_bytes):
+        started = time.process_time()
+        packets = codec.encode(pcm[start:start + frame_bytes])
+        encode_cpu += time.process_time() - started
+        for packet in packets:
+            wire += len(packet)
+            started = time.process_time()
+            codec.decode(packet)
+            decode_cpu += time.process_time() - started
+    return wire, encode_cpu, decode_cpu
+
+
+def measure_downlink(codec, mp3):
+    """Encode one synthesized reply; returns (wire bytes, server cpu s)"""
+    started = time.process_time()
+    packets = codec.encode_mp3(mp3)
+    return sum(len(packet) for packet in packets), time.process_time() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=30.0, help="Audio length per codec")
+    parser.add_argument('--pcm', help="16 kHz mono 16-bit .wav or .raw file instead of the synthetic signal")
+    args = parser.parse_args()
+
+    pcm = load_pcm(args.pcm) if args.pcm else synthetic_utterance(args.seconds)
+    audio_seconds = len(pcm) / (RATE * 2)
+    frame_bytes = RATE * CHUNK_DURATION_MS // 1000 * 2
+    print(f"{audio_seconds:.1f}s of audio, {CHUNK_DURATION_MS} ms frames at {RATE} Hz "
+          f"(raw PCM = {RATE * 16 / 1000:.0f} kbit/s)")
+
+    print("uplink (client -> server):")
+    uplink = supported_codecs('uplink')
+    for name in (OPUS, PCM):
+        if name not in uplink:
+            print(f"  {name:>5}: unavailable on this server, skipped")
+            continue
+        wire, encode_cpu, decode_cpu = measure_uplink(get_codec(name, RATE, CHUNK_DURATION_MS), pcm, frame_bytes)
+        print(f"  {name:>5}: {wire * 8 / audio_seconds / 1000:7.1f} kbit/s, "
+              f"server decode {decode_cpu / audio_seconds:.2%} CPU/session, "
+              f"client encode {encode_cpu / audio_seconds:.2%} CPU")
+
+    print("downlink (server -> client):")
+    downlink = supported_codecs('downlink')
+    if MP3 not in downlink or len(downlink) == 1:
+        # Without ffmpeg there is nothing to build a reference MP3 reply from
+        print("  ffmpeg not found: only MP3 passthrough is possible (edge-tts bitrate, zero server CPU)")
+        return
+    mp3 = get_codec(MP3, RATE, CHUNK_DURATION_MS).encode(pcm)[0]
+    for name in (MP3, OPUS, PCM):
+        if name not in downlink:
+            print(f"  {name:>5}: unavailable on this server, skipped")
+            continue
+        try:
+            wire, cpu = measure_downlink(get_codec(name, RATE, CHUNK_DURATION_MS), mp3)
+        except CodecUnavailable as e:
+            print(f"  {name:>5}: {e}")
+            continue
+        print(f"  {name:>5}: {wire * 8 / audio_seconds / 1000:7.1f} kbit/s, "
+              f"server encode {cpu / audio_seconds:.2%} CPU/session")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""Offline stand-ins for the microphone, Google STT, Groq and Edge TTS.
+
+Each fake sleeps for a latency drawn from a configurable distribution so the
+real turn loop in voicebot.voicebot can be driven without network or audio
+hardware.
+"""
+import math
+import random
+import threading
+import time
+import types
+import wave
+
+import numpy as np
+
+RATE = 16000
+
+
+class LatencyDistribution:
+    """Latency sampler parsed from specs like "const:50", "uniform:20,80" or "lognormal:300,0.4" (milliseconds)"""
+
+    def __init__(self, spec):
+        self.spec = spec
+        kind, _, params = spec.partition(':')
+        values = [float(v) for v in params.split(',') if v]
+        if kind == 'const':
+            self._sample = lambda: values[0]
+        elif kind == 'uniform':
+            self._sample = lambda: random.uniform(values[0], values[1])
+        elif kind == 'lognormal':
+            # values: median in ms, sigma of the underlying normal
+            mu, sigma = math.log(values[0]), values[1]
+            self._sample = lambda: random.lognormvariate(mu, sigma)
+        else:
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self):
+        """Draw one latency in seconds"""
+        return max(0.0, self._sample()) / 1000.0
+
+    def sleep(self):
+        time.sleep(self.sample())
+
+
+def load_pcm(path):
+    """Load 16 kHz mono int16 PCM from a .wav or headerless .raw/.pcm file"""
+    if path.endswith('.wav'):
+        with wave.open(path, 'rb') as wav:
+            if wav.getframerate() != RATE or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+                raise ValueError(f"{path} must be 16 kHz mono 16-bit PCM")
+            return wav.readframes(wav.getnframes())
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def synthetic_utterance(duration_s=1.5, seed=0):
+    """Speech-like test signal: amplitude-modulated harmonics with a little noise"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(RATE * duration_s)) / RATE
+    signal = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate((180, 360, 720, 1440)))
+    envelope = 0.5 * (1 + np.sin(2 * np.pi * 4 * t))
+    signal = signal * envelope + 0.05 * rng.standard_normal(t.size)
+    return (signal / np.max(np.abs(signal)) * 12000).astype(np.int16).tobytes()
+
+
+class ReplayAudioStreamer:
+    """AudioStreamer stand-in that replays a PCM utterance as VAD-closed segments.
+
+    The next utterance is only released once the previous turn has finished,
+    like a user waiting for the bot to answer."""
+
+    def __init__(self, pcm, turns, think_time=None, realtime_factor=0.0):
+        self.pcm = pcm
+        self.turns = turns
+        self.think_time = think_time
+        self.realtime_factor = realtime_factor
+        self.dev_mode = False
+        self.is_recording = False
+        self.turn_done = threading.Event()
+        self.turns_sent = 0
+        self.turns_completed = 0
+        self.finished = threading.Event()
+
+    def start_recording(self, stop_event, recorder=None):
+        self.is_recording = True
+        frame_bytes = recorder.frame_bytes if recorder is not None else 0
+        while self.is_recording and not stop_event.is_set() and self.turns_sent < self.turns:
+            # Simulate the user actually speaking the utterance
+            if self.realtime_factor > 0:
+                time.sleep(len(self.pcm) / 2 / RATE * self.realtime_factor)
+            self.turn_done.clear()
+            self.turns_sent += 1
+            if recorder is not None:
+                segment_start = recorder.frames
+                for start in range(0, len(self.pcm) - frame_bytes + 1, frame_bytes):
+                    recorder.append_frame(self.pcm[start:start + frame_bytes])
+                recorder.mark_segment(segment_start, recorder.frames)
+            yield self.pcm
+            while not self.turn_done.wait(0.05):
+                if stop_event.is_set() or not self.is_recording:
+                    return
+            if self.think_time is not None:
+                self.think_time.sleep()
+
+    def complete_turn(self):
+        self.turns_completed += 1
+        self.turn_done.set()
+        if self.turns_completed >= self.turns:
+            self.finished.set()
+
+    def stop_recording(self):
+        self.is_recording = False
+
+    def close(self):
+        pass
+
+
+class FakeTranscriber:
+    def __init__(self, latency, phrases=None):
+        self.latency = latency
+        self.phrases = phrases or [
+            "what can you do",
+            "who made you",
+            "tell me a fun fact about space",
+            "how is the weather usually in Mumbai",
+        ]
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, audio_data):
+        self.latency.sleep()
+        with self._lock:
+            self._count += 1
+            return self.phrases[self._count % len(self.phrases)]
+
+
+class FakeLLMHandler:
+    """Mimics VoicebotHandler.get_groq_response, including its trace marks"""
+
+    def __init__(self, first_token_latency, completion_latency, reply="This is a benchmark reply."):
+        self.first_token_latency = first_token_latency
+        self.completion_latency = completion_latency
+        self.reply = reply
+
+    def get_groq_response(self, messages, trace=None, deadline=None, max_tokens=500):
+        if trace is not None:
+            trace.mark('key_acquire')
+        self.first_token_latency.sleep()
+        if trace is not None:
+            trace.mark('llm_first_token')
+        self.completion_latency.sleep()
+        if trace is not None:
+            trace.mark('llm_done')
+        return f"{self.reply} ({len(messages)} messages so far)"
+
+
+class FakeGroqClient:
+    """Stand-in for groq.Groq with injectable slow and failing streams.
+
+    Pass `FakeGroqClient.factory(...)` as VoicebotHandler's client_factory.
+    `model_speedup` scales latencies per model so fallback models can be faster."""
+
+    def __init__(self, api_key, first_token_latency, token_latency, failure_rate=0.0, slow_rate=0.0,
+                 slow_latency=None, tokens=20, model_speedup=None):
+        self.api_key = api_key
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.tokens = tokens
+        self.model_speedup = model_speedup or {}
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self._create))
+
+    @classmethod
+    def factory(cls, *args, **kwargs):
+        return lambda api_key: cls(api_key, *args, **kwargs)
+
+    def _create(self, messages, model, max_tokens, temperature, stream=False):
+        import groq
+        import httpx
+
+        if random.random() < self.failure_rate:
+            raise groq.APIConnectionError(request=httpx.Request('POST', 'https://api.groq.com/fake'))
+        return _FakeStream(self, model)
+
+
+class _FakeStream:
+    def __init__(self, client, model):
+        self.client = client
+        self.scale = client.model_speedup.get(model, 1.0)
+        self.closed = False
+
+    def __iter__(self):
+        client = self.client
+        if client.slow_latency is not None and random.random() < client.slow_rate:
+            first_token = client.slow_latency.sample()
+        else:
+            first_token = client.first_token_latency.sample()
+        time.sleep(first_token * self.scale)
+        for i in range(client.tokens):
+            if self.closed:
+                return
+            if i:
+                time.sleep(client.token_latency.sample() * self.scale)
+            delta = types.SimpleNamespace(content=f"word{i} ")
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)])
+
+    def close(self):
+        self.closed = True
+
+
+class FakeTTS:
+    """Non-blocking speak() replacement that reports finished turns back to the harness"""
+
+    def __init__(self, first_byte_latency, on_turn_complete=None):
+        self.first_byte_latency = first_byte_latency
+        self.on_turn_complete = on_turn_complete
+
+    def __call__(self, text, trace=None, session_id=None):
+        if trace is not None:
+            trace.mark('normalize')
+        threading.Thread(target=self._play, args=(text, trace), daemon=True).start()
+
+    def _play(self, text, trace):
+        self.first_byte_latency.sleep()
+        if trace is not None:
+            trace.mark('tts_first_byte')
+            trace.mark('playback_start')
+            trace.finish()
+        if self.on_turn_complete is not None:
+            self.on_turn_complete(trace)
+
+
+class FakeCollection:
+    """Local stand-in for a pymongo collection; insert_many sleeps to simulate a slow database"""
+
+    def __init__(self, insert_latency, failure_rate=0.0):
+        self.insert_latency = insert_latency
+        self.failure_rate = failure_rate
+        self.documents = []
+        self.batches = 0
+        self._lock = threading.Lock()
+
+    def insert_many(self, documents, ordered=True):
+        self.insert_latency.sleep()
+        if random.random() < self.failure_rate:
+            raise ConnectionError("fake database unavailable")
+        with self._lock:
+            self.documents.extend(documents)
+            self.batches += 1
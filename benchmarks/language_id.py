@@ -0,0 +1,57 @@
+"""Speed of reply language identification.
+
+Times the single-pass script counter in voicebot.language_id against the
+regex-based detector it replaced over the labelled English / Hindi /
+Hinglish corpus of the tests, plus the O(1) per-session path for short
+replies. Accuracy on that corpus is checked by tests/test_language_id.py.
+
+    python -m benchmarks.language_id
+"""
+import re
+import timeit
+
+from tests.test_language_id import LABELLED_CORPUS
+from voicebot.language_id import LanguageIdentifier, classify_text
+
+
+def legacy_detect_hinglish(text):
+    """The word-set detector previously used by voicebot.tts.speak"""
+    english_words = set(re.findall(r'\b[a-zA-Z]+\b', text.lower()))
+    hindi_words = set(re.findall(r'\b[ऀ-ॿ]+\b', text))
+
+    if english_words and hindi_words:
+        return 'hinglish'
+    elif hindi_words:
+        return 'hi'
+    else:
+        return 'en'
+
+
+def time_per_call_us(function, calls=2000):
+    """Best-of-5 microseconds per call over the corpus texts"""
+    texts = [text for text, _ in LABELLED_CORPUS]
+    loops = max(1, calls // len(texts))
+
+    def run():
+        for text in texts:
+            function(text)
+
+    best = min(timeit.repeat(run, number=loops, repeat=5))
+    return best / (loops * len(texts)) * 1e6
+
+
+def main():
+    for name, detector in (('script counter', classify_text), ('legacy regex', legacy_detect_hinglish)):
+        print(f"{name:>16}: {time_per_call_us(detector):.1f} us/call")
+
+    identifier = LanguageIdentifier()
+    identifier.detect("नमस्ते! मैं आपकी कैसे मदद कर सकता हूँ? आज हम किस बारे में बात करें?", session_id='bench')
+    short_reply_us = time_per_call_us(lambda text: identifier.detect("ठीक है!", session_id='bench'))
+    long_reply = " ".join(text for text, _ in LABELLED_CORPUS)
+    long_reply_us = time_per_call_us(lambda text: identifier.detect(long_reply, session_id='bench'), calls=200)
+    print(f"{'session cache':>16}: short reply {short_reply_us:.2f} us/call, "
+          f"{len(long_reply)}-char reply {long_reply_us:.1f} us/call")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Graceful degradation of the voice turn loop under overload.
+
+Runs the turn loop harness twice, with the overload controller off and on, in
+a setup that is overloaded on purpose: slow TTS first bytes and fewer LLM
+slots than sessions. A second wave of sessions asks to start recording while
+the first is in full swing. The report shows the turn latencies, how many
+turns were served degraded (shorter LLM calls, text-only replies) and how
+many late sessions were refused with an 'overloaded' event.
+
+    python -m benchmarks.overload --sessions 16 --late-sessions 8
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from benchmarks.fakes import load_pcm, synthetic_utterance
+from benchmarks.turn_loop import add_backend_arguments, build_app, make_backends
+
+
+def run_mode(args, pcm, controlled):
+    from voicebot.overload import LEVEL_NAMES, degraded_turns_total
+    from voicebot.tracing import remove_turn_hook
+
+    args.no_overload_control = not controlled
+    harness = make_backends(args, pcm)
+    # Quick to react and slow to recover, so a short run shows every step
+    harness.overload.eval_interval = 0.1
+    harness.overload.recovery = args.timeout
+    app, socketio = build_app(harness.backends)
+    degraded_before = {name: degraded_turns_total.value(level=name) for name in LEVEL_NAMES[1:]}
+
+    started = time.perf_counter()
+    clients = [socketio.test_client(app) for _ in range(args.sessions)]
+    for client in clients:
+        client.emit('start_recording')
+    time.sleep(args.late_after)
+    late_clients = [socketio.test_client(app) for _ in range(args.late_sessions)]
+    for client in late_clients:
+        client.emit('start_recording')
+
+    deadline = started + args.timeout
+    # Streamers are created on connect, so they are in client order
+    streamers = list(harness.streamers.values())
+    refused = 0
+    for client, streamer in zip(late_clients, streamers[len(clients):]):
+        if any(packet['name'] == 'overloaded' for packet in client.get_received()):
+            refused += 1
+            streamers.remove(streamer)
+    for streamer in streamers:
+        streamer.finished.wait(max(0.0, deadline - time.perf_counter()))
+    elapsed = time.perf_counter() - started
+
+    text_only = 0
+    for client in clients + late_clients:
+        for packet in client.get_received():
+            payload = packet['args'][0] if isinstance(packet['args'], list) else packet['args']
+            if packet['name'] == 'message' and payload.get('textOnly'):
+                text_only += 1
+        client.emit('stop_recording')
+        client.disconnect()
+    harness.recorder.close()
+    remove_turn_hook(harness.on_turn_complete)
+
+    latencies = harness.latencies
+    p50, p95 = np.percentile(latencies, [50, 95]) * 1000 if latencies else (float('nan'), float('nan'))
+    expected = (args.sessions + args.late_sessions - refused) * args.turns
+    return {
+        'mode': 'controlled' if controlled else 'uncontrolled',
+        'turns': len(latencies),
+        'expected_turns': expected,
+        'p50_ms': p50,
+        'p95_ms': p95,
+        'turns_per_s': len(latencies) / elapsed if elapsed else 0.0,
+        'degraded': sum(degraded_turns_total.value(level=name) - before for name, before in degraded_before.items()),
+        'text_only': text_only,
+        'refused': refused,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=16)
+    parser.add_argument('--late-sessions', type=int, default=8, help='sessions that start once the first wave is busy')
+    parser.add_argument('--late-after', type=float, default=4.0, help='seconds before the late sessions start')
+    add_backend_arguments(parser)
+    parser.set_defaults(turns=6, tts_latency='lognormal:2500,0.3', llm_concurrency=2, timeout=120.0)
+    args = parser.parse_args()
+
+    pcm = load_pcm(args.pcm) if args.pcm else synthetic_utterance()
+    print(f"{args.sessions} sessions + {args.late_sessions} late, {args.llm_concurrency} LLM slots, "
+          f"TTS first byte {args.tts_latency}")
+
+    header = (f"{'mode':>12} {'turns':>9} {'p50 ms':>8} {'p95 ms':>8} {'turns/s':>8} {'degraded':>9} "
+              f"{'text-only':>9} {'refused':>8}")
+    print(header)
+    print('-' * len(header))
+    for controlled in (False, True):
+        result = run_mode(args, pcm, controlled)
+        print(f"{result['mode']:>12} {result['turns']:>4}/{result['expected_turns']:<4} {result['p50_ms']:>8.1f} "
+              f"{result['p95_ms']:>8.1f} {result['turns_per_s']:>8.2f} {result['degraded']:>9.0f} "
+              f"{result['text_only']:>9} {result['refused']:>8}")
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('SLOW_TURN_THRESHOLD_SECONDS', '1e9')
+    main()
@@ -0,0 +1,94 @@
+"""Cost of the on-demand sampling profiler.
+
+Runs a CPU-bound stand-in for the reply path (filter_text and the rest of
+the TTS normalization chain) on worker threads, next to idle threads
+parked on queues like the per-session processors, and measures the
+workload's throughput without the profiler and while it samples at each
+interval. Also prints the hottest frames, as seen in the profile. With
+several busy workers the sampler mostly catches them where they hand over
+the GIL (e.g. waiting on a metric's lock), so the default is one.
+
+    python -m benchmarks.profiler --seconds 3 --intervals-ms 10,1
+"""
+import argparse
+import queue
+import threading
+import time
+from collections import Counter
+
+from voicebot.profiler import SamplingProfiler
+from voicebot.tts import context_aware_replace, filter_text, group_words, improve_pronunciation
+
+REPLY = ("In ML and AI we use APIs for NLP tasks; see https://www.example.com/docs for 3 + 4 examples "
+         "of machine learning and natural language processing, okay?")
+
+
+def normalize(text):
+    text = filter_text(text)
+    text = context_aware_replace(text, 'en')
+    text = improve_pronunciation(text, 'en')
+    return group_words(text)
+
+
+def run_workload(seconds, workers, profile=None):
+    """Replies normalized per second across `workers` threads, optionally while `profile()` runs"""
+    stop = threading.Event()
+    counts = [0] * workers
+
+    def work(index):
+        while not stop.is_set():
+            normalize(REPLY)
+            counts[index] += 1
+
+    threads = [threading.Thread(target=work, args=(i,), name=f'worker-{i}', daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    result = profile() if profile else time.sleep(seconds)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / elapsed, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--workers', type=int, default=1, help='CPU-bound threads')
+    parser.add_argument('--idle-threads', type=int, default=32, help='threads blocked on queues')
+    parser.add_argument('--intervals-ms', default='10,1', help='sampling intervals to compare')
+    args = parser.parse_args()
+
+    idle = queue.Queue()
+    for i in range(args.idle_threads):
+        threading.Thread(target=idle.get, name=f'idle-{i}', daemon=True).start()
+
+    baseline, _ = run_workload(args.seconds, args.workers)
+    print(f"{args.workers} busy + {args.idle_threads} idle threads, baseline {baseline:.0f} replies/s")
+    header = f"{'interval':>8} {'samples':>8} {'us/sample':>10} {'sampling':>9} {'replies/s':>10} {'slowdown':>9}"
+    print(header)
+    print('-' * len(header))
+
+    profiler = SamplingProfiler()
+    last = None
+    for interval_ms in [float(ms) for ms in args.intervals_ms.split(',')]:
+        throughput, last = run_workload(args.seconds, args.workers,
+                                        lambda: profiler.profile(args.seconds, interval_ms / 1000))
+        per_sample_us = last.overhead_seconds / last.samples * 1e6 if last.samples else 0.0
+        print(f"{interval_ms:>6g}ms {last.samples:>8} {per_sample_us:>10.1f} "
+              f"{last.overhead_seconds / last.seconds:>8.2%} {throughput:>10.0f} {1 - throughput / baseline:>8.1%}")
+
+    if last is not None:
+        # Self time: samples where the function was the innermost frame
+        leaves = Counter()
+        for stack, count in last.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        print("hottest frames in the last profile:")
+        for frame, count in leaves.most_common(5):
+            print(f"  {count / total:>6.1%}  {frame}")
+
+
+if __name__ == '__main__':
+    main()
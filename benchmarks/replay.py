@@ -0,0 +1,82 @@
+"""Throughput of session audio replay through continuous_stt.
+
+Records a synthetic session (utterances separated by silence) with
+SessionAudioRecorder through AudioStreamer's own VAD loop. It then replays
+the recording through continuous_stt (VAD, enhance_audio and a zero-latency
+fake STT) at each requested speed, and reports how many times faster than
+real time the pipeline runs and whether every recorded segment comes back.
+
+    python -m benchmarks.replay --utterances 20 --speeds 0,10
+"""
+import argparse
+import shutil
+import tempfile
+import threading
+import time
+
+from benchmarks.fakes import FakeTranscriber, LatencyDistribution, load_pcm, synthetic_utterance
+from voicebot.capture import FrameRingBuffer, SyntheticStreamSource
+from voicebot.session_audio import SessionAudioRecorder, replay_session
+from voicebot.voicebot import CHUNK_DURATION_MS, CHUNK_SIZE, RATE, AudioStreamer
+
+
+def record_session(pcm, directory):
+    """Run `pcm` through the VAD loop with a recorder attached; returns the recording path"""
+    frames = len(pcm) // (CHUNK_SIZE * 2)
+    # Big enough to hold the whole session, so producing faster than real time drops nothing
+    ring = FrameRingBuffer(CHUNK_SIZE, frames + 1)
+    source = SyntheticStreamSource(pcm, ring.callback, RATE, CHUNK_SIZE, speed=0)
+    streamer = AudioStreamer(stream=source, ring=ring)
+    recorder = SessionAudioRecorder(directory, 'bench', RATE, CHUNK_SIZE * 2)
+    stop_event = threading.Event()
+
+    def feed_then_stop():
+        # The VAD loop skips frames captured before it started, so the source waits until it is reading
+        while not streamer.is_recording:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        source.start()
+        source.finished.wait()
+        while ring.pending:
+            time.sleep(0.01)
+        stop_event.set()
+
+    threading.Thread(target=feed_then_stop, daemon=True).start()
+    utterances = sum(1 for _ in streamer.start_recording(stop_event, recorder=recorder))
+    recorder.close()
+    return recorder.audio_path, utterances, recorder.length
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--utterances', type=int, default=20)
+    parser.add_argument('--pcm', help='16 kHz mono 16-bit .wav or .raw utterance to use instead of the synthetic one')
+    parser.add_argument('--speeds', default='0,10', help='replay speeds relative to real time; 0 = unthrottled')
+    parser.add_argument('--stt-latency', default='const:0', help='fake STT latency during replay')
+    args = parser.parse_args()
+
+    utterance = load_pcm(args.pcm) if args.pcm else synthetic_utterance(1.5)
+    silence = bytes(RATE * 2)
+    pcm = (silence + utterance) * args.utterances + silence
+
+    directory = tempfile.mkdtemp(prefix='voicebot-replay-')
+    try:
+        audio_path, detected, length = record_session(pcm, directory)
+        print(f"recorded {length / 2 / RATE:.1f}s ({length / 1024:.0f} KiB) with {detected} segments "
+              f"in {CHUNK_DURATION_MS} ms frames")
+
+        header = f"{'speed':>7} {'audio s':>8} {'wall s':>7} {'x realtime':>10} {'segments':>9}"
+        print(header)
+        print('-' * len(header))
+        for speed in [float(s) for s in args.speeds.split(',')]:
+            transcripts, stats = replay_session(audio_path, FakeTranscriber(LatencyDistribution(args.stt_latency)),
+                                                speed=speed)
+            label = 'max' if speed == 0 else f"{speed:g}x"
+            print(f"{label:>7} {stats['audio_seconds']:>8.1f} {stats['wall_seconds']:>7.2f} "
+                  f"{stats['realtime_factor']:>10.1f} {len(transcripts):>4}/{stats['recorded_segments']:<4}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
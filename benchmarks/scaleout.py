@@ -0,0 +1,147 @@
+"""Multi-worker scale-out of the voice turn loop.
+
+Starts N worker processes, each a real Socket.IO server (threading mode,
+fake STT/LLM/TTS backends) on its own port, and connects real Socket.IO
+clients to them round-robin, the way a sticky load balancer would. The number
+of sessions per worker is fixed, so aggregate turns/s should grow roughly
+linearly with the worker count until the machine runs out of cores.
+
+Emits go through the pub/sub backend given by --message-queue:
+local://<channel> (the in-process stand-in, one bus per worker) or a real
+queue such as redis://localhost:6379/0 shared by all workers.
+
+Needs the Socket.IO client extras: pip install "python-socketio[client]"
+
+    python -m benchmarks.scaleout --workers 1,2,4 --sessions-per-worker 8
+"""
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+from benchmarks.fakes import load_pcm, synthetic_utterance
+from benchmarks.turn_loop import add_backend_arguments, build_app, make_backends
+
+
+def serve_worker(port, n_sessions, args, pcm, results):
+    """Worker process: serve until `n_sessions` sessions have finished their turns, then report"""
+    os.environ['SLOW_TURN_THRESHOLD_SECONDS'] = '1e9'
+    harness = make_backends(args, pcm)
+    started = []
+    harness.backends.audio_streamer_factory = _recording_start(harness.backends.audio_streamer_factory, started)
+    app, socketio = build_app(harness.backends, args.message_queue)
+
+    threading.Thread(target=socketio.run, args=(app,),
+                     kwargs={'host': '127.0.0.1', 'port': port, 'log_output': False,
+                             'allow_unsafe_werkzeug': True},
+                     daemon=True).start()
+
+    deadline = time.time() + args.timeout
+    while len(harness.streamers) < n_sessions and time.time() < deadline:
+        time.sleep(0.05)
+    for streamer in list(harness.streamers.values()):
+        streamer.finished.wait(max(0.0, deadline - time.time()))
+    results.put({
+        'port': port,
+        'first_connect': min(started) if started else time.time(),
+        'finished': time.time(),
+        'latencies': list(harness.latencies),
+        'expected_turns': n_sessions * args.turns,
+    })
+    harness.recorder.close()
+
+
+def _recording_start(factory, started):
+    """Wrap the streamer factory to note when each session connected"""
+    def wrapped(session_id):
+        started.append(time.time())
+        return factory(session_id)
+    return wrapped
+
+
+def wait_until_serving(port, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"worker on port {port} did not start")
+
+
+def run_workers(n_workers, args, pcm):
+    import socketio
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    ports = [args.base_port + i for i in range(n_workers)]
+    workers = [context.Process(target=serve_worker, args=(port, args.sessions_per_worker, args, pcm, results),
+                               daemon=True) for port in ports]
+    for worker in workers:
+        worker.start()
+    for port in ports:
+        wait_until_serving(port)
+
+    clients = []
+    for i in range(n_workers * args.sessions_per_worker):
+        # Sticky placement: a session talks to one worker for its whole life
+        client = socketio.Client()
+        client.connect(f'http://127.0.0.1:{ports[i % n_workers]}', transports=['websocket'])
+        clients.append(client)
+    for client in clients:
+        client.emit('start_recording')
+
+    reports = [results.get(timeout=args.timeout + 30) for _ in workers]
+    for client in clients:
+        client.disconnect()
+    for worker in workers:
+        worker.terminate()
+        worker.join()
+
+    latencies = [latency for report in reports for latency in report['latencies']]
+    elapsed = max(report['finished'] for report in reports) - min(report['first_connect'] for report in reports)
+    p50, p95 = np.percentile(latencies, [50, 95]) * 1000 if latencies else (float('nan'), float('nan'))
+    return {
+        'workers': n_workers,
+        'sessions': len(clients),
+        'turns': len(latencies),
+        'expected_turns': sum(report['expected_turns'] for report in reports),
+        'p50_ms': p50,
+        'p95_ms': p95,
+        'turns_per_s': len(latencies) / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='1,2,4', help='comma-separated worker counts')
+    parser.add_argument('--sessions-per-worker', type=int, default=8)
+    parser.add_argument('--message-queue', default='local://voicebot-bench',
+                        help='pub/sub backend for emits: local://<channel> or a redis:// / amqp:// URL')
+    parser.add_argument('--base-port', type=int, default=18080)
+    add_backend_arguments(parser)
+    args = parser.parse_args()
+
+    pcm = load_pcm(args.pcm) if args.pcm else synthetic_utterance()
+    print(f"{os.cpu_count()} CPU(s); sessions are CPU-bound in enhance_audio, so scaling flattens past that")
+
+    header = f"{'workers':>7} {'sessions':>8} {'turns':>9} {'p50 ms':>8} {'p95 ms':>8} {'turns/s':>8} {'scaling':>8}"
+    print(header)
+    print('-' * len(header))
+    baseline = None
+    for n_workers in [int(n) for n in args.workers.split(',')]:
+        result = run_workers(n_workers, args, pcm)
+        per_worker = result['turns_per_s'] / n_workers
+        baseline = baseline or per_worker
+        print(f"{result['workers']:>7} {result['sessions']:>8} {result['turns']:>4}/{result['expected_turns']:<4} "
+              f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['turns_per_s']:>8.2f} "
+              f"{per_worker / baseline:>7.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Cold-start cost of the app: import time and first-request latency.
+
+Each run is a fresh interpreter that imports main, then times the first HTTP
+request, the first Socket.IO connect and (with --warmup) the /warmup endpoint
+that pre-initializes the lazily loaded subsystems. Login is disabled in the
+child so no user lookup is made; the database is only contacted if it is
+listed in --subsystems.
+
+    python -m benchmarks.startup --runs 5 --warmup
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ('pygame', 'speech_recognition', 'sounddevice', 'pydub', 'edge_tts', 'groq', 'webrtcvad',
+                 'opuslib', 'pymongo')
+
+CHILD = r'''
+import json, sys, time
+started = time.perf_counter()
+import main
+result = {'import_s': time.perf_counter() - started,
+          'loaded_at_import': [m for m in HEAVY_MODULES if m in sys.modules]}
+main.app.config['LOGIN_DISABLED'] = True
+
+if WARMUP:
+    started = time.perf_counter()
+    response = main.app.test_client().post('/warmup?subsystems=' + SUBSYSTEMS)
+    result['warmup_s'] = time.perf_counter() - started
+    result['warmup'] = response.get_json()
+
+started = time.perf_counter()
+main.app.test_client().get('/metrics')
+result['first_http_s'] = time.perf_counter() - started
+
+started = time.perf_counter()
+client = main.socketio.test_client(main.app)
+result['first_connect_s'] = time.perf_counter() - started
+client.disconnect()
+print('RESULT ' + json.dumps(result))
+'''
+
+
+def run_child(warmup, subsystems):
+    code = (f"HEAVY_MODULES = {HEAVY_MODULES!r}\nWARMUP = {warmup!r}\nSUBSYSTEMS = {subsystems!r}\n" + CHILD)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, timeout=300)
+    for line in output.stdout.splitlines():
+        if line.startswith('RESULT '):
+            return json.loads(line[len('RESULT '):])
+    raise RuntimeError(f"startup run failed:\n{output.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per configuration')
+    parser.add_argument('--warmup', action='store_true', help='also measure with /warmup called before traffic')
+    parser.add_argument('--subsystems', default='llm,stt,tts,audio_device',
+                        help='subsystems passed to /warmup (add "database" to include the Atlas connect)')
+    args = parser.parse_args()
+
+    configurations = [('lazy', False)] + ([('warmed', True)] if args.warmup else [])
+    for name, warmup in configurations:
+        runs = [run_child(warmup, args.subsystems) for _ in range(args.runs)]
+        median_ms = {key: statistics.median(run[key] for run in runs) * 1000
+                     for key in ('import_s', 'first_http_s', 'first_connect_s', 'warmup_s') if key in runs[0]}
+        print(f"{name}: " + ', '.join(f"{key[:-2]} {value:.0f} ms" for key, value in median_ms.items()))
+        print(f"{'':>{len(name) + 2}}heavy modules loaded by import: {', '.join(runs[0]['loaded_at_import']) or 'none'}")
+        for subsystem, result in (runs[0].get('warmup') or {}).items():
+            status = f"{result['seconds'] * 1000:.0f} ms" if result['ok'] else f"failed: {result['error']}"
+            print(f"{'':>{len(name) + 2}}warm-up {subsystem}: {status}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+"""End-to-end offline benchmark of the voice turn loop.
+
+Drives setup_voicebot_routes through Flask-SocketIO test clients with fake
+STT, LLM and TTS backends and reports turn latency percentiles, throughput,
+thread count and RSS as the number of concurrent sessions grows.
+
+    python -m benchmarks.turn_loop --sessions 1,4,16 --turns 10
+"""
+import argparse
+import os
+import resource
+import threading
+import time
+import types
+
+import numpy as np
+
+from benchmarks.fakes import (FakeCollection, FakeGroqClient, FakeLLMHandler, FakeTTS, FakeTranscriber,
+                              LatencyDistribution, ReplayAudioStreamer, load_pcm, synthetic_utterance)
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Peak RSS is the best we can do off Linux (kB on Linux, bytes on macOS)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class ResourceSampler(threading.Thread):
+    """Samples thread count and RSS in the background, keeping the peaks"""
+
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak_threads = 0
+        self.peak_rss_mb = 0.0
+        self._stop_sampling = threading.Event()
+
+    def run(self):
+        while not self._stop_sampling.is_set():
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            self.peak_rss_mb = max(self.peak_rss_mb, current_rss_mb())
+            self._stop_sampling.wait(self.interval)
+
+    def stop(self):
+        self._stop_sampling.set()
+        self.join()
+
+
+def build_app(backends, message_queue=None):
+    from flask import Flask
+    from flask_socketio import SocketIO
+    from voicebot.scaleout import socketio_options
+    from voicebot.voicebot import setup_voicebot_routes
+
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'benchmark'
+    app.config['LOGIN_DISABLED'] = True
+    socketio = SocketIO(app, async_mode='threading', **socketio_options(message_queue))
+    setup_voicebot_routes(app, socketio, backends)
+    return app, socketio
+
+
+def make_backends(args, pcm):
+    """Fake-backed VoicebotBackends plus the per-session streamers and turn latencies they fill in"""
+    from voicebot.voicebot import VoicebotBackends, VoicebotHandler, FALLBACK_MODEL
+    from voicebot.llm_scheduler import LLMScheduler
+    from voicebot.overload import OverloadController
+    from voicebot.tracing import add_turn_hook
+    from voicebot.turn_recorder import TurnRecorder
+
+    streamers = {}
+    latencies = []
+    lock = threading.Lock()
+
+    def on_turn_complete(trace):
+        # Every finished trace, spoken or (when overloaded) text-only
+        streamer = streamers.get(trace.session_id)
+        if streamer is None:
+            return
+        with lock:
+            latencies.append(trace.duration)
+        streamer.complete_turn()
+
+    def make_streamer(session_id):
+        streamer = ReplayAudioStreamer(pcm, args.turns, LatencyDistribution(args.think_latency), args.realtime_factor)
+        streamers[session_id] = streamer
+        return streamer
+
+    if args.fake_groq_client:
+        # Exercise the real handler (hedging, fallback, backoff) against an injected client
+        client_factory = FakeGroqClient.factory(
+            LatencyDistribution(args.llm_first_token_latency), LatencyDistribution(args.llm_token_latency),
+            failure_rate=args.llm_failure_rate, slow_rate=args.llm_slow_rate,
+            slow_latency=LatencyDistribution(args.llm_slow_latency),
+            model_speedup={FALLBACK_MODEL: 0.4})
+        llm_handler_factory = lambda: VoicebotHandler(client_factory=client_factory)
+    else:
+        llm_handler_factory = lambda: FakeLLMHandler(LatencyDistribution(args.llm_first_token_latency),
+                                                     LatencyDistribution(args.llm_completion_latency))
+
+    collection = FakeCollection(LatencyDistribution(args.db_latency))
+    recorder = TurnRecorder(collection_factory=lambda: collection, batch_size=args.db_batch_size,
+                            flush_interval=1.0).start()
+
+    scheduler = LLMScheduler(args.llm_concurrency, queue_timeout=args.llm_queue_timeout)
+    overload = OverloadController(scheduler, enabled=not args.no_overload_control)
+    add_turn_hook(on_turn_complete)
+
+    backends = VoicebotBackends(
+        transcribe=FakeTranscriber(LatencyDistribution(args.stt_latency)),
+        llm_handler_factory=llm_handler_factory,
+        tts=FakeTTS(LatencyDistribution(args.tts_latency)),
+        audio_streamer_factory=make_streamer,
+        scheduler=scheduler,
+        recorder=recorder,
+        overload=overload,
+    )
+    return types.SimpleNamespace(backends=backends, streamers=streamers, latencies=latencies,
+                                 collection=collection, recorder=recorder, overload=overload,
+                                 on_turn_complete=on_turn_complete)
+
+
+def run_once(n_sessions, args, pcm):
+    from voicebot.tracing import remove_turn_hook
+
+    harness = make_backends(args, pcm)
+    streamers, latencies, collection, recorder = (harness.streamers, harness.latencies, harness.collection,
+                                                  harness.recorder)
+    app, socketio = build_app(harness.backends)
+
+    sampler = ResourceSampler()
+    sampler.start()
+    started = time.perf_counter()
+
+    clients = [socketio.test_client(app) for _ in range(n_sessions)]
+    for client in clients:
+        client.emit('start_recording')
+
+    deadline = started + args.timeout
+    for streamer in list(streamers.values()):
+        streamer.finished.wait(max(0.0, deadline - time.perf_counter()))
+    elapsed = time.perf_counter() - started
+
+    bot_messages = 0
+    for client in clients:
+        for packet in client.get_received():
+            payload = packet['args'][0] if isinstance(packet['args'], list) else packet['args']
+            if packet['name'] == 'message' and not payload['isUser']:
+                bot_messages += 1
+        client.emit('stop_recording')
+        client.disconnect()
+    sampler.stop()
+    recorder.close()
+    remove_turn_hook(harness.on_turn_complete)
+
+    completed = len(latencies)
+    expected = n_sessions * args.turns
+    percentiles = np.percentile(latencies, [50, 95, 99]) * 1000 if latencies else [float('nan')] * 3
+    return {
+        'sessions': n_sessions,
+        'turns': completed,
+        'expected_turns': expected,
+        'bot_messages': bot_messages,
+        'p50_ms': percentiles[0],
+        'p95_ms': percentiles[1],
+        'p99_ms': percentiles[2],
+        'turns_per_s': completed / elapsed if elapsed else 0.0,
+        'peak_threads': sampler.peak_threads,
+        'peak_rss_mb': sampler.peak_rss_mb,
+        'persisted_turns': len(collection.documents),
+        'dropped_turns': recorder.dropped,
+    }
+
+
+def add_backend_arguments(parser):
+    """Fake backend latencies and limits, shared with benchmarks.scaleout"""
+    parser.add_argument('--turns', type=int, default=5, help='turns per session')
+    parser.add_argument('--pcm', help='recorded 16 kHz mono int16 PCM (.wav or .raw) to replay')
+    parser.add_argument('--stt-latency', default='lognormal:400,0.3')
+    parser.add_argument('--llm-first-token-latency', default='lognormal:350,0.5')
+    parser.add_argument('--llm-completion-latency', default='lognormal:250,0.4')
+    parser.add_argument('--fake-groq-client', action='store_true',
+                        help='run the real VoicebotHandler against a fake Groq client instead of a fake handler')
+    parser.add_argument('--llm-token-latency', default='const:10', help='per-token latency with --fake-groq-client')
+    parser.add_argument('--llm-failure-rate', type=float, default=0.0, help='fraction of fake Groq calls that fail')
+    parser.add_argument('--llm-slow-rate', type=float, default=0.0, help='fraction of fake Groq calls that stall')
+    parser.add_argument('--llm-slow-latency', default='const:5000', help='first-token latency of stalled calls')
+    parser.add_argument('--tts-latency', default='lognormal:300,0.3')
+    parser.add_argument('--llm-concurrency', type=int, default=64, help='LLM scheduler concurrency cap')
+    parser.add_argument('--llm-queue-timeout', type=float, default=8.0, help='seconds before the canned busy reply')
+    parser.add_argument('--no-overload-control', action='store_true',
+                        help='never degrade replies or refuse sessions, however loaded')
+    parser.add_argument('--db-latency', default='const:20', help='insert_many latency of the fake MongoDB collection')
+    parser.add_argument('--db-batch-size', type=int, default=50)
+    parser.add_argument('--think-latency', default='const:0', help='pause between a reply and the next utterance')
+    parser.add_argument('--realtime-factor', type=float, default=0.0,
+                        help='1.0 replays audio in real time before each VAD close, 0 disables pacing')
+    parser.add_argument('--timeout', type=float, default=300.0, help='per-run timeout in seconds')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', default='1,2,4,8,16', help='comma-separated concurrent session counts')
+    add_backend_arguments(parser)
+    args = parser.parse_args()
+
+    pcm = load_pcm(args.pcm) if args.pcm else synthetic_utterance()
+
+    header = f"{'sessions':>8} {'turns':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'turns/s':>8} {'threads':>8} {'rss MB':>8}"
+    print(header)
+    print('-' * len(header))
+    for n_sessions in [int(n) for n in args.sessions.split(',')]:
+        result = run_once(n_sessions, args, pcm)
+        print(f"{result['sessions']:>8} {result['turns']:>4}/{result['expected_turns']:<4} "
+              f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} "
+              f"{result['turns_per_s']:>8.2f} {result['peak_threads']:>8} {result['peak_rss_mb']:>8.1f}")
+        if result['persisted_turns'] + result['dropped_turns'] < result['turns']:
+            print(f"         warning: only {result['persisted_turns']} turns persisted, {result['dropped_turns']} dropped")
+        if result['bot_messages'] < result['turns']:
+            print(f"         warning: clients saw {result['bot_messages']} bot messages for {result['turns']} turns")
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('SLOW_TURN_THRESHOLD_SECONDS', '1e9')
+    main()
@@ -2,6 +2,7 @@ from pymongo import MongoClient
 from dotenv import load_dotenv
 import os
 import time
+import threading
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
 
 load_dotenv()
@@ -18,7 +19,8 @@ class DatabaseManager:
         return cls._instance
     
     def __init__(self):
-        self.connect()
+        # Connect on first use, so importing the app needs no network
+        pass
     
     def connect(self, max_retries=3, retry_delay=5):
         """Connect to MongoDB with retry mechanism"""
@@ -45,7 +47,9 @@ class DatabaseManager:
                     raise
     
     def get_database(self):
-        """Get database connection, reconnecting if necessary"""
+        """Get database connection, connecting or reconnecting if necessary"""
+        if self._client is None:
+            return self.connect()
         try:
             # Test if connection is still alive
             self._client.admin.command('ping')
@@ -68,5 +72,26 @@ db_manager = DatabaseManager.get_instance()
 def get_database():
     return db_manager.get_database()
 
-# Initialize database connection
-db = get_database()
\ No newline at end of file
+
+class LazyDatabase:
+    """Stands in for the pymongo Database and connects on first attribute access"""
+
+    def __init__(self):
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _resolve(self):
+        with self._lock:
+            if self._db is None:
+                self._db = get_database()
+            return self._db
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __getitem__(self, name):
+        return self._resolve()[name]
+
+
+# Database handle; no connection is made until it is used
+db = LazyDatabase()
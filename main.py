@@ -2,6 +2,7 @@ from flask import Flask, render_template, request, jsonify, session, redirect, u
 from flask_socketio import SocketIO
 from flask_cors import CORS
 from voicebot.voicebot import setup_voicebot_routes
+from voicebot.scaleout import socketio_options
 from config.user import User
 from config.database import db
 from functools import wraps
@@ -19,8 +20,8 @@ CORS(app, resources={
     }
 })
 
-# Initialize socketio with CORS settings
-socketio = SocketIO(app, cors_allowed_origins="*")  # In production, replace with your actual domain
+# Initialize socketio with CORS settings; SOCKETIO_MESSAGE_QUEUE enables multi-worker deployments
+socketio = SocketIO(app, cors_allowed_origins="*", **socketio_options())  # In production, replace with your actual domain
 
 
 def validate_user(f):
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from voicebot.capture import FrameRingBuffer, RingBusy, captured_frames_total, dropped_frames_total
+
+
+def frame(value, samples=4):
+    return np.full(samples, value, dtype=np.int16)
+
+
+def test_full_ring_drops_new_frames_instead_of_overwriting():
+    ring = FrameRingBuffer(frame_samples=4, capacity_frames=2)
+    for value in (1, 2, 3):
+        ring.write(frame(value))
+
+    assert ring.dropped == 1
+    assert np.frombuffer(ring.read_frame(), dtype=np.int16)[0] == 1
+    assert np.frombuffer(ring.read_frame(), dtype=np.int16)[0] == 2
+    assert ring.read_frame(timeout=0) is None
+
+
+def test_consumer_starts_at_the_newest_frame_without_reporting_idle_drops():
+    ring = FrameRingBuffer(frame_samples=4, capacity_frames=4)
+    captured_before = captured_frames_total.value()
+    dropped_before = dropped_frames_total.value(reason='ring_full')
+    overflows_before = dropped_frames_total.value(reason='input_overflow')
+    # Nobody is recording: the callback fills the ring and then drops
+    for value in range(10):
+        ring.callback(frame(value).reshape(-1, 1), 4, None, type('Status', (), {'input_overflow': True})())
+
+    ring.discard_pending()
+    assert ring.pending == 0
+    assert ring.read_frame(timeout=0) is None
+
+    ring.write(frame(42))
+    assert np.frombuffer(ring.read_frame(), dtype=np.int16)[0] == 42
+    ring.write(frame(43))
+    ring.write(frame(44))
+    assert ring.read_frame() is not None and ring.read_frame() is not None
+    ring.release_all()
+    assert ring.read_frame(timeout=0) is None
+    assert captured_frames_total.value() == captured_before + 3
+    assert dropped_frames_total.value(reason='ring_full') == dropped_before
+    assert dropped_frames_total.value(reason='input_overflow') == overflows_before
+
+
+def test_ring_refuses_a_second_consumer():
+    ring = FrameRingBuffer(frame_samples=4, capacity_frames=4)
+    ring.attach_consumer()
+    with pytest.raises(RingBusy):
+        ring.attach_consumer()
+
+    ring.write(frame(1))
+    assert ring.read_frame() is not None
+    ring.detach_consumer()
+    assert ring.held == 0
+    ring.attach_consumer()
+    ring.detach_consumer()
@@ -0,0 +1,94 @@
+import threading
+import time
+
+import voicebot.voicebot as vb
+from benchmarks.fakes import synthetic_utterance
+from benchmarks.turn_loop import build_app
+from voicebot.llm_scheduler import LLMScheduler
+from voicebot.overload import OverloadController
+from voicebot.tts import get_tts_engine
+from voicebot.turn_recorder import NullRecorder
+
+FRAME_BYTES = vb.CHUNK_SIZE * 2
+FAKE_MP3 = b'ID3 fake mp3 reply'
+
+
+class EchoHandler:
+    deadline = 2.0
+    last_model = vb.PRIMARY_MODEL
+
+    def get_groq_response(self, messages, trace=None, deadline=None, max_tokens=500):
+        return f"you said {messages[-1]['content']}"
+
+
+def make_client():
+    transcripts = []
+    spoken = threading.Event()
+
+    def transcribe(pcm):
+        transcripts.append(len(pcm))
+        return 'hello'
+
+    def speak(text, trace=None, session_id=None):
+        # Stands in for edge-tts: hand "synthesized" MP3 to the session's sink
+        get_tts_engine(session_id).audio_sink(FAKE_MP3)
+        if trace is not None:
+            trace.finish()
+        spoken.set()
+
+    backends = vb.VoicebotBackends(transcribe=transcribe, llm_handler_factory=EchoHandler, tts=speak,
+                                   scheduler=LLMScheduler(1), recorder=NullRecorder(),
+                                   overload=OverloadController(enabled=False),
+                                   audio_streamer_factory=lambda session_id: None)
+    app, socketio = build_app(backends)
+    client = socketio.test_client(app, auth={'codecs': {'uplink': ['pcm'], 'downlink': ['mp3']}})
+    return client, transcripts, spoken
+
+
+def received(packets, name):
+    # Events emitted from server threads arrive with a bare payload instead of an argument list
+    return [packet['args'][0] if isinstance(packet['args'], list) else packet['args']
+            for packet in packets if packet['name'] == name]
+
+
+def test_connect_offer_negotiates_codecs():
+    client, _, _ = make_client()
+    try:
+        negotiated = {'uplink': 'pcm', 'downlink': 'mp3', 'frame_ms': vb.CHUNK_DURATION_MS, 'sample_rate': vb.RATE}
+        assert received(client.get_received(), 'codec') == [negotiated]
+    finally:
+        client.disconnect()
+
+
+def test_connect_without_a_usable_uplink_keeps_server_audio():
+    app, socketio = build_app(vb.VoicebotBackends(audio_streamer_factory=lambda session_id: None))
+    client = socketio.test_client(app, auth={'codecs': {'uplink': ['speex'], 'downlink': ['mp3']}})
+    try:
+        assert received(client.get_received(), 'codec') == []
+    finally:
+        client.disconnect()
+
+
+def test_pcm_uplink_reaches_the_vad_and_the_reply_comes_back_as_tts_audio():
+    client, transcripts, spoken = make_client()
+    try:
+        client.get_received()
+        client.emit('start_recording')
+        silence = bytes(vb.RATE * 2)
+        pcm = silence + synthetic_utterance(1.0) + silence
+        frames = [pcm[start:start + FRAME_BYTES] for start in range(0, len(pcm) - FRAME_BYTES + 1, FRAME_BYTES)]
+        # 20 ms frames, half a second per emit at 5x real time: well within the source's 2 s buffer
+        for start in range(0, len(frames), 25):
+            client.emit('audio_chunk', frames[start:start + 25])
+            time.sleep(0.1)
+
+        assert spoken.wait(5)
+        assert len(transcripts) == 1
+        packets = client.get_received()
+        messages = received(packets, 'message')
+        assert {'text': 'hello', 'isUser': True} in messages
+        assert {'text': 'you said hello', 'isUser': False} in messages
+        assert received(packets, 'tts_audio') == [{'codec': 'mp3', 'packets': [FAKE_MP3]}]
+    finally:
+        client.emit('stop_recording')
+        client.disconnect()
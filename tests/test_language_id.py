@@ -0,0 +1,42 @@
+from voicebot.language_id import LanguageIdentifier, classify_text
+
+LABELLED_CORPUS = [
+    ("Use the pen to write.", 'en'),
+    ("In ML and AI, we use APIs for NLP tasks.", 'en'),
+    ("Please visit https://www.example.com for more information.", 'en'),
+    ("I can help you with questions, writing, coding and much more. What would you like to do?", 'en'),
+    ("The capital of France is Paris.", 'en'),
+    ("Sure! Give me a moment to think about it.", 'en'),
+    ("Machine learning models learn patterns from data.", 'en'),
+    ("That's a great question about space and time.", 'en'),
+    ("नमस्ते! मैं आपकी कैसे मदद कर सकता हूँ?", 'hi'),
+    ("भारत की राजधानी नई दिल्ली है।", 'hi'),
+    ("आज मौसम बहुत अच्छा है, चलिए बाहर चलते हैं।", 'hi'),
+    ("मुझे आपकी बात समझ आ गई।", 'hi'),
+    ("क्या आप मुझे एक कहानी सुना सकते हैं?", 'hi'),
+    ("यह एक बहुत अच्छा सवाल है।", 'hi'),
+    ("मुझे एक pen use करना है।", 'hinglish'),
+    ("यह पेन अच्छा use करता है।", 'hinglish'),
+    ("आपका order कल तक deliver हो जाएगा।", 'hinglish'),
+    ("Kya aap meri madad kar sakte hain?", 'hinglish'),
+    ("Mr. Use ne mujhe madad ki.", 'hinglish'),
+    ("Is project me AI ka use kiya gaya hai.", 'hinglish'),
+    ("Haan bilkul, main aapki help kar sakta hoon, bas thoda time chahiye.", 'hinglish'),
+    ("Yeh feature bahut accha hai aur sabko pasand aayega.", 'hinglish'),
+]
+
+
+def test_labelled_corpus_is_classified_correctly():
+    misses = [(text, label, classify_text(text)) for text, label in LABELLED_CORPUS if classify_text(text) != label]
+    assert misses == []
+
+
+def test_short_reply_reuses_the_session_language():
+    identifier = LanguageIdentifier(short_text_chars=40)
+    assert identifier.detect("नमस्ते! मैं आपकी कैसे मदद कर सकता हूँ? आज हम किस बारे में बात करें?", session_id='s1') == 'hi'
+
+    # Too short to scan: inherits the session's language even though it is written in Latin script
+    assert identifier.detect("OK, thanks!", session_id='s1') == 'hi'
+    assert identifier.detect("OK, thanks!", session_id='s2') == 'en'
+    identifier.forget('s1')
+    assert identifier.detect("OK, thanks!", session_id='s1') == 'en'
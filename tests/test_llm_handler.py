@@ -0,0 +1,177 @@
+import threading
+import time
+import types
+
+import groq
+import httpx
+import pytest
+
+import voicebot.voicebot as vb
+from utils.api_key_manager import APIKeyManager, NoAPIKeyAvailable
+
+
+def connection_error():
+    return groq.APIConnectionError(request=httpx.Request('POST', 'https://api.groq.com/test'))
+
+
+class ScriptedGroq:
+    """groq.Groq stand-in: each create() takes the next step planned for its model.
+
+    A step is a first-token delay in seconds or an exception to raise; the
+    last step of a model repeats."""
+
+    def __init__(self, plan):
+        self.plan = {model: list(steps) for model, steps in plan.items()}
+        self.calls = []  # (api_key, model) in call order
+        self._lock = threading.Lock()
+
+    def factory(self, api_key):
+        create = lambda **kwargs: self._create(api_key, **kwargs)
+        return types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+
+    def _create(self, api_key, messages, model, max_tokens, temperature, stream=False):
+        with self._lock:
+            self.calls.append((api_key, model))
+            steps = self.plan[model]
+            step = steps.pop(0) if len(steps) > 1 else steps[0]
+        if isinstance(step, Exception):
+            raise step
+        return self._stream(step, model)
+
+    @staticmethod
+    def _stream(delay, model):
+        time.sleep(delay)
+        for word in ('reply', 'from', model):
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=word + ' '))])
+
+
+def make_handler(plan, keys=('key-1', 'key-2'), hedge_delay=None, deadline=8.0):
+    client = ScriptedGroq(plan)
+    handler = vb.VoicebotHandler(client_factory=client.factory, api_key_manager=APIKeyManager.from_keys(keys),
+                                 deadline=deadline, hedging=hedge_delay is not None)
+    if hedge_delay is not None:
+        handler.hedge_delay = lambda: hedge_delay
+    return handler, client
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(vb, 'BACKOFF_BASE_SECONDS', 0.01)
+    monkeypatch.setattr(vb, 'BACKOFF_MAX_SECONDS', 0.02)
+
+
+def test_slow_first_token_is_hedged_on_a_second_key():
+    handler, client = make_handler({vb.PRIMARY_MODEL: [2.0, 0.0]}, hedge_delay=0.05)
+    wins_before = vb.hedge_wins_total.value()
+
+    started = time.perf_counter()
+    reply = handler.get_groq_response([{'role': 'user', 'content': 'hi'}])
+
+    assert reply.startswith('reply from')
+    assert time.perf_counter() - started < 1.0
+    assert [model for _, model in client.calls] == [vb.PRIMARY_MODEL, vb.PRIMARY_MODEL]
+    assert client.calls[0][0] != client.calls[1][0]
+    assert vb.hedge_wins_total.value() == wins_before + 1
+
+
+def test_no_hedge_without_a_second_key():
+    handler, client = make_handler({vb.PRIMARY_MODEL: [0.3]}, keys=('only-key',), hedge_delay=0.05)
+
+    assert handler.get_groq_response([{'role': 'user', 'content': 'hi'}])
+    assert len(client.calls) == 1
+
+
+def test_hedge_does_not_wait_for_a_key_in_cooldown():
+    handler, client = make_handler({vb.PRIMARY_MODEL: [0.3]}, hedge_delay=0.05)
+    handler.api_key_manager.put_key_in_cooldown('key-2')
+    handler.api_key_manager.key_status['key-2']['cooldown_until'] = time.time() + 2.5
+
+    started = time.perf_counter()
+    assert handler.get_groq_response([{'role': 'user', 'content': 'hi'}])
+    assert time.perf_counter() - started < 0.6
+    assert client.calls == [('key-1', vb.PRIMARY_MODEL)]
+
+
+def test_stalled_primary_races_the_fallback_model(monkeypatch):
+    monkeypatch.setattr(vb, 'FALLBACK_MODEL_THRESHOLD_SECONDS', 0.5)
+    handler, client = make_handler({vb.PRIMARY_MODEL: [20.0], vb.FALLBACK_MODEL: [0.0]}, deadline=1.0)
+
+    started = time.perf_counter()
+    reply = handler.get_groq_response([{'role': 'user', 'content': 'hi'}])
+
+    assert time.perf_counter() - started < 0.9
+    assert reply.strip().endswith(vb.FALLBACK_MODEL)
+    assert handler.last_model == vb.FALLBACK_MODEL
+    assert [model for _, model in client.calls] == [vb.PRIMARY_MODEL, vb.FALLBACK_MODEL]
+
+
+def test_stalled_primary_and_fallback_hit_the_deadline(monkeypatch):
+    monkeypatch.setattr(vb, 'FALLBACK_MODEL_THRESHOLD_SECONDS', 0.2)
+    handler, _ = make_handler({vb.PRIMARY_MODEL: [20.0], vb.FALLBACK_MODEL: [20.0]}, deadline=0.4)
+
+    with pytest.raises(vb.LLMDeadlineExceeded):
+        handler.get_groq_response([{'role': 'user', 'content': 'hi'}])
+
+
+def test_retryable_errors_back_off_then_succeed():
+    handler, client = make_handler({vb.PRIMARY_MODEL: [connection_error(), connection_error(), 0.0]})
+    retries_before = vb.llm_retries_total.value()
+
+    assert handler.get_groq_response([{'role': 'user', 'content': 'hi'}])
+    assert len(client.calls) == 3
+    assert vb.llm_retries_total.value() == retries_before + 2
+
+
+def test_retries_stop_after_max_attempts():
+    handler, client = make_handler({vb.PRIMARY_MODEL: [connection_error()]})
+
+    with pytest.raises(groq.APIConnectionError):
+        handler.get_groq_response([{'role': 'user', 'content': 'hi'}])
+    assert len(client.calls) == vb.LLM_MAX_ATTEMPTS
+
+
+def test_other_errors_are_not_retried():
+    handler, client = make_handler({vb.PRIMARY_MODEL: [ValueError('bad request')]})
+
+    with pytest.raises(ValueError):
+        handler.get_groq_response([{'role': 'user', 'content': 'hi'}])
+    assert len(client.calls) == 1
+
+
+def test_waiting_for_a_key_counts_against_the_deadline():
+    handler, client = make_handler({vb.PRIMARY_MODEL: [0.0]}, keys=('key-1',))
+    handler.api_key_manager.put_key_in_cooldown('key-1')
+
+    started = time.perf_counter()
+    with pytest.raises(NoAPIKeyAvailable):
+        handler.get_groq_response([{'role': 'user', 'content': 'hi'}], deadline=0.5)
+    assert time.perf_counter() - started < 0.5
+    assert client.calls == []
+
+
+def test_get_api_key_excludes_keys_and_waits_without_the_lock():
+    manager = APIKeyManager.from_keys(['key-1', 'key-2'])
+    assert manager.get_api_key() == 'key-1'
+    assert manager.get_api_key(exclude=['key-1']) == 'key-2'
+    with pytest.raises(NoAPIKeyAvailable):
+        manager.get_api_key(exclude=['key-1', 'key-2'])
+
+    manager.put_key_in_cooldown('key-1')
+    manager.key_status['key-1']['cooldown_until'] = time.time() + 0.3
+    waiter = threading.Thread(target=manager.get_api_key, kwargs={'exclude': ['key-2'], 'timeout': 2})
+    waiter.start()
+    time.sleep(0.05)
+    # Another caller is not held up while the first one waits for key-1
+    started = time.perf_counter()
+    assert manager.get_api_key(exclude=['key-1']) == 'key-2'
+    assert time.perf_counter() - started < 0.1
+    waiter.join()
+
+
+def test_each_worker_gets_a_share_of_every_keys_rate_limit(monkeypatch):
+    import utils.api_key_manager as api_key_manager
+    monkeypatch.setattr(api_key_manager, 'VOICEBOT_WORKERS', 4)
+    monkeypatch.setattr(APIKeyManager, '_instance', None)
+
+    manager = APIKeyManager.__new__(APIKeyManager)
+    assert manager.max_requests_per_minute == api_key_manager.GROQ_REQUESTS_PER_MINUTE // 4
@@ -0,0 +1,76 @@
+import pytest
+
+from utils.api_key_manager import APIKeyManager
+from voicebot.llm_scheduler import LLMScheduler, SchedulerTimeout, queue_depth, queue_timeouts_total
+
+
+def enqueue(scheduler, session_id):
+    """Queue a ticket the way acquire() does, without blocking on it"""
+    with scheduler._cond:
+        return scheduler._enqueue(session_id)
+
+
+def test_no_more_than_max_concurrency_slots_are_granted():
+    scheduler = LLMScheduler(2)
+    scheduler.acquire('a', timeout=0)
+    scheduler.acquire('b', timeout=0)
+    assert scheduler.active == 2
+
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire('c', timeout=0)
+    assert scheduler.active == 2
+
+    scheduler.release()
+    scheduler.acquire('c', timeout=0)
+    assert scheduler.active == 2
+
+
+def test_slots_go_round_robin_across_sessions():
+    scheduler = LLMScheduler(1)
+    scheduler.acquire('chatty', timeout=0)
+    tickets = [enqueue(scheduler, session_id) for session_id in ('chatty', 'chatty', 'chatty', 'b', 'c')]
+    assert scheduler.depth == 5
+
+    granted = []
+    for _ in tickets:
+        scheduler.release()
+        newly_granted = [ticket for ticket in tickets if ticket.granted and ticket not in granted]
+        assert len(newly_granted) == 1
+        granted += newly_granted
+    assert [ticket.session_id for ticket in granted] == ['chatty', 'b', 'c', 'chatty', 'chatty']
+    assert scheduler.active == 1
+
+
+def test_timed_out_ticket_leaves_the_queue():
+    scheduler = LLMScheduler(1)
+    timeouts_before = queue_timeouts_total.value()
+    with scheduler.slot('a'):
+        with pytest.raises(SchedulerTimeout):
+            scheduler.acquire('b', timeout=0)
+        assert scheduler.depth == 0
+        assert 'b' not in scheduler._queues
+        assert queue_depth.value() == 0
+    assert queue_timeouts_total.value() == timeouts_before + 1
+    # The slot went back to the pool rather than to the abandoned ticket
+    assert scheduler.active == 0
+
+
+def test_queue_depth_gauge_returns_to_zero():
+    scheduler = LLMScheduler(1)
+    scheduler.acquire('a', timeout=0)
+    enqueue(scheduler, 'b')
+    enqueue(scheduler, 'c')
+    assert queue_depth.value() == 2
+
+    scheduler.release()
+    scheduler.release()
+    assert queue_depth.value() == 0
+    scheduler.release()
+    assert scheduler.active == 0
+
+
+def test_concurrency_cap_follows_the_key_pool_rate(monkeypatch):
+    monkeypatch.delenv('LLM_MAX_CONCURRENCY', raising=False)
+    # 2 keys x 120 requests/minute = 4 requests/s; with 1 s calls that keeps 4 slots busy
+    manager = APIKeyManager.from_keys(['key-1', 'key-2'], max_requests_per_minute=120)
+    assert LLMScheduler.from_key_pool(manager, expected_latency=1.0).max_concurrency == 4
@@ -0,0 +1,90 @@
+import queue
+import threading
+import types
+
+import pytest
+
+import voicebot.voicebot as vb
+from voicebot.llm_scheduler import LLMScheduler
+from voicebot.overload import NORMAL, REDUCED
+from voicebot.response_cache import ResponseCache
+from voicebot.tracing import TurnTrace
+from voicebot.turn_recorder import NullRecorder
+
+
+class StubHandler:
+    def __init__(self, model, deadline=vb.LLM_TURN_DEADLINE_SECONDS):
+        self.last_model = model
+        self.deadline = deadline
+        self.calls = 0
+
+    def get_groq_response(self, messages, trace=None, deadline=None, max_tokens=500):
+        self.calls += 1
+        return f"answer from {self.last_model}"
+
+
+class FixedOverload:
+    def __init__(self, level):
+        self._level = level
+
+    def level(self):
+        return self._level
+
+    def observe_trace(self, trace):
+        pass
+
+
+def run_turn(model, level, handler=None, scheduler=None):
+    handler = handler or StubHandler(model)
+    backends = vb.VoicebotBackends(llm_handler_factory=lambda: handler, tts=lambda *args, **kwargs: None,
+                                   scheduler=scheduler or LLMScheduler(1), recorder=NullRecorder(),
+                                   overload=FixedOverload(level),
+                                   audio_streamer_factory=lambda session_id: None)
+    input_queue, output_queue = queue.Queue(), queue.Queue()
+    input_queue.put(('What are your opening hours?', None))
+    input_queue.put(('exit', None))
+    socketio = types.SimpleNamespace(emit=lambda *args, **kwargs: None)
+    vb.process_input(input_queue, output_queue, queue.Queue(), socketio, history=[], backends=backends)
+    return output_queue.get_nowait()[1]
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResponseCache(context_policy=lambda messages: True)
+    monkeypatch.setattr(vb, 'response_cache', cache)
+    return cache
+
+
+def test_primary_model_reply_is_cached(cache):
+    assert run_turn(vb.PRIMARY_MODEL, NORMAL) == f"answer from {vb.PRIMARY_MODEL}"
+    assert cache.get('What are your opening hours?', []) == f"answer from {vb.PRIMARY_MODEL}"
+
+
+@pytest.mark.parametrize('model, level', [(vb.FALLBACK_MODEL, NORMAL), (vb.PRIMARY_MODEL, REDUCED)])
+def test_degraded_reply_is_not_cached(cache, model, level):
+    run_turn(model, level)
+    assert cache.get('What are your opening hours?', []) is None
+
+
+def test_turn_that_would_get_its_slot_too_late_gets_the_busy_reply(cache):
+    # 1 s budget: the slot wait stops at 0.5 s, leaving the LLM at least half the budget
+    handler = StubHandler(vb.PRIMARY_MODEL, deadline=1.0)
+    scheduler = LLMScheduler(1)
+    scheduler.acquire('other session', timeout=0)
+    releaser = threading.Timer(0.7, scheduler.release)
+    releaser.start()
+    try:
+        assert run_turn(vb.PRIMARY_MODEL, NORMAL, handler, scheduler) == vb.CANNED_BUSY_REPLY
+    finally:
+        releaser.join()
+    assert handler.calls == 0
+
+
+def test_recorded_latencies_are_per_stage():
+    documents = []
+    trace = TurnTrace()
+    vb.record_turn(types.SimpleNamespace(record=documents.append), trace, {'user_input': 'hi'})
+    trace.marks += [('stt', 0.5), ('llm_first_token', 1.5), ('llm_done', 1.75)]
+    trace.finish()
+
+    assert documents[0]['latencies'] == {'stt': 0.5, 'llm_first_token': 1.0, 'llm_done': 0.25}
@@ -0,0 +1,36 @@
+import time
+
+import pytest
+
+import voicebot.voicebot as vb
+from benchmarks.turn_loop import build_app
+from voicebot.profiler import SamplingProfiler
+
+
+def test_coarse_interval_does_not_outlast_the_profile():
+    sampler = SamplingProfiler()
+    started = time.perf_counter()
+    result = sampler.profile(0.2, interval=1e6)
+    assert time.perf_counter() - started < 0.5
+    assert result.samples == 1
+    assert not sampler.running
+
+
+@pytest.mark.parametrize('seconds, interval', [(float('nan'), 0.01), (0.1, float('nan')), (0.1, float('inf'))])
+def test_non_finite_arguments_are_refused(seconds, interval):
+    sampler = SamplingProfiler()
+    with pytest.raises(ValueError):
+        sampler.profile(seconds, interval)
+    assert not sampler.running
+
+
+@pytest.mark.parametrize('query', ['seconds=nan', 'seconds=inf', 'seconds=0.1&interval_ms=nan',
+                                   'seconds=0.1&interval_ms=inf', 'seconds=0.1&interval_ms=1e6'])
+def test_debug_profile_rejects_out_of_range_arguments(query):
+    app, _ = build_app(vb.VoicebotBackends(audio_streamer_factory=lambda session_id: None))
+    client = app.test_client()
+
+    assert client.get(f'/debug/profile?{query}').status_code == 400
+    response = client.get('/debug/profile?seconds=0.1&interval_ms=10&format=json')
+    assert response.status_code == 200
+    assert response.get_json()['samples'] > 0
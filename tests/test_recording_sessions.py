@@ -0,0 +1,58 @@
+import threading
+import time
+
+import voicebot.voicebot as vb
+from benchmarks.turn_loop import build_app
+from voicebot.overload import OverloadController
+
+
+class CountingStreamer:
+    """AudioStreamer stand-in recording how many start_recording loops run at once"""
+    dev_mode = False
+
+    def __init__(self):
+        self.running = 0
+        self.most_running = 0
+        self.started = 0
+        self._lock = threading.Lock()
+
+    def start_recording(self, stop_event, recorder=None):
+        with self._lock:
+            self.started += 1
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        try:
+            stop_event.wait(5)
+            yield from ()
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def stop_recording(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_one_stt_thread_per_session():
+    streamer = CountingStreamer()
+    backends = vb.VoicebotBackends(audio_streamer_factory=lambda session_id: streamer,
+                                   overload=OverloadController(enabled=False))
+    app, socketio = build_app(backends)
+    client = socketio.test_client(app)
+    try:
+        client.emit('start_recording')
+        client.emit('start_recording')
+        client.emit('stop_recording')
+        # Waits for the stopped thread instead of starting a second reader next to it
+        client.emit('start_recording')
+        client.emit('stop_recording')
+    finally:
+        client.disconnect()
+
+    deadline = time.monotonic() + 2
+    while (streamer.started < 2 or streamer.running) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert streamer.started == 2
+    assert streamer.most_running == 1
@@ -0,0 +1,45 @@
+import os
+
+import voicebot.voicebot as vb
+from benchmarks.fakes import synthetic_utterance
+from voicebot.session_audio import AUDIO_SUFFIX, SessionAudioRecorder, enforce_retention, replay_session
+
+FRAME_BYTES = vb.CHUNK_SIZE * 2
+
+
+def record(directory, session_id, pcm):
+    recorder = SessionAudioRecorder(directory, session_id, vb.RATE, FRAME_BYTES)
+    for start in range(0, len(pcm) - FRAME_BYTES + 1, FRAME_BYTES):
+        recorder.append_frame(pcm[start:start + FRAME_BYTES])
+    return recorder
+
+
+def recordings(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(AUDIO_SUFFIX))
+
+
+def test_retention_spares_recordings_that_are_still_open(tmp_path):
+    closed = record(tmp_path, 'closed', bytes(FRAME_BYTES * 10))
+    closed.close()
+    open_recording = record(tmp_path, 'open', bytes(FRAME_BYTES * 10))
+    try:
+        assert enforce_retention(tmp_path, max_total_bytes=0, max_age_seconds=0) == 1
+        assert recordings(tmp_path) == [open_recording.name + AUDIO_SUFFIX]
+    finally:
+        open_recording.close()
+    assert enforce_retention(tmp_path, max_total_bytes=0, max_age_seconds=0) == 1
+
+
+def test_replay_does_not_record_even_when_recording_is_enabled(tmp_path, monkeypatch):
+    silence = bytes(vb.RATE * 2)
+    recorder = record(tmp_path, 'session', silence + synthetic_utterance(1.0) + silence)
+    recorder.close()
+    monkeypatch.setattr(vb, 'SESSION_AUDIO_RECORDING', True)
+    monkeypatch.chdir(tmp_path)
+
+    transcripts, stats = replay_session(recorder.audio_path, lambda pcm: 'hello')
+
+    assert transcripts == ['hello']
+    assert stats['audio_seconds'] > 2
+    assert recordings(tmp_path) == [recorder.name + AUDIO_SUFFIX]
+    assert not os.path.exists(tmp_path / 'session_audio')
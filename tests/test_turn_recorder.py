@@ -0,0 +1,154 @@
+import threading
+import time
+
+from bson import ObjectId
+from pymongo.errors import AutoReconnect, BulkWriteError, NetworkTimeout
+
+import voicebot.turn_recorder as tr
+
+
+class StandInCollection:
+    """pymongo collection stand-in for unordered insert_many.
+
+    Like pymongo it sets _id on the documents it is given, reports duplicate
+    _ids and rejected documents in a BulkWriteError, and can be told to fail
+    the next call part-way: store the first `stored` documents of the batch,
+    then raise `error` as a dropped connection or a timeout would."""
+
+    def __init__(self, reject=lambda document: False):
+        self.documents = {}
+        self.calls = 0
+        self.reject = reject
+        self.failure = None  # (stored, error) for the next call
+        self._lock = threading.Lock()
+
+    def fail_next(self, stored, error):
+        self.failure = (stored, error)
+
+    def insert_many(self, documents, ordered=True):
+        assert not ordered
+        with self._lock:
+            self.calls += 1
+            failure, self.failure = self.failure, None
+            limit = len(documents) if failure is None else failure[0]
+            errors = []
+            for index, document in enumerate(documents[:limit]):
+                document.setdefault('_id', ObjectId())
+                if document['_id'] in self.documents:
+                    errors.append({'index': index, 'code': 11000, 'errmsg': 'E11000 duplicate key error'})
+                elif self.reject(document):
+                    errors.append({'index': index, 'code': 121, 'errmsg': 'Document failed validation'})
+                else:
+                    self.documents[document['_id']] = document
+            if failure is not None:
+                raise failure[1]
+            if errors:
+                raise BulkWriteError({'writeErrors': errors, 'writeConcernErrors': [],
+                                      'nInserted': len(documents) - len(errors)})
+
+
+def turns(count, start=0):
+    return [{'turn': index} for index in range(start, start + count)]
+
+
+def make_recorder(collection, **kwargs):
+    kwargs.setdefault('flush_interval', 60)
+    return tr.TurnRecorder(collection_factory=lambda: collection, **kwargs)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_full_batch_is_written_without_waiting_for_the_interval():
+    collection = StandInCollection()
+    recorder = make_recorder(collection, batch_size=3).start()
+    try:
+        for document in turns(3):
+            assert recorder.record(document)
+        assert wait_for(lambda: len(collection.documents) == 3)
+    finally:
+        recorder.close()
+
+
+def test_partial_batch_is_written_after_the_interval():
+    collection = StandInCollection()
+    recorder = make_recorder(collection, batch_size=100, flush_interval=0.2).start()
+    try:
+        recorder.record({'turn': 0})
+        time.sleep(0.05)
+        assert collection.documents == {}
+        assert wait_for(lambda: len(collection.documents) == 1)
+    finally:
+        recorder.close()
+
+
+def test_turns_beyond_the_buffer_are_dropped_and_counted():
+    recorder = make_recorder(StandInCollection(), max_buffer=2, batch_size=10)
+    dropped_before = tr.dropped_total.value(reason='buffer_full')
+
+    assert [recorder.record(document) for document in turns(4)] == [True, True, False, False]
+    assert recorder.dropped == 2
+    assert tr.dropped_total.value(reason='buffer_full') == dropped_before + 2
+
+
+def test_batch_is_retried_after_a_partial_write():
+    collection = StandInCollection()
+    recorder = make_recorder(collection, batch_size=4)
+    for document in turns(6):
+        recorder.record(document)
+    collection.fail_next(stored=2, error=AutoReconnect('connection closed'))
+    written_before = tr.written_total.value()
+
+    assert recorder.flush() == 0
+    assert len(collection.documents) == 2
+    # The first two come back as duplicate keys and count as written; nothing stays stuck
+    assert recorder.flush() == 6
+    assert sorted(document['turn'] for document in collection.documents.values()) == list(range(6))
+    assert recorder.flush() == 0
+    assert tr.written_total.value() == written_before + 6
+    assert recorder.dropped == 0
+
+
+def test_batch_stored_before_a_timeout_is_not_written_twice():
+    collection = StandInCollection()
+    recorder = make_recorder(collection, batch_size=10)
+    for document in turns(3):
+        recorder.record(document)
+    collection.fail_next(stored=3, error=NetworkTimeout('timed out'))
+
+    assert recorder.flush() == 0
+    for document in turns(2, start=3):
+        recorder.record(document)
+    assert recorder.flush() == 5
+    assert len(collection.documents) == 5
+
+
+def test_rejected_documents_are_dropped_instead_of_retried():
+    collection = StandInCollection(reject=lambda document: document['turn'] == 1)
+    recorder = make_recorder(collection, batch_size=2)
+    for document in turns(4):
+        recorder.record(document)
+    rejected_before = tr.dropped_total.value(reason='rejected')
+
+    assert recorder.flush() == 3
+    assert recorder.dropped == 1
+    assert tr.dropped_total.value(reason='rejected') == rejected_before + 1
+    assert recorder.flush() == 0
+    assert collection.calls == 2
+
+
+def test_close_flushes_what_is_left():
+    collection = StandInCollection()
+    recorder = make_recorder(collection, batch_size=100).start()
+    for document in turns(5):
+        recorder.record(document)
+
+    recorder.close()
+    assert len(collection.documents) == 5
+    assert not recorder.record({'turn': 5})
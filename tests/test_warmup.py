@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+
+import voicebot.voicebot as vb
+import voicebot.warmup as warmup
+from benchmarks.turn_loop import build_app
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(warmup, '_results', {})
+    monkeypatch.setattr(warmup, '_running', set())
+
+
+def test_slow_subsystem_does_not_hold_up_other_callers():
+    release = threading.Event()
+    extra = {'slow': release.wait, 'fast': lambda: None}
+    first = threading.Thread(target=warmup.warm_up, args=(['slow'], extra))
+    first.start()
+    time.sleep(0.05)
+
+    started = time.perf_counter()
+    report = warmup.warm_up(['slow', 'fast'], extra)
+    assert time.perf_counter() - started < 0.1
+    assert report['slow'] == {'ok': False, 'seconds': 0.0, 'error': 'warm-up in progress'}
+    assert report['fast']['ok']
+
+    release.set()
+    first.join()
+    assert warmup.warm_up(['slow'], extra)['slow']['ok']
+
+
+def test_failed_subsystem_is_retried_only_after_the_backoff(monkeypatch):
+    calls = []
+
+    def broken():
+        calls.append(time.monotonic())
+        raise ConnectionError('unreachable')
+
+    monkeypatch.setattr(warmup, 'WARMUP_RETRY_SECONDS', 0.2)
+    assert warmup.warm_up(['db'], {'db': broken})['db']['error'] == 'unreachable'
+    assert not warmup.warm_up(['db'], {'db': broken})['db']['ok']
+    assert len(calls) == 1
+    time.sleep(0.2)
+    warmup.warm_up(['db'], {'db': broken})
+    assert len(calls) == 2
+
+
+def make_client(monkeypatch, token=''):
+    monkeypatch.setattr(vb, 'WARMUP_TOKEN', token)
+    monkeypatch.setitem(warmup.SUBSYSTEMS, 'llm', lambda: None)
+    app, _ = build_app(vb.VoicebotBackends(audio_streamer_factory=lambda session_id: None))
+    app.config['LOGIN_DISABLED'] = False
+    return app.test_client()
+
+
+def test_warmup_needs_a_post_from_an_admin_or_the_probe_token(monkeypatch):
+    client = make_client(monkeypatch, token='probe-secret')
+
+    assert client.get('/warmup?subsystems=llm').status_code == 405
+    # No session: sent to the login page before anything is warmed up
+    assert client.post('/warmup?subsystems=llm').status_code == 302
+    assert client.post('/warmup?subsystems=llm', headers={'X-Warmup-Token': 'wrong'}).status_code == 302
+    response = client.post('/warmup?subsystems=llm', headers={'X-Warmup-Token': 'probe-secret'})
+    assert response.status_code == 200
+    assert response.get_json()['llm']['ok']
+
+
+def test_probe_token_is_ignored_when_unset(monkeypatch):
+    client = make_client(monkeypatch)
+
+    assert client.post('/warmup?subsystems=llm', headers={'X-Warmup-Token': ''}).status_code == 302
+
+
+def test_bare_warmup_leaves_the_audio_device_out(monkeypatch):
+    client = make_client(monkeypatch, token='probe-secret')
+    for name in warmup.SUBSYSTEMS:
+        monkeypatch.setitem(warmup.SUBSYSTEMS, name, lambda: None)
+
+    # No microphone on this server: the streamer factory returns None
+    response = client.post('/warmup', headers={'X-Warmup-Token': 'probe-secret'})
+    assert response.status_code == 200
+    assert set(response.get_json()) == set(warmup.SUBSYSTEMS)
+
+    response = client.post('/warmup?subsystems=audio_device', headers={'X-Warmup-Token': 'probe-secret'})
+    assert response.status_code == 503
+    assert response.get_json()['audio_device']['error'] == 'No usable audio input device'
@@ -1,6 +1,6 @@
 import os
 import time
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import threading
@@ -10,6 +10,15 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Groq's per-key limit, shared by every process using the key
+GROQ_REQUESTS_PER_MINUTE = 50  # Adjust based on GROQ's actual limit
+# Worker processes sharing the same keys; counters are per process, so each one gets an equal share of every key
+VOICEBOT_WORKERS = max(1, int(os.getenv('VOICEBOT_WORKERS', 1)))
+
+class NoAPIKeyAvailable(Exception):
+    """Raised when no key can be handed out (all excluded, or in cooldown past the caller's timeout)"""
+
+
 class APIKeyManager:
     _instance = None
     _lock = threading.Lock()
@@ -25,7 +34,7 @@ class APIKeyManager:
                     instance.key_status = {}
                     instance.current_key_index = 0
                     instance.cooldown_period = 61  # 61 seconds cooldown
-                    instance.max_requests_per_minute = 50  # Adjust based on GROQ's actual limit
+                    instance.max_requests_per_minute = max(1, GROQ_REQUESTS_PER_MINUTE // VOICEBOT_WORKERS)
                     cls._instance = instance
         return cls._instance
 
@@ -87,71 +96,116 @@ class APIKeyManager:
             self.reset_key_counter(key)
             logger.info(f"API key removed from cooldown")
 
-    def get_next_available_key(self) -> Optional[str]:
-        """Get the next available API key"""
+    @classmethod
+    def from_keys(cls, keys, max_requests_per_minute=50):
+        """Manager over an explicit list of keys, separate from the process-wide one (tests, benchmarks)"""
+        instance = super(APIKeyManager, cls).__new__(cls)
+        instance.api_keys = []
+        instance.key_status = {}
+        instance.current_key_index = 0
+        instance.cooldown_period = 61
+        instance.max_requests_per_minute = max_requests_per_minute
+        for key in keys:
+            instance.api_keys.append(key)
+            instance.key_status[key] = {
+                'requests_count': 0,
+                'last_reset': time.time(),
+                'in_cooldown': False,
+                'cooldown_until': None
+            }
+        instance.initialized = True
+        return instance
+
+    def get_next_available_key(self, exclude=()) -> Tuple[Optional[str], Optional[float]]:
+        """Find a usable key without waiting, skipping keys in `exclude`.
+
+        Returns (key, None), or (None, seconds until the soonest key leaves
+        cooldown), or (None, None) if no key will become usable."""
         if not self.api_keys:
             self.load_api_keys()  # Reload keys if none are available
-            
+
         if not self.api_keys:
-            return None
-            
-        start_index = self.current_key_index
-        
-        while True:
-            # Check current key
-            current_key = self.api_keys[self.current_key_index]
-            
+            return None, None
+
+        for offset in range(len(self.api_keys)):
+            index = (self.current_key_index + offset) % len(self.api_keys)
+            current_key = self.api_keys[index]
+            if current_key in exclude:
+                continue
+
             # Check and update cooldown status
             self.check_and_update_cooldown(current_key)
-            
+
             # Check if key is available
             if not self.key_status[current_key]['in_cooldown']:
                 # Check if we need to reset the counter
                 if time.time() - self.key_status[current_key]['last_reset'] >= 60:
                     self.reset_key_counter(current_key)
-                
+
                 # Check if key has not exceeded limit
                 if self.key_status[current_key]['requests_count'] < self.max_requests_per_minute:
-                    return current_key
-            
-            # Move to next key
-            self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
-            
-            # If we've checked all keys and come back to start, check if any key is usable
-            if self.current_key_index == start_index:
-                # Find the key that will be available soonest
-                soonest_available = float('inf')
-                for key in self.api_keys:
-                    if self.key_status[key]['in_cooldown']:
-                        if self.key_status[key]['cooldown_until'] < soonest_available:
-                            soonest_available = self.key_status[key]['cooldown_until']
-                
-                if soonest_available != float('inf'):
-                    # Wait until the soonest key is available
-                    wait_time = max(0, soonest_available - time.time())
-                    if wait_time > 0:
-                        logger.info(f"All keys in cooldown. Waiting {wait_time:.2f} seconds...")
-                        time.sleep(wait_time)
-                        continue
-                
-                return None
+                    self.current_key_index = index
+                    return current_key, None
+
+        # Find the key that will be available soonest
+        soonest_available = min((self.key_status[key]['cooldown_until'] for key in self.api_keys
+                                 if key not in exclude and self.key_status[key]['in_cooldown']), default=None)
+        if soonest_available is None:
+            return None, None
+        return None, max(0.0, soonest_available - time.time())
+
+    def get_api_key(self, exclude=(), timeout=None) -> str:
+        """Get an available API key and update its usage.
+
+        Keys in `exclude` are never returned. When every key is in cooldown
+        this waits, without holding the lock, for at most `timeout` seconds
+        (None waits as long as it takes) and raises NoAPIKeyAvailable."""
+        give_up_at = None if timeout is None else time.time() + timeout
+        while True:
+            with self._lock:
+                key, wait_time = self.get_next_available_key(exclude)
+                if key is not None:
+                    # Update usage
+                    self.key_status[key]['requests_count'] += 1
+
+                    # Check if key needs to go into cooldown
+                    if self.key_status[key]['requests_count'] >= self.max_requests_per_minute:
+                        self.put_key_in_cooldown(key)
+
+                    return key
+
+            if wait_time is None:
+                raise NoAPIKeyAvailable("No API keys available")
+            if give_up_at is not None and time.time() + wait_time > give_up_at:
+                raise NoAPIKeyAvailable(f"No API key available within {timeout:.1f}s")
+            logger.info(f"All keys in cooldown. Waiting {wait_time:.2f} seconds...")
+            time.sleep(wait_time)
 
-    def get_api_key(self) -> str:
-        """Get an available API key and update its usage"""
+    def capacity_per_minute(self) -> int:
+        """Total requests per minute the key pool can serve"""
+        return len(self.api_keys) * self.max_requests_per_minute
+
+    def headroom(self) -> float:
+        """Fraction of the pool's per-minute requests still available.
+
+        Takes the lock like the rest of the manager; get_api_key only holds it
+        while picking a key, never while waiting for one."""
         with self._lock:
-            key = self.get_next_available_key()
-            
-            if key is None:
-                raise Exception("No API keys available")
-            
-            # Update usage
-            self.key_status[key]['requests_count'] += 1
-            
-            # Check if key needs to go into cooldown
-            if self.key_status[key]['requests_count'] >= self.max_requests_per_minute:
-                self.put_key_in_cooldown(key)
-            
-            return key
+            if not self.api_keys:
+                return 0.0
+            now = time.time()
+            available = 0
+            for key in self.api_keys:
+                status = self.key_status[key]
+                if status['in_cooldown']:
+                    if now < (status['cooldown_until'] or 0):
+                        continue
+                    available += self.max_requests_per_minute
+                elif now - status['last_reset'] >= 60:
+                    available += self.max_requests_per_minute
+                else:
+                    available += max(0, self.max_requests_per_minute - status['requests_count'])
+            return available / self.capacity_per_minute()
 
     def mark_key_error(self, key: str):
         """Mark a key as having an error (e.g., rate limit exceeded)"""
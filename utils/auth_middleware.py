@@ -1,11 +1,15 @@
 from functools import wraps
-from flask import redirect, request, session, url_for
+from flask import abort, current_app, redirect, request, session, url_for
 from config.user import User
 
 
 def validate_session(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
+        # Offline harnesses run without the user database (same convention as Flask-Login)
+        if current_app.config.get('LOGIN_DISABLED'):
+            return f(*args, **kwargs)
+
         # Get user_id from URL parameters or session
         user_id = request.args.get('user_id') or session.get('user_id')
 
@@ -26,4 +30,15 @@ def validate_session(f):
 
         return f(*args, **kwargs)
 
-    return decorated_function
\ No newline at end of file
+    return decorated_function
+
+
+def admin_required(f):
+    """validate_session, then 403 for users without session['is_admin']"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_app.config.get('LOGIN_DISABLED') and not session.get('is_admin'):
+            abort(403)
+        return f(*args, **kwargs)
+
+    return validate_session(decorated_function)
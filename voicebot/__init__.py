@@ -1,11 +1,23 @@
-from .voicebot import AudioStreamer, setup_voicebot_routes, continuous_stt, process_input
-from .tts import speak, InterruptibleTTS
+# Exports are resolved on first access so `import voicebot` stays cheap;
+# audio, TTS and LLM libraries load when the code that needs them runs.
+_EXPORTS = {
+    'AudioStreamer': '.voicebot',
+    'setup_voicebot_routes': '.voicebot',
+    'continuous_stt': '.voicebot',
+    'process_input': '.voicebot',
+    'speak': '.tts',
+    'InterruptibleTTS': '.tts',
+    'TTSService': '.tts',
+    'warm_up': '.warmup',
+}
 
-__all__ = [
-    'AudioStreamer',
-    'setup_voicebot_routes',
-    'continuous_stt',
-    'process_input',
-    'speak',
-    'InterruptibleTTS'
-]
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
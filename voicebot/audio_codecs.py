@@ -0,0 +1,253 @@
+# audio_codecs.py
+import io
+import threading
+import time
+
+import numpy as np
+
+from utils.metrics import REGISTRY
+
+PCM = 'pcm'
+OPUS = 'opus'
+MP3 = 'mp3'
+
+# Server preference per direction. Uplink frames feed the VAD, so they must
+# decode to exact 20 ms frames; downlink starts from edge-tts MP3, which can be
+# forwarded untouched.
+UPLINK_PREFERENCE = (OPUS, PCM)
+DOWNLINK_PREFERENCE = (MP3, OPUS, PCM)
+
+OPUS_BITRATE = 24000
+MP3_DECODE_RATE = 16000
+
+transport_bytes_total = REGISTRY.counter(
+    'voicebot_audio_transport_bytes_total',
+    'Audio bytes exchanged with clients',
+    labelnames=('direction', 'codec')
+)
+codec_seconds_total = REGISTRY.counter(
+    'voicebot_audio_codec_seconds_total',
+    'CPU time spent encoding and decoding transport audio',
+    labelnames=('codec', 'operation')
+)
+
+
+class CodecUnavailable(Exception):
+    """The requested codec cannot be used on this server"""
+
+
+_opuslib = None
+_opuslib_loaded = False
+
+
+def load_opuslib():
+    """The optional opuslib module, or None; imported on first use because it probes for libopus"""
+    global _opuslib, _opuslib_loaded
+    if not _opuslib_loaded:
+        try:
+            import opuslib
+            _opuslib = opuslib
+        except Exception:  # opuslib raises a plain Exception when libopus itself is missing
+            _opuslib = None
+        _opuslib_loaded = True
+    return _opuslib
+
+
+def mp3_supported():
+    from pydub.utils import which
+    return which('ffmpeg') is not None or which('avconv') is not None
+
+
+def supported_codecs(direction):
+    """Codecs this server can use for 'uplink' (client to server) or 'downlink' audio"""
+    if direction == 'uplink':
+        return [PCM] + ([OPUS] if load_opuslib() is not None else [])
+    # Downlink starts from edge-tts MP3: forwarding needs nothing, anything else needs a decoder
+    codecs = [MP3]
+    if mp3_supported():
+        codecs.append(PCM)
+        if load_opuslib() is not None:
+            codecs.append(OPUS)
+    return codecs
+
+
+def negotiate(offered, direction):
+    """Pick the server's most preferred codec for `direction` among those the client offered"""
+    offered = [str(codec).lower() for codec in offered or []]
+    preference = UPLINK_PREFERENCE if direction == 'uplink' else DOWNLINK_PREFERENCE
+    supported = supported_codecs(direction)
+    for codec in preference:
+        if codec in offered and codec in supported:
+            return codec
+    return None
+
+
+class PCMCodec:
+    """Raw 16-bit little-endian mono PCM"""
+    name = PCM
+
+    def __init__(self, sample_rate, frame_ms):
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * frame_ms // 1000
+
+    def encode(self, pcm):
+        return [pcm]
+
+    def decode(self, payload):
+        return bytes(payload)
+
+    def encode_mp3(self, mp3):
+        return [decode_mp3(mp3, self.sample_rate)]
+
+
+class OpusCodec:
+    """Opus packets of exactly one VAD frame each, so decoded audio lines up with CHUNK_DURATION_MS"""
+    name = OPUS
+
+    def __init__(self, sample_rate, frame_ms, bitrate=OPUS_BITRATE):
+        opuslib = load_opuslib()
+        if opuslib is None:
+            raise CodecUnavailable("opuslib/libopus is not installed")
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.frame_bytes = self.frame_samples * 2
+        self._encoder = opuslib.Encoder(sample_rate, 1, opuslib.APPLICATION_VOIP)
+        self._encoder.bitrate = bitrate
+        self._decoder = opuslib.Decoder(sample_rate, 1)
+        self._pending = b''
+        self._lock = threading.Lock()
+
+    def encode(self, pcm):
+        """Encode PCM into one packet per full frame; a trailing partial frame waits for more audio"""
+        with self._lock:
+            data = self._pending + pcm
+            packets = []
+            for start in range(0, len(data) - self.frame_bytes + 1, self.frame_bytes):
+                packets.append(self._encoder.encode(data[start:start + self.frame_bytes], self.frame_samples))
+            self._pending = data[len(packets) * self.frame_bytes:]
+            return packets
+
+    def decode(self, payload):
+        with self._lock:
+            return self._decoder.decode(bytes(payload), self.frame_samples)
+
+    def encode_mp3(self, mp3):
+        pcm = decode_mp3(mp3, self.sample_rate)
+        # Pad to a whole frame so the end of the reply is not held back
+        remainder = len(pcm) % self.frame_bytes
+        if remainder:
+            pcm += b'\x00' * (self.frame_bytes - remainder)
+        return self.encode(pcm)
+
+
+class MP3Codec:
+    """Downlink only: edge-tts already produces MP3, so it is forwarded as-is"""
+    name = MP3
+
+    def __init__(self, sample_rate, frame_ms):
+        self.sample_rate = sample_rate
+
+    def encode(self, pcm):
+        from pydub import AudioSegment
+        segment = AudioSegment(data=pcm, sample_width=2, frame_rate=self.sample_rate, channels=1)
+        buffer = io.BytesIO()
+        segment.export(buffer, format='mp3', bitrate='32k')
+        return [buffer.getvalue()]
+
+    def decode(self, payload):
+        return decode_mp3(payload, self.sample_rate)
+
+    def encode_mp3(self, mp3):
+        return [mp3]
+
+
+def decode_mp3(mp3, sample_rate=MP3_DECODE_RATE):
+    """MP3 bytes to 16-bit mono PCM at `sample_rate`"""
+    from pydub import AudioSegment
+    segment = AudioSegment.from_file(io.BytesIO(mp3), format='mp3')
+    return segment.set_frame_rate(sample_rate).set_channels(1).set_sample_width(2).raw_data
+
+
+CODECS = {PCM: PCMCodec, OPUS: OpusCodec, MP3: MP3Codec}
+
+
+def get_codec(name, sample_rate, frame_ms):
+    try:
+        return CODECS[name](sample_rate, frame_ms)
+    except KeyError:
+        raise CodecUnavailable(f"Unknown codec: {name}")
+
+
+class TimedCodec:
+    """Wraps a codec to account transport bytes and CPU time in the metrics registry"""
+
+    def __init__(self, codec):
+        self.codec = codec
+        self.name = codec.name
+
+    def _timed(self, operation, function, *args):
+        started = time.process_time()
+        try:
+            return function(*args)
+        finally:
+            codec_seconds_total.inc(time.process_time() - started, codec=self.name, operation=operation)
+
+    def decode(self, payload):
+        transport_bytes_total.inc(len(payload), direction='uplink', codec=self.name)
+        return self._timed('decode', self.codec.decode, payload)
+
+    def encode_mp3(self, mp3):
+        packets = self._timed('encode', self.codec.encode_mp3, mp3)
+        transport_bytes_total.inc(sum(len(packet) for packet in packets), direction='downlink', codec=self.name)
+        return packets
+
+
+class ClientAudioSource:
+    """Input stream fed with decoded client audio; read() mirrors sounddevice.InputStream.read.
+
+    Holds at most `max_buffer_ms` of audio; when the consumer falls behind the
+    oldest samples are dropped and the next read reports an overflow."""
+
+    def __init__(self, sample_rate, max_buffer_ms=2000, read_timeout=0.1):
+        self.sample_rate = sample_rate
+        self.max_buffer_bytes = sample_rate * 2 * max_buffer_ms // 1000
+        self.read_timeout = read_timeout
+        self._buffer = bytearray()
+        self._cond = threading.Condition()
+        self._overflowed = False
+        self.overflows = 0
+
+    def write(self, pcm):
+        with self._cond:
+            self._buffer.extend(pcm)
+            excess = len(self._buffer) - self.max_buffer_bytes
+            if excess > 0:
+                # Keep frame alignment: drop whole samples only
+                excess += excess % 2
+                del self._buffer[:excess]
+                self._overflowed = True
+                self.overflows += 1
+            self._cond.notify()
+
+    def read(self, frames):
+        """Return (int16 array of shape (frames, 1), overflowed); empty on timeout"""
+        wanted = frames * 2
+        with self._cond:
+            if not self._cond.wait_for(lambda: len(self._buffer) >= wanted, timeout=self.read_timeout):
+                return np.zeros((0, 1), dtype=np.int16), False
+            chunk = bytes(self._buffer[:wanted])
+            del self._buffer[:wanted]
+            overflowed, self._overflowed = self._overflowed, False
+        return np.frombuffer(chunk, dtype=np.int16).reshape(-1, 1), overflowed
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def close(self):
+        with self._cond:
+            self._buffer.clear()
+            self._cond.notify_all()
+
@@ -0,0 +1,224 @@
+# capture.py
+import os
+import threading
+import time
+import logging
+
+import numpy as np
+
+from utils.metrics import REGISTRY
+
+# 'blocking' polls stream.read(); 'callback' lets PortAudio push frames into a FrameRingBuffer
+AUDIO_CAPTURE_MODE = os.getenv('AUDIO_CAPTURE_MODE', 'blocking').lower()
+# Audio the ring buffer can hold while the consumer (VAD loop) is stalled
+AUDIO_RING_BUFFER_MS = int(os.getenv('AUDIO_RING_BUFFER_MS', 2000))
+# Metrics are updated in batches (and whenever the consumer goes idle) to keep locks off the per-frame path
+REPORT_EVERY_FRAMES = 50
+
+captured_frames_total = REGISTRY.counter('voicebot_capture_frames_total', 'Audio frames delivered to the VAD loop')
+dropped_frames_total = REGISTRY.counter(
+    'voicebot_capture_dropped_frames_total',
+    'Audio frames lost before the VAD loop saw them',
+    labelnames=('reason',)
+)
+
+
+class RingBusy(Exception):
+    """Raised when a second consumer tries to read a FrameRingBuffer"""
+
+
+class FrameRingBuffer:
+    """Preallocated single-producer/single-consumer ring of fixed-size int16 frames.
+
+    The producer (an audio callback) only advances the write count and the
+    consumer only advances the release count, so neither side takes a lock;
+    under the GIL each integer store is atomic. When the ring is full new
+    frames are dropped and counted rather than overwriting frames the
+    consumer may still be reading.
+
+    read_frame() returns a memoryview straight into the ring. A frame stays
+    valid until the consumer release()s it, so it can hold a few frames (the
+    VAD padding window) without copying them. Only one consumer may read at a
+    time: it attach_consumer()s first and detach_consumer()s when done."""
+
+    def __init__(self, frame_samples, capacity_frames):
+        self.frame_samples = frame_samples
+        self.capacity = capacity_frames
+        self._samples = np.zeros(capacity_frames * frame_samples, dtype=np.int16)
+        self._frames = [memoryview(self._samples[i * frame_samples:(i + 1) * frame_samples])
+                        for i in range(capacity_frames)]
+        self._written = 0   # frames published by the producer
+        self._read = 0      # frames handed to the consumer
+        self._released = 0  # frames the consumer is done with
+        self._fill = 0      # samples written into the frame being assembled
+        self._dropping = False
+        self._data_ready = threading.Event()
+        self._consumer_waiting = False
+        self._consumer = threading.Lock()
+        # Producer-side counts, turned into metrics by the consumer so the callback never takes a lock
+        self.dropped = 0
+        self.input_overflows = 0
+        self._reported_read = 0
+        self._reported_dropped = 0
+        self._reported_overflows = 0
+
+    @classmethod
+    def for_duration(cls, sample_rate, frame_ms, buffer_ms=AUDIO_RING_BUFFER_MS):
+        frame_samples = sample_rate * frame_ms // 1000
+        return cls(frame_samples, max(2, buffer_ms // frame_ms))
+
+    # Producer side
+
+    def write(self, samples):
+        """Append int16 samples (any length); completes and publishes frames as they fill"""
+        samples = samples.reshape(-1)
+        offset = 0
+        total = len(samples)
+        while offset < total:
+            if self._fill == 0:
+                # Starting a new frame: only if its slot is free, otherwise drop one frame's worth
+                self._dropping = self._written - self._released >= self.capacity
+            take = min(self.frame_samples - self._fill, total - offset)
+            if not self._dropping:
+                start = (self._written % self.capacity) * self.frame_samples + self._fill
+                self._samples[start:start + take] = samples[offset:offset + take]
+            self._fill += take
+            offset += take
+            if self._fill == self.frame_samples:
+                self._fill = 0
+                if self._dropping:
+                    self.dropped += 1
+                else:
+                    self._written += 1
+                    # Only pay for the event when the consumer is actually waiting on it
+                    if self._consumer_waiting:
+                        self._data_ready.set()
+
+    def callback(self, indata, frames, time_info, status):
+        """sounddevice.InputStream callback"""
+        if status and status.input_overflow:
+            self.input_overflows += 1
+        self.write(indata[:, 0] if indata.ndim == 2 else indata)
+
+    # Consumer side
+
+    def read_frame(self, timeout=0.1):
+        """Next frame as a memoryview into the ring, or None if none arrived within `timeout`"""
+        if self._read == self._written:
+            self._data_ready.clear()
+            self._consumer_waiting = True
+            # Re-check: the producer may have published before it saw the flag
+            ready = self._read != self._written or self._data_ready.wait(timeout)
+            self._consumer_waiting = False
+            if not ready:
+                self._report()
+                return None
+        frame = self._frames[self._read % self.capacity]
+        self._read += 1
+        if self._read - self._reported_read >= REPORT_EVERY_FRAMES:
+            self._report()
+        return frame
+
+    def release(self, count=1):
+        """Hand the oldest `count` frames returned by read_frame back to the producer"""
+        self._released = min(self._released + count, self._read)
+
+    def release_all(self):
+        self._released = self._read
+
+    def attach_consumer(self):
+        """Become the ring's only consumer, starting at the newest frame; raises RingBusy if it has one"""
+        if not self._consumer.acquire(blocking=False):
+            raise RingBusy("The audio ring buffer is already being read")
+        self.discard_pending()
+
+    def detach_consumer(self):
+        """Release every held frame and let the next consumer attach"""
+        self.release_all()
+        self._consumer.release()
+
+    def discard_pending(self):
+        """Skip to the newest frame when a consumer starts, releasing everything it held.
+
+        While nobody is recording the callback keeps writing until the ring is
+        full; those stale frames are skipped and the drops and overflows that
+        piled up meanwhile are not reported."""
+        if self._read != self._reported_read:
+            captured_frames_total.inc(self._read - self._reported_read)
+        self._read = self._reported_read = self._written
+        self._released = self._read
+        self._reported_dropped = self.dropped
+        self._reported_overflows = self.input_overflows
+
+    @property
+    def held(self):
+        return self._read - self._released
+
+    @property
+    def pending(self):
+        return self._written - self._read
+
+    def _report(self):
+        """Move the counts gathered since the last report into the metrics registry"""
+        if self._read != self._reported_read:
+            captured_frames_total.inc(self._read - self._reported_read)
+            self._reported_read = self._read
+        if self.dropped != self._reported_dropped:
+            dropped_frames_total.inc(self.dropped - self._reported_dropped, reason='ring_full')
+            self._reported_dropped = self.dropped
+        if self.input_overflows != self._reported_overflows:
+            dropped_frames_total.inc(self.input_overflows - self._reported_overflows, reason='input_overflow')
+            self._reported_overflows = self.input_overflows
+
+
+class SyntheticStreamSource:
+    """Stands in for sounddevice.InputStream(callback=...) without audio hardware.
+
+    A thread feeds `pcm` to the callback in `blocksize` blocks, paced at
+    `speed` times real time (0 = as fast as possible), optionally looping."""
+
+    def __init__(self, pcm, callback, samplerate, blocksize, speed=1.0, loop=False):
+        self.samples = np.frombuffer(pcm, dtype=np.int16).reshape(-1, 1)
+        self.callback = callback
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.speed = speed
+        self.loop = loop
+        self.finished = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='synthetic-audio', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        block_seconds = self.blocksize / self.samplerate / self.speed if self.speed > 0 else 0.0
+        next_block = time.perf_counter()
+        try:
+            while not self._stopped.is_set():
+                for start in range(0, len(self.samples) - self.blocksize + 1, self.blocksize):
+                    if self._stopped.is_set():
+                        return
+                    self.callback(self.samples[start:start + self.blocksize], self.blocksize, None, None)
+                    if block_seconds:
+                        next_block += block_seconds
+                        delay = next_block - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                if not self.loop:
+                    return
+        except Exception as e:
+            logging.error(f"Synthetic audio source failed: {e}")
+        finally:
+            self.finished.set()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1)
+        self._thread = None
+
+    def close(self):
+        self.stop()
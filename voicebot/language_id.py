@@ -0,0 +1,122 @@
+# language_id.py
+import os
+import threading
+import logging
+from collections import OrderedDict
+
+DEFAULT_VOICE_MAP = {
+    'en': "en-IN-PrabhatNeural",
+    'hi': "hi-IN-MadhurNeural",
+    'hinglish': "en-IN-PrabhatNeural",  # Indian English voice reads romanized Hindi best
+}
+
+# Replies shorter than this reuse the session's running language without scanning
+SHORT_TEXT_CHARS = int(os.getenv('LANGUAGE_ID_SHORT_TEXT_CHARS', 40))
+# Minority-script share of letters above which text counts as mixed
+MIXED_SCRIPT_SHARE = 0.1
+# Romanized Hindi function words; unambiguous with English so a couple of hits mark Hinglish
+ROMANIZED_HINDI_WORDS = frozenset((
+    'hai', 'hain', 'kya', 'nahi', 'nahin', 'aap', 'aapka', 'aapki', 'mera', 'meri', 'mere', 'mujhe', 'tum',
+    'hum', 'kar', 'karo', 'karna', 'karte', 'kiya', 'gaya', 'raha', 'rahi', 'tha', 'thi', 'ka', 'ki', 'ke',
+    'ko', 'se', 'mein', 'bhi', 'yeh', 'woh', 'kaise', 'kyun', 'kaun', 'accha', 'acha', 'theek', 'madad',
+    'sakte', 'sakta', 'chahiye', 'ne', 'aur', 'lekin', 'bahut',
+))
+ROMANIZED_HINDI_MIN_WORDS = 2
+ROMANIZED_HINDI_SHARE = 0.2
+MAX_TRACKED_SESSIONS = 10000
+
+
+def parse_voice_map(spec):
+    """Parse "en=voice,hi=voice,hinglish=voice" into a dict, falling back to the defaults"""
+    voice_map = dict(DEFAULT_VOICE_MAP)
+    if spec:
+        for item in spec.split(','):
+            lang, _, voice = item.partition('=')
+            if lang.strip() and voice.strip():
+                voice_map[lang.strip()] = voice.strip()
+    return voice_map
+
+
+def classify_text(text):
+    """Classify text as 'en', 'hi' or 'hinglish' in a single pass over its characters.
+
+    Devanagari and Latin letters are counted by code point range; romanized
+    Hindi is spotted from function words collected during the same pass.
+    Returns None when the text has no letters at all."""
+    devanagari = 0
+    latin = 0
+    latin_words = 0
+    hindi_words = 0
+    word = []
+
+    for ch in text:
+        code = ord(ch)
+        if 0x0900 <= code <= 0x097F:
+            devanagari += 1
+        elif (97 <= code <= 122) or (65 <= code <= 90):
+            latin += 1
+            word.append(ch)
+            continue
+        if word:
+            latin_words += 1
+            if ''.join(word).lower() in ROMANIZED_HINDI_WORDS:
+                hindi_words += 1
+            word = []
+    if word:
+        latin_words += 1
+        if ''.join(word).lower() in ROMANIZED_HINDI_WORDS:
+            hindi_words += 1
+
+    letters = devanagari + latin
+    if letters == 0:
+        return None
+    if latin < MIXED_SCRIPT_SHARE * letters:
+        return 'hi'
+    if devanagari >= MIXED_SCRIPT_SHARE * letters:
+        return 'hinglish'
+    if hindi_words >= ROMANIZED_HINDI_MIN_WORDS and hindi_words >= ROMANIZED_HINDI_SHARE * latin_words:
+        return 'hinglish'
+    return 'en'
+
+
+class LanguageIdentifier:
+    """Picks the reply language and voice, remembering each session's running language"""
+
+    def __init__(self, voice_map=None, short_text_chars=SHORT_TEXT_CHARS, default_language='en'):
+        self.voice_map = dict(voice_map or DEFAULT_VOICE_MAP)
+        self.short_text_chars = short_text_chars
+        self.default_language = default_language
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def detect(self, text, session_id=None):
+        """Language of `text`; short replies inherit the session's language in O(1)"""
+        if session_id is not None and len(text) < self.short_text_chars:
+            with self._lock:
+                language = self._sessions.get(session_id)
+            if language is not None:
+                return language
+
+        language = classify_text(text)
+        if language is None:
+            with self._lock:
+                return self._sessions.get(session_id, self.default_language)
+
+        if session_id is not None:
+            with self._lock:
+                self._sessions[session_id] = language
+                self._sessions.move_to_end(session_id)
+                while len(self._sessions) > MAX_TRACKED_SESSIONS:
+                    self._sessions.popitem(last=False)
+        return language
+
+    def voice_for(self, language):
+        return self.voice_map.get(language, self.voice_map.get(self.default_language))
+
+    def forget(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+language_identifier = LanguageIdentifier(parse_voice_map(os.getenv('TTS_VOICE_MAP')))
+logging.debug(f"TTS voice map: {language_identifier.voice_map}")
@@ -0,0 +1,143 @@
+# llm_scheduler.py
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from utils.metrics import REGISTRY
+
+# Seconds a turn may wait for an LLM slot before the canned reply is used
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv('LLM_QUEUE_TIMEOUT_SECONDS', 8.0))
+# Typical completion time, used with the key pool's request rate to size the concurrency cap
+LLM_EXPECTED_LATENCY_SECONDS = float(os.getenv('LLM_EXPECTED_LATENCY_SECONDS', 2.0))
+
+CANNED_BUSY_REPLY = "I'm talking with a lot of people right now. Could you ask me that again in a moment?"
+
+queue_depth = REGISTRY.gauge('voicebot_llm_queue_depth', 'LLM requests waiting for a slot')
+active_requests = REGISTRY.gauge('voicebot_llm_active_requests', 'LLM requests currently running')
+queue_wait_seconds = REGISTRY.histogram('voicebot_llm_queue_wait_seconds', 'Time spent waiting for an LLM slot')
+queue_timeouts_total = REGISTRY.counter('voicebot_llm_queue_timeouts_total',
+                                        'LLM requests that gave up waiting for a slot')
+
+
+class SchedulerTimeout(Exception):
+    """Raised when a request waited longer than its queue deadline"""
+
+
+class _Ticket:
+    __slots__ = ('session_id', 'granted', 'enqueued_at')
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.granted = False
+        self.enqueued_at = time.perf_counter()
+
+
+class LLMScheduler:
+    """Caps concurrent LLM calls and hands free slots to sessions round-robin,
+    so one chatty session cannot starve the others"""
+
+    def __init__(self, max_concurrency, queue_timeout=LLM_QUEUE_TIMEOUT_SECONDS):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._queues = OrderedDict()  # session id -> deque of tickets, in round-robin order
+
+    @classmethod
+    def from_key_pool(cls, api_key_manager, expected_latency=LLM_EXPECTED_LATENCY_SECONDS, **kwargs):
+        """Size the cap so the pool's request rate keeps every slot busy (Little's law).
+
+        The manager's per-key limits are already this worker's share (VOICEBOT_WORKERS)."""
+        override = os.getenv('LLM_MAX_CONCURRENCY')
+        if override:
+            return cls(int(override), **kwargs)
+        requests_per_second = api_key_manager.capacity_per_minute() / 60.0
+        max_concurrency = max(1, int(requests_per_second * expected_latency))
+        logging.info(f"LLM scheduler concurrency cap: {max_concurrency}")
+        return cls(max_concurrency, **kwargs)
+
+    @property
+    def depth(self):
+        return self._waiting
+
+    @property
+    def active(self):
+        return self._active
+
+    def _dispatch(self):
+        """Grant free slots to the head ticket of each session in turn (caller holds the lock)"""
+        granted = False
+        while self._active < self.max_concurrency and self._queues:
+            session_id, tickets = next(iter(self._queues.items()))
+            ticket = tickets.popleft()
+            if tickets:
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+            ticket.granted = True
+            self._active += 1
+            self._waiting -= 1
+            granted = True
+        if granted:
+            self._cond.notify_all()
+        self._update_gauges()
+
+    def _update_gauges(self):
+        queue_depth.set(self._waiting)
+        active_requests.set(self._active)
+
+    def _enqueue(self, session_id):
+        """Queue a ticket for the session and grant whatever slots are free (caller holds the lock)"""
+        ticket = _Ticket(session_id)
+        self._queues.setdefault(session_id, deque()).append(ticket)
+        self._waiting += 1
+        self._dispatch()
+        return ticket
+
+    def acquire(self, session_id, timeout=None):
+        """Block until this session is granted a slot; raises SchedulerTimeout past the deadline"""
+        timeout = self.queue_timeout if timeout is None else timeout
+        with self._cond:
+            ticket = self._enqueue(session_id)
+            if not self._cond.wait_for(lambda: ticket.granted, timeout):
+                tickets = self._queues.get(session_id)
+                tickets.remove(ticket)
+                if not tickets:
+                    del self._queues[session_id]
+                self._waiting -= 1
+                self._update_gauges()
+                queue_timeouts_total.inc()
+                queue_wait_seconds.observe(time.perf_counter() - ticket.enqueued_at)
+                raise SchedulerTimeout(f"No LLM slot for session {session_id} within {timeout:.1f}s")
+        queue_wait_seconds.observe(time.perf_counter() - ticket.enqueued_at)
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, session_id, timeout=None):
+        self.acquire(session_id, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler():
+    """Process-wide scheduler sized from the Groq key pool"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            from utils.api_key_manager import APIKeyManager
+            _scheduler = LLMScheduler.from_key_pool(APIKeyManager())
+        return _scheduler
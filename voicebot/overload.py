@@ -0,0 +1,208 @@
+# overload.py
+import os
+import threading
+import time
+import logging
+from collections import deque
+
+from utils.metrics import REGISTRY
+
+# Degradation levels, mildest first. Each level keeps everything the previous one did.
+NORMAL, REDUCED, TEXT_ONLY, REJECT = range(4)
+LEVEL_NAMES = ('normal', 'reduced', 'text_only', 'reject')
+
+
+def parse_thresholds(spec):
+    """Parse "reduced,text_only,reject" thresholds, e.g. "0.5,1.5,3", into a tuple of three floats"""
+    values = tuple(float(value) for value in spec.split(','))
+    if len(values) != 3:
+        raise ValueError(f"Expected three comma-separated thresholds, got {spec!r}")
+    return values
+
+
+def parse_stage_budgets(spec):
+    """Parse "stt=1.5,tts_first_byte=1.0" into {stage: seconds}"""
+    budgets = {}
+    for item in spec.split(','):
+        stage, _, seconds = item.partition('=')
+        if stage.strip() and seconds.strip():
+            budgets[stage.strip()] = float(seconds)
+    return budgets
+
+
+OVERLOAD_CONTROL = os.getenv('OVERLOAD_CONTROL', 'true').lower() == 'true'
+# LLM requests waiting per scheduler slot at which each level starts
+OVERLOAD_QUEUE_PER_SLOT = parse_thresholds(os.getenv('OVERLOAD_QUEUE_PER_SLOT', '0.5,1.5,3'))
+# Share of the Groq key pool's per-minute requests left, below which each level starts
+OVERLOAD_KEY_HEADROOM = parse_thresholds(os.getenv('OVERLOAD_KEY_HEADROOM', '0.3,0.15,0.05'))
+# Normal p95 of the stages to watch (seconds since the previous turn mark) ...
+OVERLOAD_STAGE_BUDGETS = parse_stage_budgets(
+    os.getenv('OVERLOAD_STAGE_BUDGETS', 'stt=1.5,llm_first_token=1.5,tts_first_byte=1.0'))
+# ... and the multiples of that budget at which each level starts
+OVERLOAD_LATENCY_FACTORS = parse_thresholds(os.getenv('OVERLOAD_LATENCY_FACTORS', '1,2,3'))
+# Stage latencies are judged over this many recent seconds, once at least OVERLOAD_MIN_SAMPLES are in
+OVERLOAD_WINDOW_SECONDS = float(os.getenv('OVERLOAD_WINDOW_SECONDS', 30))
+OVERLOAD_MIN_SAMPLES = int(os.getenv('OVERLOAD_MIN_SAMPLES', 5))
+# Escalation is immediate; stepping down one level needs the signals to stay below it this long
+OVERLOAD_RECOVERY_SECONDS = float(os.getenv('OVERLOAD_RECOVERY_SECONDS', 15))
+OVERLOAD_EVAL_INTERVAL_SECONDS = 0.5
+
+# What the reduced level does to each LLM call
+OVERLOAD_MAX_TOKENS = int(os.getenv('OVERLOAD_MAX_TOKENS', 150))
+OVERLOAD_HISTORY_MESSAGES = int(os.getenv('OVERLOAD_HISTORY_MESSAGES', 6))
+OVERLOAD_LLM_DEADLINE_SECONDS = float(os.getenv('OVERLOAD_LLM_DEADLINE_SECONDS', 4.0))
+# Suggested back-off sent to clients refused at the reject level
+OVERLOAD_RETRY_AFTER_SECONDS = int(os.getenv('OVERLOAD_RETRY_AFTER_SECONDS', 30))
+
+overload_level = REGISTRY.gauge('voicebot_overload_level',
+                                'Current degradation level (0 normal, 1 reduced, 2 text_only, 3 reject)')
+overload_signal_level = REGISTRY.gauge('voicebot_overload_signal_level',
+                                       'Level each load signal alone asks for', labelnames=('signal',))
+overload_transitions_total = REGISTRY.counter('voicebot_overload_transitions_total',
+                                              'Degradation level changes', labelnames=('previous', 'level'))
+degraded_turns_total = REGISTRY.counter('voicebot_overload_degraded_turns_total',
+                                        'Turns served at a degraded level', labelnames=('level',))
+rejected_sessions_total = REGISTRY.counter('voicebot_overload_rejected_sessions_total',
+                                           'start_recording requests refused at the reject level')
+
+
+def level_above(value, thresholds):
+    """Highest level whose threshold `value` has reached"""
+    return sum(1 for threshold in thresholds if value >= threshold)
+
+
+def level_below(value, thresholds):
+    """Highest level whose threshold `value` has fallen below"""
+    return sum(1 for threshold in thresholds if value < threshold)
+
+
+def trim_history(history, keep=OVERLOAD_HISTORY_MESSAGES):
+    """System prompt plus the last `keep` messages of the conversation"""
+    system = [message for message in history[:1] if message.get('role') == 'system']
+    return system + history[len(system):][-keep:]
+
+
+class OverloadController:
+    """Turns load signals into one degradation level for this worker.
+
+    Signals are the LLM scheduler's queue per slot, the Groq key pool's
+    headroom and the recent p95 of selected turn stages; the level is the
+    worst any of them asks for. Levels go up as soon as a signal crosses a
+    threshold and come down one step at a time after OVERLOAD_RECOVERY_SECONDS
+    below it, so a burst does not make the service flap."""
+
+    def __init__(self, scheduler=None, key_headroom=None, enabled=OVERLOAD_CONTROL,
+                 queue_thresholds=OVERLOAD_QUEUE_PER_SLOT, headroom_thresholds=OVERLOAD_KEY_HEADROOM,
+                 stage_budgets=None, latency_factors=OVERLOAD_LATENCY_FACTORS, window=OVERLOAD_WINDOW_SECONDS,
+                 min_samples=OVERLOAD_MIN_SAMPLES, recovery=OVERLOAD_RECOVERY_SECONDS,
+                 eval_interval=OVERLOAD_EVAL_INTERVAL_SECONDS):
+        self.scheduler = scheduler
+        # Callable returning the key pool's headroom (0..1); None skips the signal
+        self.key_headroom = key_headroom
+        self.enabled = enabled
+        self.queue_thresholds = queue_thresholds
+        self.headroom_thresholds = headroom_thresholds
+        self.stage_budgets = dict(OVERLOAD_STAGE_BUDGETS if stage_budgets is None else stage_budgets)
+        self.latency_factors = latency_factors
+        self.window = window
+        self.min_samples = min_samples
+        self.recovery = recovery
+        self.eval_interval = eval_interval
+        self.signals = {}
+        self._samples = {stage: deque() for stage in self.stage_budgets}  # stage -> (time, seconds)
+        self._level = NORMAL
+        self._calm_since = None
+        self._evaluated_at = None
+        self._lock = threading.Lock()
+        overload_level.set(NORMAL)
+
+    def observe_trace(self, trace):
+        """TurnTrace finish callback feeding the stage latency signals"""
+        durations = trace.stage_durations()
+        now = time.monotonic()
+        with self._lock:
+            for stage, samples in self._samples.items():
+                if stage in durations:
+                    samples.append((now, durations[stage]))
+
+    def _stage_p95(self, stage, now):
+        samples = self._samples[stage]
+        while samples and now - samples[0][0] > self.window:
+            samples.popleft()
+        if len(samples) < self.min_samples:
+            return None
+        values = sorted(seconds for _, seconds in samples)
+        return values[int(0.95 * (len(values) - 1))]
+
+    def _signal_levels(self, now):
+        levels = {}
+        if self.scheduler is not None:
+            per_slot = self.scheduler.depth / self.scheduler.max_concurrency
+            levels['llm_queue'] = level_above(per_slot, self.queue_thresholds)
+        if self.key_headroom is not None:
+            try:
+                levels['key_headroom'] = level_below(self.key_headroom(), self.headroom_thresholds)
+            except Exception as e:
+                logging.error(f"Key headroom signal failed: {e}")
+        for stage, budget in self.stage_budgets.items():
+            p95 = self._stage_p95(stage, now)
+            levels[stage] = NORMAL if p95 is None else level_above(p95 / budget, self.latency_factors)
+        return levels
+
+    def level(self):
+        """Current level, re-evaluated at most every `eval_interval` seconds"""
+        if not self.enabled:
+            return NORMAL
+        now = time.monotonic()
+        with self._lock:
+            if self._evaluated_at is not None and now - self._evaluated_at < self.eval_interval:
+                return self._level
+            self._evaluated_at = now
+            self.signals = self._signal_levels(now)
+            for signal, value in self.signals.items():
+                overload_signal_level.set(value, signal=signal)
+
+            target = max(self.signals.values(), default=NORMAL)
+            if target > self._level:
+                self._change(target)
+                self._calm_since = None
+            elif target < self._level:
+                if self._calm_since is None:
+                    self._calm_since = now
+                elif now - self._calm_since >= self.recovery:
+                    self._change(self._level - 1)
+                    self._calm_since = now
+            else:
+                self._calm_since = None
+            return self._level
+
+    def _change(self, level):
+        """Move to `level` (caller holds the lock)"""
+        previous, self._level = self._level, level
+        overload_level.set(level)
+        overload_transitions_total.inc(previous=LEVEL_NAMES[previous], level=LEVEL_NAMES[level])
+        worst = sorted(signal for signal, value in self.signals.items() if value >= level)
+        log = logging.warning if level > previous else logging.info
+        log(f"Overload level {LEVEL_NAMES[previous]} -> {LEVEL_NAMES[level]} (signals: {', '.join(worst) or 'none'})")
+
+    def admit(self):
+        """Whether a new session may start recording; refusals are counted"""
+        if self.level() >= REJECT:
+            rejected_sessions_total.inc()
+            return False
+        return True
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_overload_controller():
+    """Process-wide controller watching the process-wide LLM scheduler and the Groq key pool"""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            from utils.api_key_manager import APIKeyManager
+            from .llm_scheduler import get_llm_scheduler
+            _controller = OverloadController(get_llm_scheduler(), APIKeyManager().headroom)
+        return _controller
@@ -0,0 +1,169 @@
+# profiler.py
+import math
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from utils.metrics import REGISTRY
+
+# Longest profile a single request may ask for
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', 60))
+PROFILE_DEFAULT_INTERVAL_MS = 10
+PROFILE_MIN_INTERVAL_MS = 1
+# Coarsest sampling a request may ask for; a run never outlasts its `seconds` either way
+PROFILE_MAX_INTERVAL_MS = float(os.getenv('PROFILE_MAX_INTERVAL_MS', 1000))
+PROFILE_MAX_DEPTH = 128
+# Leaf frames of threads that are blocked rather than running; dropped unless idle stacks are asked for
+IDLE_FRAMES = frozenset((
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'),
+    ('selectors.py', 'select'),
+    ('socket.py', 'accept'),
+    ('socket.py', 'readinto'),
+    ('socketserver.py', 'serve_forever'),
+))
+
+profiles_total = REGISTRY.counter('voicebot_profiles_total', 'Sampling profiles taken')
+profile_samples_total = REGISTRY.counter('voicebot_profile_samples_total', 'Stack snapshots taken by the profiler')
+profile_overhead_seconds_total = REGISTRY.counter('voicebot_profile_overhead_seconds_total',
+                                                  'Time the profiler spent walking thread stacks')
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another one is running"""
+
+
+def thread_label(name):
+    """Thread name with its sequence number dropped, so threads doing the same job share a root frame"""
+    return re.sub(r'-\d+', '', name)
+
+
+def frame_label(code):
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profile:
+    """Result of one sampling run: stack counts plus what the run cost"""
+
+    def __init__(self, stacks, samples, seconds, interval, overhead_seconds):
+        self.stacks = stacks
+        self.samples = samples
+        self.seconds = seconds
+        self.interval = interval
+        self.overhead_seconds = overhead_seconds
+
+    def collapsed(self):
+        """One "root;caller;callee count" line per stack, the input format of flamegraph.pl and speedscope"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def to_dict(self):
+        return {
+            'samples': self.samples,
+            'seconds': round(self.seconds, 3),
+            'interval_ms': self.interval * 1000,
+            'overhead_seconds': round(self.overhead_seconds, 4),
+            'overhead_ratio': round(self.overhead_seconds / self.seconds, 4) if self.seconds else 0.0,
+            'stacks': dict(self.stacks.most_common()),
+        }
+
+
+class SamplingProfiler:
+    """Wall-clock sampler over every thread's Python stack, built on sys._current_frames().
+
+    Nothing runs between profiles, so it is safe to leave enabled; while a
+    profile runs, the sampling thread holds the GIL only for the stack walk
+    (tens of microseconds per sample) and its cost is reported with the
+    result. Only one profile runs at a time. Threads spend time in C
+    extensions (webrtcvad, pydub) attributed to the Python frame that called
+    them."""
+
+    def __init__(self, max_depth=PROFILE_MAX_DEPTH):
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._lock.locked()
+
+    def profile(self, seconds, interval=PROFILE_DEFAULT_INTERVAL_MS / 1000, include_idle=False):
+        """Sample for `seconds` every `interval` seconds from the calling thread; returns a Profile
+
+        `seconds` is capped at PROFILE_MAX_SECONDS and `interval` clamped to
+        PROFILE_MIN_INTERVAL_MS..PROFILE_MAX_INTERVAL_MS."""
+        if not (math.isfinite(seconds) and math.isfinite(interval)):
+            raise ValueError("seconds and interval must be finite")
+        interval = min(max(interval, PROFILE_MIN_INTERVAL_MS / 1000), PROFILE_MAX_INTERVAL_MS / 1000)
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running")
+        try:
+            return self._sample(min(seconds, PROFILE_MAX_SECONDS), interval, include_idle)
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds, interval, include_idle):
+        me = threading.get_ident()
+        raw = Counter()  # (thread ident, code objects root first) -> samples
+        names = {}
+        idle_codes = {}  # leaf code object -> whether it means the thread is blocked
+        samples = 0
+        overhead = 0.0
+        started = time.perf_counter()
+        deadline = started + seconds
+        next_sample = started
+
+        while True:
+            walk_started = time.perf_counter()
+            if walk_started >= deadline:
+                break
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if not include_idle:
+                    # Decided from the leaf alone, so blocked threads cost no stack walk
+                    idle = idle_codes.get(frame.f_code)
+                    if idle is None:
+                        code = frame.f_code
+                        idle = idle_codes[code] = (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+                    if idle:
+                        continue
+                if ident not in names:
+                    names.update((thread.ident, thread.name) for thread in threading.enumerate())
+                    names.setdefault(ident, f"thread {ident}")
+                codes = []
+                while frame is not None and len(codes) < self.max_depth:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                codes.reverse()
+                raw[(ident, tuple(codes))] += 1
+            frame = None
+            samples += 1
+            now = time.perf_counter()
+            overhead += now - walk_started
+
+            next_sample += interval
+            delay = next_sample - now
+            if delay > 0:
+                # Never sleep past the deadline: the lock is held until this returns
+                time.sleep(min(delay, max(deadline - now, 0)))
+            else:
+                # Fell behind (e.g. starved of the GIL): carry on from now instead of sampling in a burst
+                next_sample = now
+
+        # Labels are built once per distinct stack, after sampling, to keep the walk itself cheap
+        stacks = Counter()
+        for (ident, codes), count in raw.items():
+            stack = ';'.join([thread_label(names[ident])] + [frame_label(code) for code in codes])
+            stacks[stack] += count
+
+        profiles_total.inc()
+        profile_samples_total.inc(samples)
+        profile_overhead_seconds_total.inc(overhead)
+        return Profile(stacks, samples, time.perf_counter() - started, interval, overhead)
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,161 @@
+# response_cache.py
+import re
+import threading
+import time
+import zlib
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from utils.metrics import REGISTRY
+
+# Size of the hashed character-trigram vectors used for similarity lookups
+EMBEDDING_DIM = 512
+
+cache_requests_total = REGISTRY.counter(
+    'voicebot_response_cache_requests_total',
+    'Response cache lookups by result',
+    labelnames=('result',)
+)
+
+
+def normalize_text(text: str) -> str:
+    """Lower-case, strip punctuation and collapse whitespace so trivial variations share a key"""
+    text = text.lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def embed_text(normalized: str) -> np.ndarray:
+    """Cheap local embedding: L2-normalised bag of hashed character trigrams"""
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    padded = f"  {normalized}  "
+    for i in range(len(padded) - 2):
+        vector[zlib.crc32(padded[i:i + 3].encode()) % EMBEDDING_DIM] += 1.0
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+def recent_context_is_cacheable(messages: List[Dict], max_context_turns: int = 0) -> bool:
+    """A context window is safe to cache when the question has at most
+    `max_context_turns` earlier user turns that could change its meaning"""
+    user_turns = sum(1 for message in messages if message.get("role") == "user")
+    # The last user message is the question itself
+    return max(0, user_turns - 1) <= max_context_turns
+
+
+class ResponseCache:
+    def __init__(self, max_entries=256, ttl_seconds=3600, similarity_threshold=None,
+                 max_context_turns=0, context_policy: Optional[Callable[[List[Dict]], bool]] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.max_context_turns = max_context_turns
+        self.context_policy = context_policy
+        self._entries = OrderedDict()  # normalized text -> (response, expires_at, embedding)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def is_cacheable(self, messages: List[Dict]) -> bool:
+        """Check whether the conversation context allows using the cache"""
+        if self.context_policy is not None:
+            return self.context_policy(messages)
+        return recent_context_is_cacheable(messages, self.max_context_turns)
+
+    def get(self, user_input: str, messages: List[Dict]) -> Optional[str]:
+        """Return a cached response for the question, or None on a miss"""
+        if not self.is_cacheable(messages):
+            with self._lock:
+                self.skipped += 1
+            cache_requests_total.inc(result='skipped')
+            return None
+
+        key = normalize_text(user_input)
+        if not key:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                response, expires_at, _ = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    cache_requests_total.inc(result='hit')
+                    logging.info(f"Response cache hit: {key}")
+                    return response
+                del self._entries[key]
+                self.expirations += 1
+
+            if self.similarity_threshold is not None and self._entries:
+                response = self._similar_lookup(key, now)
+                if response is not None:
+                    self.similar_hits += 1
+                    cache_requests_total.inc(result='similar_hit')
+                    return response
+
+            self.misses += 1
+            cache_requests_total.inc(result='miss')
+            return None
+
+    def _similar_lookup(self, key, now):
+        """Find the closest live entry by cosine similarity (caller holds the lock)"""
+        query = embed_text(key)
+        best_key, best_score = None, self.similarity_threshold
+        for candidate, (_, expires_at, embedding) in self._entries.items():
+            if expires_at <= now or embedding is None:
+                continue
+            score = float(np.dot(query, embedding))
+            if score >= best_score:
+                best_key, best_score = candidate, score
+
+        if best_key is None:
+            return None
+
+        self._entries.move_to_end(best_key)
+        logging.info(f"Response cache similarity hit ({best_score:.2f}): {key} -> {best_key}")
+        return self._entries[best_key][0]
+
+    def put(self, user_input: str, messages: List[Dict], response: str):
+        """Store a response; `messages` is the context the question was asked in"""
+        if not response or not self.is_cacheable(messages):
+            return
+
+        key = normalize_text(user_input)
+        if not key:
+            return
+
+        embedding = embed_text(key) if self.similarity_threshold is not None else None
+        with self._lock:
+            self._entries[key] = (response, time.time() + self.ttl_seconds, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'similar_hits': self.similar_hits,
+                'misses': self.misses,
+                'skipped': self.skipped,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
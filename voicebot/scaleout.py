@@ -0,0 +1,50 @@
+# scaleout.py
+import os
+import queue
+import threading
+import logging
+
+import socketio
+
+# Socket.IO message queue shared by all workers, e.g. redis://host:6379/0 or amqp://...
+# "local://<channel>" uses the in-process bus below (tests and benchmarks, one process only).
+# Unset keeps the single-worker setup. Either way the load balancer must be sticky:
+# a session's queues, threads and TTS engine live in the worker that accepted it.
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+SOCKETIO_CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'voicebot')
+
+_local_subscribers = {}
+_local_subscribers_lock = threading.Lock()
+
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """In-process stand-in for the Redis/Kombu client managers.
+
+    Every manager on the same channel, e.g. several Flask-SocketIO servers in
+    one test process, receives every message, serialized as it would be on a
+    real queue, so emits take the same code path as in a multi-worker setup."""
+    name = 'local'
+
+    def _publish(self, data):
+        message = self.json.dumps(data)
+        with _local_subscribers_lock:
+            subscribers = list(_local_subscribers.get(self.channel, ()))
+        for subscriber in subscribers:
+            subscriber.put(message)
+
+    def _listen(self):
+        inbox = queue.Queue()
+        with _local_subscribers_lock:
+            _local_subscribers.setdefault(self.channel, []).append(inbox)
+        while True:
+            yield inbox.get()
+
+
+def socketio_options(message_queue=SOCKETIO_MESSAGE_QUEUE, channel=SOCKETIO_CHANNEL):
+    """Keyword arguments for SocketIO(...) selecting the pub/sub backend for emits"""
+    if not message_queue:
+        return {}
+    if message_queue.startswith('local://'):
+        return {'client_manager': LocalPubSubManager(channel=message_queue[len('local://'):] or channel)}
+    logging.info(f"Socket.IO emits go through message queue on channel {channel}")
+    return {'message_queue': message_queue, 'channel': channel}
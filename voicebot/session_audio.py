@@ -0,0 +1,318 @@
+# session_audio.py
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import logging
+
+import numpy as np
+
+from utils.metrics import REGISTRY
+
+# Opt-in: raw microphone frames are personal data, only record where users have agreed to it
+SESSION_AUDIO_RECORDING = os.getenv('SESSION_AUDIO_RECORDING', 'false').lower() == 'true'
+SESSION_AUDIO_DIR = os.getenv('SESSION_AUDIO_DIR', 'session_audio')
+# Retention: per-recording size cap, total size of the directory, and age
+SESSION_AUDIO_MAX_RECORDING_MB = float(os.getenv('SESSION_AUDIO_MAX_RECORDING_MB', 64))
+SESSION_AUDIO_MAX_TOTAL_MB = float(os.getenv('SESSION_AUDIO_MAX_TOTAL_MB', 2048))
+SESSION_AUDIO_MAX_AGE_HOURS = float(os.getenv('SESSION_AUDIO_MAX_AGE_HOURS', 72))
+
+AUDIO_SUFFIX = '.pcm'
+INDEX_SUFFIX = '.idx'
+# Index header: magic, version, sample rate, bytes per frame, wall-clock start (ms)
+INDEX_HEADER = struct.Struct('<4sHIIQ')
+INDEX_MAGIC = b'VBSA'
+INDEX_VERSION = 1
+# Index record: first frame, end frame (exclusive), wall-clock time of the VAD close (ms)
+INDEX_RECORD = struct.Struct('<IIQ')
+# The audio file grows in steps of this many bytes and is truncated to its real length on close
+GROW_BYTES = 1024 * 1024
+
+recorded_bytes_total = REGISTRY.counter('voicebot_session_audio_bytes_total', 'Raw audio bytes recorded')
+recorded_segments_total = REGISTRY.counter('voicebot_session_audio_segments_total', 'Utterance boundaries recorded')
+truncated_recordings_total = REGISTRY.counter('voicebot_session_audio_truncated_total',
+                                              'Recordings that hit SESSION_AUDIO_MAX_RECORDING_MB')
+retention_deleted_total = REGISTRY.counter('voicebot_session_audio_retention_deleted_total',
+                                           'Recordings deleted by the retention limits')
+
+# Recordings this process is still writing; retention never deletes them
+_open_recordings = set()
+_open_recordings_lock = threading.Lock()
+
+
+def recording_name(session_id):
+    safe_id = re.sub(r'[^A-Za-z0-9_-]', '_', str(session_id or 'local'))
+    return f"{int(time.time() * 1000)}_{safe_id}"
+
+
+class SessionAudioRecorder:
+    """Appends a session's raw frames to a memory-mapped file and utterance boundaries to an index.
+
+    Both files are append-only. The audio file is extended in GROW_BYTES steps
+    and written through the mapping, so recording a frame is a memory copy
+    rather than a write() call from the VAD loop."""
+
+    def __init__(self, directory, session_id, sample_rate, frame_bytes,
+                 max_bytes=int(SESSION_AUDIO_MAX_RECORDING_MB * 1024 * 1024)):
+        os.makedirs(directory, exist_ok=True)
+        self.name = recording_name(session_id)
+        self.audio_path = os.path.join(directory, self.name + AUDIO_SUFFIX)
+        self.index_path = os.path.join(directory, self.name + INDEX_SUFFIX)
+        self.frame_bytes = frame_bytes
+        self.max_bytes = max_bytes - max_bytes % frame_bytes
+        self.length = 0
+        self.truncated = False
+        self._audio = open(self.audio_path, 'w+b')
+        self._map = None
+        self._index = open(self.index_path, 'wb')
+        self._index.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, sample_rate, frame_bytes,
+                                            int(time.time() * 1000)))
+        self._index.flush()
+        self._lock = threading.Lock()
+        with _open_recordings_lock:
+            _open_recordings.add(self.name)
+
+    @property
+    def frames(self):
+        return self.length // self.frame_bytes
+
+    def _grow(self, needed):
+        size = len(self._map) if self._map is not None else 0
+        new_size = max(size + GROW_BYTES, needed)
+        if self._map is not None:
+            self._map.close()
+        self._audio.truncate(new_size)
+        self._map = mmap.mmap(self._audio.fileno(), new_size)
+
+    def append_frame(self, frame):
+        """Record one frame; returns False once the recording is closed or over its size cap"""
+        with self._lock:
+            if self._audio is None or self.truncated:
+                return False
+            end = self.length + self.frame_bytes
+            if end > self.max_bytes:
+                self.truncated = True
+                truncated_recordings_total.inc()
+                logging.warning(f"Session audio recording {self.name} reached its size cap")
+                return False
+            if self._map is None or end > len(self._map):
+                self._grow(end)
+            self._map[self.length:end] = frame
+            self.length = end
+        recorded_bytes_total.inc(self.frame_bytes)
+        return True
+
+    def mark_segment(self, start_frame, end_frame):
+        """Record an utterance that spans frames [start_frame, end_frame)"""
+        with self._lock:
+            if self._index is None:
+                return
+            self._index.write(INDEX_RECORD.pack(start_frame, end_frame, int(time.time() * 1000)))
+            self._index.flush()
+        recorded_segments_total.inc()
+
+    def close(self):
+        with self._lock:
+            if self._audio is None:
+                return
+            if self._map is not None:
+                self._map.flush()
+                self._map.close()
+                self._map = None
+            self._audio.truncate(self.length)
+            self._audio.close()
+            self._audio = None
+            self._index.close()
+            self._index = None
+        with _open_recordings_lock:
+            _open_recordings.discard(self.name)
+
+
+class SessionAudioReader:
+    """Read side of a recording: the audio file mapped read-only plus its parsed index"""
+
+    def __init__(self, audio_path):
+        base = audio_path[:-len(AUDIO_SUFFIX)] if audio_path.endswith(AUDIO_SUFFIX) else audio_path
+        self.audio_path = base + AUDIO_SUFFIX
+        self.index_path = base + INDEX_SUFFIX
+        with open(self.index_path, 'rb') as f:
+            index = f.read()
+        magic, version, self.sample_rate, self.frame_bytes, self.started_at_ms = INDEX_HEADER.unpack_from(index)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError(f"{self.index_path} is not a session audio index")
+        records = index[INDEX_HEADER.size:]
+        records = records[:len(records) - len(records) % INDEX_RECORD.size]
+        self.segments = [(start, end) for start, end, _ in INDEX_RECORD.iter_unpack(records)]
+
+        self._file = open(self.audio_path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        # An empty file cannot be mapped
+        self._map = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ) if size else None
+        self.length = size - size % self.frame_bytes
+
+    @property
+    def frames(self):
+        return self.length // self.frame_bytes
+
+    @property
+    def duration(self):
+        return self.length / 2 / self.sample_rate
+
+    def samples(self):
+        """All recorded audio as an int16 array backed by the mapping (no copy)"""
+        if self._map is None:
+            return np.zeros(0, dtype=np.int16)
+        return np.frombuffer(self._map, dtype=np.int16, count=self.length // 2)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+
+class ReplayStream:
+    """Input stream that plays a recording back through AudioStreamer, `speed` times real time.
+
+    speed=0 replays as fast as the VAD loop can consume. Once the recording is
+    exhausted `finished` is set and reads return no audio."""
+
+    def __init__(self, reader, speed=0.0, read_timeout=0.05):
+        self.reader = reader
+        self.speed = speed
+        self.read_timeout = read_timeout
+        self.finished = threading.Event()
+        self._samples = reader.samples()
+        self._position = 0
+        self._started_at = None
+
+    def read(self, frames):
+        if self._started_at is None:
+            self._started_at = time.perf_counter()
+        end = self._position + frames
+        if end > len(self._samples):
+            self.finished.set()
+            time.sleep(self.read_timeout)
+            return np.zeros((0, 1), dtype=np.int16), False
+        if self.speed > 0:
+            due = self._started_at + end / self.reader.sample_rate / self.speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        chunk = self._samples[self._position:end].reshape(-1, 1)
+        self._position = end
+        return chunk, False
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def close(self):
+        # Drop the view into the reader's mapping so the reader can be closed
+        self._samples = self._samples[:0].copy()
+
+
+def enforce_retention(directory=SESSION_AUDIO_DIR, max_total_bytes=int(SESSION_AUDIO_MAX_TOTAL_MB * 1024 * 1024),
+                      max_age_seconds=SESSION_AUDIO_MAX_AGE_HOURS * 3600, keep=()):
+    """Delete recordings older than the age limit, then the oldest ones until the directory fits.
+
+    Recordings in `keep` and those still open in this process are left alone."""
+    with _open_recordings_lock:
+        keep = set(keep) | _open_recordings
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return 0
+
+    recordings = []
+    for name in names:
+        if not name.endswith(AUDIO_SUFFIX):
+            continue
+        base = name[:-len(AUDIO_SUFFIX)]
+        if base in keep:
+            continue
+        audio_path = os.path.join(directory, name)
+        index_path = os.path.join(directory, base + INDEX_SUFFIX)
+        try:
+            stat = os.stat(audio_path)
+            size = stat.st_size + (os.path.getsize(index_path) if os.path.exists(index_path) else 0)
+        except OSError:
+            continue
+        recordings.append((stat.st_mtime, size, audio_path, index_path))
+    recordings.sort()
+
+    total = sum(size for _, size, _, _ in recordings)
+    now = time.time()
+    deleted = 0
+    for mtime, size, audio_path, index_path in recordings:
+        if now - mtime <= max_age_seconds and total <= max_total_bytes:
+            break
+        for path in (audio_path, index_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= size
+        deleted += 1
+    if deleted:
+        retention_deleted_total.inc(deleted)
+        logging.info(f"Session audio retention removed {deleted} recordings from {directory}")
+    return deleted
+
+
+def session_audio_recorder_factory(directory=SESSION_AUDIO_DIR):
+    """Recorder factory for VoicebotBackends: applies retention, then opens a recording per session"""
+
+    def factory(session_id, sample_rate, frame_bytes):
+        recorder = SessionAudioRecorder(directory, session_id, sample_rate, frame_bytes)
+        enforce_retention(directory)
+        return recorder
+
+    return factory
+
+
+def no_audio_recording(session_id, sample_rate, frame_bytes):
+    """Recorder factory that records nothing, whatever SESSION_AUDIO_RECORDING says"""
+    return None
+
+
+def replay_session(audio_path, transcribe, speed=0.0, backends=None):
+    """Feed a recording through continuous_stt (VAD, enhancement, STT); returns (transcripts, stats)"""
+    import queue
+    from .voicebot import AudioStreamer, VoicebotBackends, continuous_stt
+
+    class _NoEmit:
+        def emit(self, *args, **kwargs):
+            pass
+
+    reader = SessionAudioReader(audio_path)
+    stream = ReplayStream(reader, speed)
+    # A replay must not record itself, nor apply retention to the real recordings
+    backends = backends or VoicebotBackends(transcribe=transcribe, audio_recorder_factory=no_audio_recording)
+    input_queue = queue.Queue()
+    stop_event = threading.Event()
+
+    def stop_when_drained():
+        stream.finished.wait()
+        stop_event.set()
+
+    threading.Thread(target=stop_when_drained, daemon=True).start()
+    started = time.perf_counter()
+    continuous_stt(input_queue, stop_event, AudioStreamer(stream=stream), _NoEmit(), backends=backends)
+    elapsed = time.perf_counter() - started
+
+    transcripts = []
+    while not input_queue.empty():
+        transcripts.append(input_queue.get()[0])
+    stats = {
+        'audio_seconds': reader.duration,
+        'wall_seconds': elapsed,
+        'realtime_factor': reader.duration / elapsed if elapsed else float('inf'),
+        'recorded_segments': len(reader.segments),
+    }
+    reader.close()
+    return transcripts, stats
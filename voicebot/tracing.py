@@ -0,0 +1,156 @@
+# tracing.py
+import json
+import os
+import threading
+import time
+import logging
+from typing import Callable, List
+
+from utils.metrics import REGISTRY
+
+# Named points of a voice turn, in pipeline order
+TURN_SPANS = (
+    'vad_close',
+    'enhance',
+    'stt',
+    'key_acquire',
+    'llm_first_token',
+    'llm_done',
+    'normalize',
+    'tts_first_byte',
+    'playback_start',
+)
+
+# Turns slower than this (seconds, VAD close to playback start) are passed to the slow-turn hooks
+SLOW_TURN_THRESHOLD_SECONDS = float(os.getenv('SLOW_TURN_THRESHOLD_SECONDS', 5.0))
+
+stage_seconds = REGISTRY.histogram(
+    'voicebot_stage_seconds',
+    'Time spent between the previous turn mark and this one',
+    labelnames=('stage',)
+)
+turn_seconds = REGISTRY.histogram(
+    'voicebot_turn_seconds',
+    'Time from VAD close to the end of the turn'
+)
+slow_turns_total = REGISTRY.counter(
+    'voicebot_slow_turns_total',
+    'Turns slower than SLOW_TURN_THRESHOLD_SECONDS'
+)
+
+_slow_turn_hooks: List[Callable[['TurnTrace'], None]] = []
+_turn_hooks: List[Callable[['TurnTrace'], None]] = []
+
+
+def add_slow_turn_hook(hook: Callable[['TurnTrace'], None]):
+    """Register a callable that receives every finished trace slower than the threshold"""
+    _slow_turn_hooks.append(hook)
+
+
+def remove_slow_turn_hook(hook: Callable[['TurnTrace'], None]):
+    if hook in _slow_turn_hooks:
+        _slow_turn_hooks.remove(hook)
+
+
+def add_turn_hook(hook: Callable[['TurnTrace'], None]):
+    """Register a callable that receives every finished trace"""
+    _turn_hooks.append(hook)
+
+
+def remove_turn_hook(hook: Callable[['TurnTrace'], None]):
+    if hook in _turn_hooks:
+        _turn_hooks.remove(hook)
+
+
+def log_slow_turn(trace: 'TurnTrace'):
+    logging.warning(f"Slow voice turn: {json.dumps(trace.to_dict())}")
+
+
+add_slow_turn_hook(log_slow_turn)
+
+
+class TurnTrace:
+    """Timeline of one voice turn, from the end of the user's utterance to playback"""
+
+    def __init__(self, session_id=None, start_mark='vad_close'):
+        self.session_id = session_id
+        self.started_at = time.perf_counter()
+        self.wall_started_at = time.time()
+        self.marks = [(start_mark, 0.0)]
+        self.finished = False
+        self._finish_callbacks = []
+        self._lock = threading.Lock()
+
+    def mark(self, name: str):
+        """Record that the turn reached `name` and observe the time since the previous mark"""
+        with self._lock:
+            if self.finished:
+                return
+            elapsed = time.perf_counter() - self.started_at
+            stage_seconds.observe(elapsed - self.marks[-1][1], stage=name)
+            self.marks.append((name, elapsed))
+
+    def elapsed(self, name: str):
+        """Seconds from the start of the turn to `name`, or None if it was never reached"""
+        with self._lock:
+            for mark_name, elapsed in self.marks:
+                if mark_name == name:
+                    return elapsed
+        return None
+
+    def stage_durations(self):
+        """Seconds spent reaching each mark from the previous one"""
+        with self._lock:
+            marks = list(self.marks)
+        return {name: elapsed - previous for (_, previous), (name, elapsed) in zip(marks, marks[1:])}
+
+    @property
+    def duration(self) -> float:
+        with self._lock:
+            return self.marks[-1][1]
+
+    def add_finish_callback(self, callback: Callable[['TurnTrace'], None]):
+        """Call `callback(trace)` once the turn is finished (immediately if it already is)"""
+        with self._lock:
+            if not self.finished:
+                self._finish_callbacks.append(callback)
+                return
+        callback(self)
+
+    def finish(self):
+        """Close the trace; safe to call more than once"""
+        with self._lock:
+            if self.finished:
+                return
+            self.finished = True
+            duration = self.marks[-1][1]
+            callbacks, self._finish_callbacks = self._finish_callbacks, []
+
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                logging.error(f"Turn finish callback failed: {e}")
+
+        turn_seconds.observe(duration)
+        for hook in list(_turn_hooks):
+            try:
+                hook(self)
+            except Exception as e:
+                logging.error(f"Turn hook failed: {e}")
+        if duration >= SLOW_TURN_THRESHOLD_SECONDS:
+            slow_turns_total.inc()
+            for hook in list(_slow_turn_hooks):
+                try:
+                    hook(self)
+                except Exception as e:
+                    logging.error(f"Slow turn hook failed: {e}")
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'session_id': self.session_id,
+                'started_at': self.wall_started_at,
+                'duration': self.marks[-1][1],
+                'marks': {name: round(elapsed, 4) for name, elapsed in self.marks},
+            }
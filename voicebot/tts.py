@@ -1,69 +1,253 @@
 # tts.py
+import io
 import re
 import threading
 import logging
 import os
 import time
-import edge_tts
 import asyncio
-import pygame
-from langdetect import detect
+from collections import OrderedDict
 from urllib.parse import urlparse
+from utils.metrics import REGISTRY
+from .language_id import language_identifier
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 
-class InterruptibleTTS:
-    def __init__(self):
-        self.stop_speaking = threading.Event()
-        self.speak_thread = None
+# Upper bound on synthesized MP3 bytes kept in memory for replay
+AUDIO_CACHE_MAX_BYTES = int(os.getenv('TTS_AUDIO_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+
+# Cap on simultaneously open edge-tts connections across all sessions
+TTS_MAX_CONNECTIONS = int(os.getenv('TTS_MAX_CONNECTIONS', 4))
+
+audio_cache_requests_total = REGISTRY.counter(
+    'voicebot_tts_audio_cache_requests_total',
+    'TTS audio cache lookups by result',
+    labelnames=('result',)
+)
+# Hot-path counters, always on: one increment per synthesis or per normalization step
+synthesized_bytes_total = REGISTRY.counter('voicebot_tts_synthesized_bytes_total',
+                                           'MP3 bytes received from edge-tts (cache hits excluded)')
+regex_passes_total = REGISTRY.counter('voicebot_tts_regex_passes_total',
+                                      'Regex substitutions run over reply text before synthesis',
+                                      labelnames=('function',))
+
+
+class AudioCache:
+    """LRU cache of synthesized audio keyed by (text, voice), bounded by total bytes"""
+
+    def __init__(self, max_bytes=AUDIO_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text, voice):
+        with self._lock:
+            audio = self._entries.get((text, voice))
+            if audio is None:
+                self.misses += 1
+                audio_cache_requests_total.inc(result='miss')
+                return None
+            self._entries.move_to_end((text, voice))
+            self.hits += 1
+            audio_cache_requests_total.inc(result='hit')
+            return audio
+
+    def put(self, text, voice, audio):
+        if not audio or len(audio) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop((text, voice), None)
+            if previous is not None:
+                self.total_bytes -= len(previous)
+            self._entries[(text, voice)] = audio
+            self.total_bytes += len(audio)
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+
+audio_cache = AudioCache()
+
+
+class TTSService:
+    """Runs every synthesis job on one long-lived asyncio loop in a dedicated thread.
+
+    Jobs are submitted from any thread and come back as concurrent futures, so
+    callers never block on synthesis or playback. At most `max_connections`
+    edge-tts connections are open at once; playback through the shared mixer is
+    serialized."""
+
+    def __init__(self, max_connections=TTS_MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        self._loop = None
+        self._thread = None
+        self._connections = None
+        self._playback_lock = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(ready,), name='tts-service', daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def _run(self, ready):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._connections = asyncio.Semaphore(self.max_connections)
+        self._playback_lock = asyncio.Lock()
+        ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
 
-    def speak(self, text, voice):
-        self.stop_speaking.clear()
-        if self.speak_thread and self.speak_thread.is_alive():
-            self.stop()
-            self.speak_thread.join()
+    def submit(self, text, voice, trace=None, stop_event=None, play=True, sink=None):
+        """Schedule synthesis (and playback) of `text`; returns a concurrent.futures.Future of the MP3 bytes.
 
-        self.speak_thread = threading.Thread(target=self._speak_thread, args=(text, voice))
-        self.speak_thread.start()
+        With a `sink`, the MP3 bytes are handed to `sink(audio)` (e.g. streamed to
+        the client) instead of being played on the server's mixer."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self._job(text, voice, trace, stop_event, play, sink), self._loop)
 
-    def _speak_thread(self, text, voice):
+    async def _job(self, text, voice, trace, stop_event, play, sink=None):
         try:
-            asyncio.run(self._async_speak(text, voice))
+            audio = await self.synthesize(text, voice, trace)
+            if audio and sink is not None:
+                await self._send(audio, sink, stop_event, trace)
+            elif play and audio:
+                await self._play(audio, stop_event, trace)
+            return audio
+        except asyncio.CancelledError:
+            logging.info("TTS job cancelled")
+            raise
         except Exception as e:
-            logging.error(f"Error in TTS: {e}")
-
-    async def _async_speak(self, text, voice):
-        try:
+            logging.error(f"Error in async TTS: {e}")
+            return None
+        finally:
+            if trace is not None:
+                trace.finish()
+
+    async def synthesize(self, text, voice, trace=None):
+        """Return MP3 bytes for `text`, from the audio cache when possible"""
+        audio = audio_cache.get(text, voice)
+        if audio is not None:
+            logging.info("Using cached TTS audio")
+            if trace is not None:
+                trace.mark('tts_first_byte')
+            return audio
+
+        import edge_tts
+        async with self._connections:
             communicate = edge_tts.Communicate(text, voice=voice, rate="+22%", pitch="-2Hz", volume="-3%")
-            output_file = "temp_output.mp3"
-            await communicate.save(output_file)
-
-            pygame.mixer.init()
-            pygame.mixer.music.load(output_file)
+            chunks = []
+            async for chunk in communicate.stream():
+                if chunk["type"] == "audio":
+                    if not chunks and trace is not None:
+                        trace.mark('tts_first_byte')
+                    chunks.append(chunk["data"])
+
+        audio = b''.join(chunks)
+        synthesized_bytes_total.inc(len(audio))
+        audio_cache.put(text, voice, audio)
+        return audio
+
+    async def _send(self, audio, sink, stop_event, trace):
+        if stop_event is not None and stop_event.is_set():
+            return
+        # Encoding may be CPU-bound (Opus/PCM transcode), keep it off the event loop
+        await self._loop.run_in_executor(None, sink, audio)
+        if trace is not None:
+            trace.mark('playback_start')
+
+    async def _play(self, audio, stop_event, trace):
+        import pygame
+        async with self._playback_lock:
+            if stop_event is not None and stop_event.is_set():
+                return
+            if not pygame.mixer.get_init():
+                pygame.mixer.init()
+            pygame.mixer.music.load(io.BytesIO(audio), 'mp3')
             pygame.mixer.music.play()
+            if trace is not None:
+                trace.mark('playback_start')
+                trace.finish()
 
-            while pygame.mixer.music.get_busy():
-                if self.stop_speaking.is_set():
-                    pygame.mixer.music.stop()
-                    break
-                time.sleep(0.1)
+            try:
+                while pygame.mixer.music.get_busy():
+                    if stop_event is not None and stop_event.is_set():
+                        break
+                    await asyncio.sleep(0.1)
+            finally:
+                pygame.mixer.music.stop()
+                pygame.mixer.music.unload()
 
-            pygame.mixer.music.stop()
-            pygame.mixer.quit()
-            os.remove(output_file)
-            logging.info(f"Deleted temporary file: {output_file}")
+    def shutdown(self):
+        with self._start_lock:
+            if self._loop is None or self._thread is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._thread = None
 
-        except Exception as e:
-            logging.error(f"Error in async TTS: {e}")
+
+tts_service = TTSService()
+
+
+class InterruptibleTTS:
+    """Per-session speaker: a new reply cancels the previous one without blocking the caller"""
+
+    def __init__(self, service=None, audio_sink=None):
+        self.service = service or tts_service
+        # When set, replies go to this callable (client streaming) instead of the server speaker
+        self.audio_sink = audio_sink
+        self.stop_speaking = threading.Event()
+        self.current_job = None
+
+    def speak(self, text, voice, trace=None):
+        self.stop()
+        self.stop_speaking = threading.Event()
+        self.current_job = self.service.submit(text, voice, trace, self.stop_speaking, sink=self.audio_sink)
+        return self.current_job
 
     def stop(self):
         self.stop_speaking.set()
-        if self.speak_thread and self.speak_thread.is_alive():
-            self.speak_thread.join()
+        if self.current_job is not None and not self.current_job.done():
+            self.current_job.cancel()
+
 
 tts_engine = InterruptibleTTS()
 
+# One speaker per Socket.IO session so replies to different users don't cancel each other
+_session_engines = {}
+_session_engines_lock = threading.Lock()
+
+
+def get_tts_engine(session_id=None):
+    if session_id is None:
+        return tts_engine
+    with _session_engines_lock:
+        engine = _session_engines.get(session_id)
+        if engine is None:
+            engine = _session_engines[session_id] = InterruptibleTTS()
+        return engine
+
+
+def release_tts_engine(session_id):
+    """Stop and forget a session's speaker when it disconnects"""
+    with _session_engines_lock:
+        engine = _session_engines.pop(session_id, None)
+    if engine is not None:
+        engine.stop()
+    language_identifier.forget(session_id)
+
 def filter_text(text):
     # Remove emojis
     text = re.sub(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]', '', text)
@@ -92,6 +276,7 @@ def filter_text(text):
     text = re.sub(r'\b\w+\(.*?\)', lambda m: f"function {m.group(0)}", text)
     text = re.sub(r'\b[a-zA-Z_]\w*\b(?=\s*[=+\-*/])', lambda m: f"variable {m.group(0)}", text)
     text = re.sub(r'\b\d+(\.\d+)?\s*[-+*/]\s*\d+(\.\d+)?\b', lambda m: f"expression {m.group(0)}", text)
+    regex_passes_total.inc(5, function='filter_text')
 
     return text.strip()
 
@@ -101,12 +286,6 @@ def process_web_link(url):
     path = parsed_url.path.replace('/', ' slash ').strip()
     return f"web link: {domain} {path}"
 
-def detect_language(text):
-    try:
-        return detect(text)
-    except:
-        return 'en'  # Default to English if detection fails
-
 def improve_pronunciation(text, lang):
     # Add pronunciation rules
     pronunciation_rules = [
@@ -123,6 +302,7 @@ def improve_pronunciation(text, lang):
 
     for pattern, replacement in pronunciation_rules:
         text = re.sub(pattern, replacement, text)
+    regex_passes_total.inc(len(pronunciation_rules), function='improve_pronunciation')
 
     return text
 
@@ -139,6 +319,7 @@ def group_words(text):
 
     for group in grouped_words:
         text = re.sub(group, lambda m: m.group(0).replace(' ', '_'), text)
+    regex_passes_total.inc(len(grouped_words), function='group_words')
 
     return text
 
@@ -210,6 +391,7 @@ def context_aware_replace(text, lang):
 
     for word in replacements:
         text = re.sub(r'\b' + word + r'\b', replace_word, text, flags=re.IGNORECASE)
+    regex_passes_total.inc(len(replacements), function='context_aware_replace')
 
     return text
 
@@ -230,38 +412,27 @@ def determine_context(match):
     else:
         return 'default'
 
-def detect_hinglish(text):
-    # Simple Hinglish detection based on the presence of both English and Hindi words
-    english_words = set(re.findall(r'\b[a-zA-Z]+\b', text.lower()))
-    hindi_words = set(re.findall(r'\b[ऀ-ॿ]+\b', text))
-
-    if english_words and hindi_words:
-        return 'hinglish'
-    elif hindi_words:
-        return 'hi'
-    else:
-        return 'en'
-
-def speak(text):
+def speak(text, trace=None, session_id=None):
     try:
+        # Detect on the raw reply: filter_text spells symbols out in English words
+        lang = language_identifier.detect(text, session_id)
         filtered_text = filter_text(text)
-        lang = detect_hinglish(filtered_text)
         filtered_text = context_aware_replace(filtered_text, lang)
         filtered_text = improve_pronunciation(filtered_text, lang)
         filtered_text = group_words(filtered_text)
 
-        # Use different voices for English, Hindi, and Hinglish
-        if lang == 'en':
-            voice = "en-IN-PrabhatNeural"
-        elif lang == 'hi':
-            voice = "hi-IN-MadhurNeural"
-        else:  # Hinglish
-            voice = "en-IN-PrabhatNeural"  # Using Indian English voice for Hinglish
+        # Voice per language comes from the configurable TTS_VOICE_MAP
+        voice = language_identifier.voice_for(lang)
+
+        if trace is not None:
+            trace.mark('normalize')
 
         logging.info(f"Assistant speaking ({lang}): {filtered_text}")
-        tts_engine.speak(filtered_text, voice)
+        get_tts_engine(session_id).speak(filtered_text, voice, trace)
     except Exception as e:
         logging.error(f"Text-to-speech error: {e}")
+        if trace is not None:
+            trace.finish()
 
 # Test the TTS functionality
 if __name__ == "__main__":
@@ -0,0 +1,197 @@
+# turn_recorder.py
+import atexit
+import os
+import threading
+import time
+import logging
+from collections import deque
+from datetime import datetime
+
+from utils.metrics import REGISTRY
+
+TURN_RECORDER_ENABLED = os.getenv('TURN_RECORDER_ENABLED', 'true').lower() == 'true'
+TURN_RECORDER_COLLECTION = os.getenv('TURN_RECORDER_COLLECTION', 'voicebot_turns')
+# Documents held in memory while the database is slow; beyond this new turns are dropped
+TURN_RECORDER_MAX_BUFFER = int(os.getenv('TURN_RECORDER_MAX_BUFFER', 5000))
+TURN_RECORDER_BATCH_SIZE = int(os.getenv('TURN_RECORDER_BATCH_SIZE', 100))
+TURN_RECORDER_FLUSH_INTERVAL = float(os.getenv('TURN_RECORDER_FLUSH_INTERVAL', 5.0))
+DUPLICATE_KEY_ERROR = 11000
+
+recorded_total = REGISTRY.counter('voicebot_turn_recorder_recorded_total', 'Turns accepted into the write-behind buffer')
+dropped_total = REGISTRY.counter('voicebot_turn_recorder_dropped_total',
+                                 'Turns dropped without being written', labelnames=('reason',))
+written_total = REGISTRY.counter('voicebot_turn_recorder_written_total', 'Turns written to MongoDB')
+flush_failures_total = REGISTRY.counter('voicebot_turn_recorder_flush_failures_total', 'Failed insert_many batches')
+buffer_size = REGISTRY.gauge('voicebot_turn_recorder_buffer_size', 'Turns waiting to be written')
+flush_seconds = REGISTRY.histogram('voicebot_turn_recorder_flush_seconds', 'Duration of insert_many batches')
+
+
+def default_collection():
+    from config.database import get_database
+    return get_database()[TURN_RECORDER_COLLECTION]
+
+
+class TurnRecorder:
+    """Buffers turn documents in memory and writes them with insert_many from a background thread.
+
+    record() never blocks on the database: when the buffer is full the turn is
+    dropped and counted instead of stalling the conversation. Every document
+    gets its _id when it is recorded, so a batch retried after a write that
+    partly (or silently) succeeded only hits duplicate keys, which count as
+    written."""
+
+    def __init__(self, collection_factory=default_collection, max_buffer=TURN_RECORDER_MAX_BUFFER,
+                 batch_size=TURN_RECORDER_BATCH_SIZE, flush_interval=TURN_RECORDER_FLUSH_INTERVAL):
+        self.collection_factory = collection_factory
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._collection = None
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._thread = None
+        self._failed = False
+        self.dropped = 0
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='turn-recorder', daemon=True)
+                self._thread.start()
+        return self
+
+    def record(self, document):
+        """Queue a document for writing; returns False if it had to be dropped"""
+        from bson import ObjectId
+        with self._cond:
+            if self._closed:
+                return False
+            if len(self._buffer) >= self.max_buffer:
+                self.dropped += 1
+                dropped_total.inc(reason='buffer_full')
+                return False
+            document.setdefault('created_at', datetime.utcnow())
+            document.setdefault('_id', ObjectId())
+            self._buffer.append(document)
+            recorded_total.inc()
+            buffer_size.set(len(self._buffer))
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or len(self._buffer) >= self.batch_size,
+                                    timeout=self.flush_interval)
+                if self._closed:
+                    return
+            self.flush()
+            if self._failed:
+                # Back off instead of hammering a database that is down
+                with self._cond:
+                    self._cond.wait_for(lambda: self._closed, timeout=self.flush_interval)
+
+    def _take_batch(self):
+        with self._cond:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            buffer_size.set(len(self._buffer))
+            return batch
+
+    def _requeue(self, batch):
+        """Put a batch whose write failed as a whole back at the front, dropping what no longer fits.
+
+        Its documents keep their _ids, so any of them the server did store
+        come back as duplicate keys on the retry."""
+        with self._cond:
+            room = max(0, self.max_buffer - len(self._buffer))
+            lost = max(0, len(batch) - room)
+            if lost:
+                self.dropped += lost
+                dropped_total.inc(lost, reason='write_failed')
+            self._buffer.extendleft(reversed(batch[:room]))
+            buffer_size.set(len(self._buffer))
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of documents written"""
+        from pymongo.errors import BulkWriteError
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self._take_batch()
+                if not batch:
+                    return written
+                started = time.perf_counter()
+                try:
+                    if self._collection is None:
+                        self._collection = self.collection_factory()
+                    self._collection.insert_many(batch, ordered=False)
+                except BulkWriteError as e:
+                    # Per-document errors: duplicates were written by an earlier attempt, the rest were
+                    # rejected and would fail again, so none of the batch goes back in the buffer
+                    rejected = [error for error in e.details.get('writeErrors', [])
+                                if error.get('code') != DUPLICATE_KEY_ERROR]
+                    if rejected:
+                        flush_failures_total.inc()
+                        self.dropped += len(rejected)
+                        dropped_total.inc(len(rejected), reason='rejected')
+                        logging.error(f"MongoDB rejected {len(rejected)} turns: {rejected[0].get('errmsg')}")
+                    self._failed = False
+                    written += len(batch) - len(rejected)
+                    written_total.inc(len(batch) - len(rejected))
+                    continue
+                except Exception as e:
+                    flush_failures_total.inc()
+                    logging.error(f"Failed to write {len(batch)} turns: {e}")
+                    self._collection = None
+                    self._failed = True
+                    self._requeue(batch)
+                    return written
+                finally:
+                    flush_seconds.observe(time.perf_counter() - started)
+                self._failed = False
+                written += len(batch)
+                written_total.inc(len(batch))
+
+    def close(self):
+        """Stop the background thread and flush whatever is left"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval)
+        self.flush()
+
+
+class NullRecorder:
+    """Recorder used when persistence is disabled"""
+
+    def record(self, document):
+        return False
+
+    def flush(self):
+        return 0
+
+    def close(self):
+        pass
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_turn_recorder():
+    """Process-wide recorder, flushed at interpreter exit"""
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None:
+            if TURN_RECORDER_ENABLED:
+                _recorder = TurnRecorder().start()
+                atexit.register(_recorder.close)
+            else:
+                _recorder = NullRecorder()
+        return _recorder
@@ -1,24 +1,36 @@
 import re
-import speech_recognition as sr
-import sounddevice as sd
+import random
 import numpy as np
-from pydub import AudioSegment
-from pydub.effects import normalize
-import webrtcvad
 import collections
 import threading
 import queue
 import time
+import hmac
 import logging
-import groq
-from groq import Groq
-from flask import render_template, request, jsonify, session
+# speech_recognition, sounddevice, pydub, webrtcvad and groq are imported where
+# first used so the app starts without audio hardware or network (see warmup.py)
+from flask import render_template, request, jsonify, session, Response
 from flask_socketio import emit
-from .tts import speak
+from .tts import speak, release_tts_engine, get_tts_engine
+from .audio_codecs import negotiate, get_codec, TimedCodec, ClientAudioSource, CodecUnavailable
+from .response_cache import ResponseCache
+from .tracing import TurnTrace, stage_seconds
+from .llm_scheduler import get_llm_scheduler, SchedulerTimeout, CANNED_BUSY_REPLY
+from .turn_recorder import get_turn_recorder
+from .warmup import warm_up, WARMUP_TOKEN
+from .overload import (get_overload_controller, trim_history, degraded_turns_total, LEVEL_NAMES, REDUCED, TEXT_ONLY,
+                       OVERLOAD_MAX_TOKENS, OVERLOAD_HISTORY_MESSAGES, OVERLOAD_LLM_DEADLINE_SECONDS,
+                       OVERLOAD_RETRY_AFTER_SECONDS)
+from .capture import AUDIO_CAPTURE_MODE, REPORT_EVERY_FRAMES, FrameRingBuffer, RingBusy, dropped_frames_total
+from .session_audio import SESSION_AUDIO_RECORDING, session_audio_recorder_factory
+from .profiler import (profiler, ProfilerBusy, PROFILE_DEFAULT_INTERVAL_MS, PROFILE_MIN_INTERVAL_MS,
+                       PROFILE_MAX_INTERVAL_MS, PROFILE_MAX_SECONDS)
+from .tts import synthesized_bytes_total, regex_passes_total
 from dotenv import load_dotenv
 import os
-from utils.api_key_manager import APIKeyManager
-from utils.auth_middleware import validate_session
+from utils.api_key_manager import APIKeyManager, NoAPIKeyAvailable
+from utils.auth_middleware import validate_session, admin_required
+from utils.metrics import REGISTRY, PROMETHEUS_CONTENT_TYPE
 
 # Load environment variables
 load_dotenv()
@@ -27,38 +39,255 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 
 
+# LLM latency budget per turn, and the knobs used to stay inside it
+LLM_TURN_DEADLINE_SECONDS = float(os.getenv('LLM_TURN_DEADLINE_SECONDS', 8.0))
+PRIMARY_MODEL = "llama-3.3-70b-versatile"
+FALLBACK_MODEL = os.getenv('GROQ_FALLBACK_MODEL', "llama-3.1-8b-instant")
+# Switch to the fallback model once less than this much of the budget is left
+FALLBACK_MODEL_THRESHOLD_SECONDS = float(os.getenv('GROQ_FALLBACK_THRESHOLD_SECONDS', 4.0))
+# LLM time a turn keeps out of its budget while waiting for a slot (at most half the budget);
+# a turn with less left once it gets one sends the busy reply instead of a call that cannot finish
+LLM_MIN_WINDOW_SECONDS = float(os.getenv('LLM_MIN_WINDOW_SECONDS', FALLBACK_MODEL_THRESHOLD_SECONDS))
+# Hedge after the observed p95 time-to-first-token, or this default until enough turns are seen
+HEDGE_DEFAULT_DELAY_SECONDS = 1.5
+HEDGE_MIN_DELAY_SECONDS = 0.3
+HEDGE_MIN_SAMPLES = 20
+LLM_MAX_ATTEMPTS = 4
+BACKOFF_BASE_SECONDS = 0.25
+BACKOFF_MAX_SECONDS = 2.0
+
+hedged_requests_total = REGISTRY.counter('voicebot_llm_hedged_requests_total',
+                                         'Duplicate LLM requests sent on a second key')
+hedge_wins_total = REGISTRY.counter('voicebot_llm_hedge_wins_total',
+                                    'Hedged LLM requests that produced the first token before the original')
+model_requests_total = REGISTRY.counter('voicebot_llm_model_requests_total',
+                                        'LLM completions started, by model', labelnames=('model',))
+llm_retries_total = REGISTRY.counter('voicebot_llm_retries_total', 'LLM attempts retried after an error')
+vad_frames_total = REGISTRY.counter('voicebot_vad_frames_total',
+                                    'Audio frames run through voice activity detection')
+active_sessions = REGISTRY.gauge('voicebot_active_sessions', 'Socket.IO voice sessions held by this worker')
+# Always-on counters reported alongside each profile, as deltas over the profiled window
+HOT_PATH_COUNTERS = (vad_frames_total, synthesized_bytes_total, regex_passes_total)
+
+
+class LLMDeadlineExceeded(Exception):
+    """The turn's LLM latency budget ran out before a reply was produced"""
+
+
+def is_rate_limit_error(error):
+    import groq
+    if isinstance(error, groq.RateLimitError):
+        return True
+    error_message = str(error).lower()
+    return "rate limit" in error_message or "quota exceeded" in error_message
+
+
+def is_retryable_error(error):
+    import groq
+    return is_rate_limit_error(error) or isinstance(
+        error, (groq.InternalServerError, groq.APIConnectionError, groq.APITimeoutError))
+
+
 class VoicebotHandler:
-    def __init__(self):
-        self.api_key_manager = APIKeyManager()
+    def __init__(self, client_factory=None, api_key_manager=None, deadline=LLM_TURN_DEADLINE_SECONDS,
+                 hedging=True):
+        self.api_key_manager = api_key_manager or APIKeyManager()
+        if client_factory is None:
+            from groq import Groq
+            client_factory = Groq
+        self.client_factory = client_factory
+        self.deadline = deadline
+        self.hedging = hedging
         self.client = None
         self.sessions = {}
-
-    def get_groq_response(self, messages):
+        # Model and token usage of the most recent reply, for usage tracking
+        self.last_model = None
+        self.last_usage = None
+
+    def hedge_delay(self):
+        """How long to wait for a first token before sending a duplicate request"""
+        if stage_seconds.count(stage='llm_first_token') < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY_SECONDS
+        return max(HEDGE_MIN_DELAY_SECONDS, stage_seconds.quantile(0.95, stage='llm_first_token'))
+
+    def get_groq_response(self, messages, trace=None, deadline=None, max_tokens=500):
+        """Return the assistant reply within the latency budget.
+
+        Slow first tokens are hedged on a second key, the smaller model is raced
+        in once the budget runs low, and retryable errors back off with jitter."""
+        deadline_at = time.perf_counter() + (self.deadline if deadline is None else deadline)
+        attempt = 0
         while True:
-            try:
-                api_key = self.api_key_manager.get_api_key()
-                self.client = Groq(api_key=api_key)
-
-                # Make the API call
-                chat_completion = self.client.chat.completions.create(
-                    messages=messages,
-                    model="llama-3.3-70b-versatile",
-                    max_tokens=500,
-                    temperature=0.8
-                )
-
-                return chat_completion.choices[0].message.content
+            remaining = deadline_at - time.perf_counter()
+            if remaining <= 0:
+                raise LLMDeadlineExceeded("LLM deadline exceeded")
+            model = PRIMARY_MODEL if remaining > FALLBACK_MODEL_THRESHOLD_SECONDS else FALLBACK_MODEL
 
+            try:
+                return self._hedged_completion(messages, model, deadline_at, trace, max_tokens)
+            except (LLMDeadlineExceeded, NoAPIKeyAvailable):
+                raise
             except Exception as e:
-                error_message = str(e).lower()
-                if "rate limit" in error_message or "quota exceeded" in error_message:
-                    # Mark the current key as having an error
-                    self.api_key_manager.mark_key_error(api_key)
-                    print(f"API key rate limited, trying another key...")
-                    continue
-                else:
-                    # For other errors, raise them
+                attempt += 1
+                if not is_retryable_error(e) or attempt >= LLM_MAX_ATTEMPTS:
                     raise e
+                llm_retries_total.inc()
+                # Full jitter keeps retries from many sessions from synchronizing
+                backoff = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+                backoff = min(backoff, max(0.0, deadline_at - time.perf_counter()))
+                logging.warning(f"LLM attempt {attempt} failed ({e}), retrying in {backoff:.2f}s")
+                time.sleep(backoff)
+
+    def _hedged_completion(self, messages, model, deadline_at, trace, max_tokens):
+        events = queue.Queue()
+        cancels = []
+        models = []
+        keys = []
+
+        def launch(launch_model, other_key=False, wait=False):
+            """Start a request; other_key=True only uses a key no earlier request of this attempt used.
+
+            Only the first request may wait for a key out of cooldown (against the
+            deadline): hedges and fallbacks are launched from the loop that has to
+            keep reading replies, so without a free key they are skipped."""
+            timeout = max(0.0, deadline_at - time.perf_counter()) if wait else 0.0
+            api_key = self.api_key_manager.get_api_key(exclude=keys if other_key else (), timeout=timeout)
+            cancel = threading.Event()
+            cancels.append(cancel)
+            models.append(launch_model)
+            keys.append(api_key)
+            model_requests_total.inc(model=launch_model)
+            threading.Thread(target=self._stream_completion,
+                             args=(len(cancels) - 1, api_key, launch_model, messages, max_tokens, cancel, events),
+                             daemon=True).start()
+
+        def cancel_others(keep):
+            for index, cancel in enumerate(cancels):
+                if index != keep:
+                    cancel.set()
+
+        launch(model, wait=True)
+        if trace is not None:
+            trace.mark('key_acquire')
+
+        hedge_at = time.perf_counter() + self.hedge_delay() if self.hedging else None
+        # A primary request that is still silent this close to the deadline gets the fallback model raced against it
+        fallback_at = deadline_at - FALLBACK_MODEL_THRESHOLD_SECONDS if model != FALLBACK_MODEL else None
+        winner = None
+        failures = 0
+        last_error = None
+        while True:
+            now = time.perf_counter()
+            wake_at = deadline_at
+            if winner is None:
+                wake_at = min([wake_at] + [at for at in (hedge_at, fallback_at) if at is not None])
+            try:
+                kind, index, payload = events.get(timeout=max(0.0, wake_at - now))
+            except queue.Empty:
+                now = time.perf_counter()
+                if now >= deadline_at:
+                    cancel_others(None)
+                    raise LLMDeadlineExceeded(f"No reply from {model} before the deadline")
+                if fallback_at is not None and now >= fallback_at:
+                    fallback_at = None
+                    hedge_at = None
+                    logging.info(f"No first token from {model} with the budget running low, racing {FALLBACK_MODEL}")
+                    try:
+                        try:
+                            launch(FALLBACK_MODEL, other_key=True)
+                        except NoAPIKeyAvailable:
+                            launch(FALLBACK_MODEL)
+                    except NoAPIKeyAvailable as e:
+                        logging.warning(f"Could not race {FALLBACK_MODEL}: {e}")
+                    continue
+                # The first token is late: race a duplicate request on another key
+                hedge_at = None
+                try:
+                    launch(model, other_key=True)
+                except NoAPIKeyAvailable:
+                    logging.info(f"No first token from {model} yet, but no second key to hedge on")
+                    if failures == len(cancels):
+                        cancel_others(None)
+                        raise last_error
+                    continue
+                hedged_requests_total.inc()
+                logging.info(f"No first token from {model} yet, sent hedged request")
+                continue
+
+            if kind == 'first_token':
+                if winner is None:
+                    winner = index
+                    hedge_at = None
+                    fallback_at = None
+                    cancel_others(winner)
+                    if index > 0:
+                        hedge_wins_total.inc()
+                    if trace is not None:
+                        trace.mark('llm_first_token')
+            elif kind == 'done':
+                if winner is None or winner == index:
+                    cancel_others(index)
+                    if trace is not None:
+                        if winner is None:
+                            trace.mark('llm_first_token')
+                        trace.mark('llm_done')
+                    text, self.last_usage = payload
+                    self.last_model = models[index]
+                    return text
+            elif kind == 'error':
+                failures += 1
+                last_error = payload
+                if winner == index or (failures == len(cancels) and hedge_at is None):
+                    # Errors go back to get_groq_response to be retried with backoff
+                    cancel_others(None)
+                    raise payload
+                if failures == len(cancels):
+                    # Don't wait for the hedge timer when the only request already failed
+                    hedge_at = time.perf_counter()
+
+    def _stream_completion(self, index, api_key, model, messages, max_tokens, cancel, events):
+        """Run one streaming completion, reporting its first token and result on `events`"""
+        try:
+            client = self.client_factory(api_key=api_key)
+            stream = client.chat.completions.create(
+                messages=messages,
+                model=model,
+                max_tokens=max_tokens,
+                temperature=0.8,
+                stream=True
+            )
+
+            parts = []
+            usage = None
+            try:
+                for chunk in stream:
+                    if cancel.is_set():
+                        return
+                    # Groq reports token usage on the final chunk
+                    chunk_usage = getattr(getattr(chunk, 'x_groq', None), 'usage', None) or getattr(chunk, 'usage', None)
+                    if chunk_usage is not None:
+                        usage = {field: getattr(chunk_usage, field, None)
+                                 for field in ('prompt_tokens', 'completion_tokens', 'total_tokens')}
+                    if not chunk.choices:
+                        continue
+                    content = chunk.choices[0].delta.content
+                    if content:
+                        if not parts:
+                            events.put(('first_token', index, None))
+                        parts.append(content)
+            finally:
+                close = getattr(stream, 'close', None)
+                if close is not None:
+                    close()
+
+            events.put(('done', index, (''.join(parts), usage)))
+
+        except Exception as e:
+            if is_rate_limit_error(e):
+                # Mark the current key as having an error
+                self.api_key_manager.mark_key_error(api_key)
+                logging.warning("API key rate limited, trying another key...")
+            events.put(('error', index, e))
 
 
 # Initialize the chat history
@@ -84,6 +313,17 @@ chat_history = [
     }
 ]
 
+# Response cache for repeated questions, consulted before calling the LLM
+response_cache = ResponseCache(
+    max_entries=int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 256)),
+    ttl_seconds=int(os.getenv('RESPONSE_CACHE_TTL_SECONDS', 3600)),
+    similarity_threshold=float(os.getenv('RESPONSE_CACHE_SIMILARITY')) if os.getenv('RESPONSE_CACHE_SIMILARITY') else None,
+    max_context_turns=int(os.getenv('RESPONSE_CACHE_MAX_CONTEXT_TURNS', 0))
+)
+
+# Seconds start_recording waits for a stopped session's STT thread to finish before refusing
+STT_STOP_TIMEOUT_SECONDS = 1.0
+
 # Audio recording parameters
 FORMAT = 'int16'
 CHANNELS = 1
@@ -96,10 +336,21 @@ VAD_MODE = 0
 
 
 class AudioStreamer:
-    def __init__(self):
+    def __init__(self, stream=None, ring=None):
         self.dev_mode = False
         self.audio = None
-        self.stream = None
+        self.stream = stream
+        # Set in callback capture mode: the stream's callback fills this FrameRingBuffer
+        self.ring = ring
+
+        if stream is not None:
+            # Audio arrives from the client (see audio_codecs.ClientAudioSource) or a
+            # synthetic source (capture.SyntheticStreamSource); no device to probe
+            import webrtcvad
+            self.vad = webrtcvad.Vad(VAD_MODE)
+            self.is_recording = False
+            self.frames = []
+            return
 
         try:
             # Try to initialize PyAudio
@@ -111,6 +362,8 @@ class AudioStreamer:
     def initialize_audio(self):
        """Separate initialization method with additional error checking"""
        try:
+           import sounddevice as sd
+           import webrtcvad
            # Get list of available devices
            devices = sd.query_devices()
            if len(devices) == 0:
@@ -132,12 +385,17 @@ class AudioStreamer:
                raise Exception("No working input devices found")
 
            # Initialize the actual stream
+           callback = None
+           if AUDIO_CAPTURE_MODE == 'callback':
+               self.ring = FrameRingBuffer.for_duration(RATE, CHUNK_DURATION_MS)
+               callback = self.ring.callback
            self.stream = sd.InputStream(
                samplerate=RATE,
                channels=CHANNELS,
                dtype='int16',
                device=input_device,
-               blocksize=CHUNK_SIZE
+               blocksize=CHUNK_SIZE,
+               callback=callback
            )
            self.stream.start()
 
@@ -149,7 +407,8 @@ class AudioStreamer:
            raise Exception(f"Audio initialization failed: {str(e)}")
 
 
-    def start_recording(self, stop_event):
+    def start_recording(self, stop_event, recorder=None):
+        """Yield one PCM utterance per VAD close; with a `recorder`, every frame and boundary is also recorded"""
         if self.dev_mode:
             logging.info("Running in development mode - audio capture disabled")
             # Simulate some activity in dev mode
@@ -163,15 +422,29 @@ class AudioStreamer:
 
         self.is_recording = True
         self.frames = []
+        if self.ring is not None:
+            yield from self._record_from_ring(stop_event, recorder)
+            return
+
         ring_buffer = collections.deque(maxlen=PADDING_CHUNKS)
         triggered = False
+        frame_no = 0
+        segment_start = 0
 
         while self.is_recording and not stop_event.is_set():
             try:
-                chunk, _ = self.stream.read(CHUNK_SIZE)
+                chunk, overflowed = self.stream.read(CHUNK_SIZE)
+                if overflowed:
+                    dropped_frames_total.inc(reason='input_overflow')
                 chunk = chunk.tobytes()
                 if not chunk:
                     continue
+                if recorder is not None:
+                    recorder.append_frame(chunk)
+                frame_no += 1
+                # Counted in batches to keep the lock off the per-frame path
+                if frame_no % REPORT_EVERY_FRAMES == 0:
+                    vad_frames_total.inc(REPORT_EVERY_FRAMES)
 
                 is_speech = self.vad.is_speech(chunk, RATE)
                 if not triggered:
@@ -179,6 +452,7 @@ class AudioStreamer:
                     num_voiced = len([f for f, speech in ring_buffer if speech])
                     if num_voiced > 0.9 * ring_buffer.maxlen:
                         triggered = True
+                        segment_start = frame_no - len(ring_buffer)
                         self.frames.extend([f for f, _ in ring_buffer])
                         ring_buffer.clear()
                 else:
@@ -187,12 +461,76 @@ class AudioStreamer:
                     num_unvoiced = len([f for f, speech in ring_buffer if not speech])
                     if num_unvoiced > 0.9 * ring_buffer.maxlen:
                         triggered = False
+                        if recorder is not None:
+                            recorder.mark_segment(segment_start, frame_no)
                         yield b''.join(self.frames)
                         self.frames = []
                         ring_buffer.clear()
             except Exception as e:
                 logging.error(f"Error during recording: {e}")
                 time.sleep(0.1)  # Prevent tight loop on error
+        # The rest of the last batch; a consumer that stops early loses at most one batch
+        vad_frames_total.inc(frame_no % REPORT_EVERY_FRAMES)
+
+    def _record_from_ring(self, stop_event, recorder=None):
+        """VAD loop over the callback ring buffer.
+
+        Frames are inspected in place; the padding window stays held in the
+        ring and audio is copied once, into the utterance being built."""
+        ring = self.ring
+        ring.attach_consumer()
+        padding = collections.deque()  # (frame, is_speech) held in the ring before the trigger
+        recent_speech = collections.deque(maxlen=PADDING_CHUNKS)
+        utterance = bytearray()
+        triggered = False
+        frame_no = 0
+        segment_start = 0
+
+        try:
+            while self.is_recording and not stop_event.is_set():
+                frame = ring.read_frame()
+                if frame is None:
+                    continue
+                if recorder is not None:
+                    recorder.append_frame(frame)
+                frame_no += 1
+                if frame_no % REPORT_EVERY_FRAMES == 0:
+                    vad_frames_total.inc(REPORT_EVERY_FRAMES)
+                try:
+                    is_speech = self.vad.is_speech(frame, RATE)
+                except Exception as e:
+                    # The callback keeps capturing meanwhile, so nothing is lost by skipping one frame
+                    logging.error(f"Error during recording: {e}")
+                    is_speech = False
+
+                if not triggered:
+                    padding.append((frame, is_speech))
+                    if len(padding) > PADDING_CHUNKS:
+                        padding.popleft()
+                        ring.release()
+                    num_voiced = len([f for f, speech in padding if speech])
+                    if num_voiced > 0.9 * PADDING_CHUNKS:
+                        triggered = True
+                        segment_start = frame_no - len(padding)
+                        for held, _ in padding:
+                            utterance += held
+                        padding.clear()
+                        ring.release_all()
+                else:
+                    utterance += frame
+                    ring.release()
+                    recent_speech.append(is_speech)
+                    num_unvoiced = len([speech for speech in recent_speech if not speech])
+                    if num_unvoiced > 0.9 * PADDING_CHUNKS:
+                        triggered = False
+                        if recorder is not None:
+                            recorder.mark_segment(segment_start, frame_no)
+                        yield bytes(utterance)
+                        utterance = bytearray()
+                        recent_speech.clear()
+        finally:
+            ring.detach_consumer()
+            vad_frames_total.inc(frame_no % REPORT_EVERY_FRAMES)
 
     def stop_recording(self):
         self.is_recording = False
@@ -207,6 +545,7 @@ class AudioStreamer:
             logging.error(f"Error closing audio resources: {e}")
 
 def enhance_audio(audio_segment):
+    from pydub.effects import normalize
     try:
         audio_segment = normalize(audio_segment)
         audio_segment = audio_segment.high_pass_filter(80)
@@ -218,6 +557,7 @@ def enhance_audio(audio_segment):
 
 
 def transcribe_audio(audio_data):
+    import speech_recognition as sr
     recognizer = sr.Recognizer()
     try:
         audio = sr.AudioData(audio_data, RATE, 2)
@@ -232,126 +572,433 @@ def transcribe_audio(audio_data):
         return ""
 
 
-def process_input(input_queue, output_queue, user_input_queue, socketio):
-    retry_attempts = 3
-    retry_delay = 5
-    voicebot_handler = VoicebotHandler()
+class VoicebotBackends:
+    """STT, LLM, TTS and audio capture implementations used by the voice turn loop.
+    Defaults are the production services; the benchmark harness swaps in fakes."""
+
+    def __init__(self, transcribe=None, llm_handler_factory=None, tts=None, audio_streamer_factory=None,
+                 scheduler=None, recorder=None, audio_recorder_factory=None, overload=None):
+        self.transcribe = transcribe or transcribe_audio
+        self.llm_handler_factory = llm_handler_factory or VoicebotHandler
+        self.speak = tts or speak
+        # None means the process-wide scheduler sized from the key pool
+        self.scheduler = scheduler
+        # None means the process-wide write-behind MongoDB recorder
+        self.recorder = recorder
+        # Called with the Socket.IO session id; None means one shared AudioStreamer
+        self.audio_streamer_factory = audio_streamer_factory
+        # Called with (session id, sample rate, frame bytes) to record raw session audio;
+        # None means the SESSION_AUDIO_RECORDING setting decides
+        if audio_recorder_factory is None and SESSION_AUDIO_RECORDING:
+            audio_recorder_factory = session_audio_recorder_factory()
+        self.audio_recorder_factory = audio_recorder_factory
+        # None means the process-wide controller watching the default scheduler and key pool
+        self.overload = overload
+
+
+class VoiceSession:
+    """Queues, stop flag and conversation history belonging to one Socket.IO connection"""
+
+    def __init__(self, session_id, audio_streamer=None, user_id=None):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.audio_streamer = audio_streamer
+        self.input_queue = queue.Queue()
+        self.output_queue = queue.Queue()
+        self.user_input_queue = queue.Queue()
+        self.stop_event = threading.Event()
+        self.chat_history = [dict(chat_history[0])]
+        self.processor_thread = None
+        # The session's continuous_stt thread; there is never more than one
+        self.stt_thread = None
+        # Set when the client streams its own audio (see configure_client_audio)
+        self.client_audio = None
+        self.uplink_codec = None
+        self.downlink_codec = None
+
+
+def configure_client_audio(voice_session, offer, socketio):
+    """Negotiate transport codecs from the client's connect offer and switch the session to client audio.
+
+    `offer` is {'uplink': [...], 'downlink': [...]}, codecs in client preference
+    order. Returns the agreed settings, or None to keep server-side capture."""
+    uplink = negotiate(offer.get('uplink'), 'uplink')
+    downlink = negotiate(offer.get('downlink'), 'downlink')
+    if uplink is None:
+        return None
+    try:
+        voice_session.uplink_codec = TimedCodec(get_codec(uplink, RATE, CHUNK_DURATION_MS))
+        voice_session.downlink_codec = TimedCodec(get_codec(downlink, RATE, CHUNK_DURATION_MS)) if downlink else None
+    except CodecUnavailable as e:
+        logging.warning(f"Codec negotiation failed, using server audio: {e}")
+        return None
+
+    voice_session.client_audio = ClientAudioSource(RATE)
+    voice_session.audio_streamer = AudioStreamer(stream=voice_session.client_audio)
+
+    if voice_session.downlink_codec is not None:
+        codec = voice_session.downlink_codec
+        session_id = voice_session.session_id
+
+        def send_audio(mp3):
+            socketio.emit('tts_audio', {'codec': codec.name, 'packets': codec.encode_mp3(mp3)}, to=session_id)
+
+        get_tts_engine(session_id).audio_sink = send_audio
+
+    logging.info(f"Client audio for {voice_session.session_id}: uplink={uplink}, downlink={downlink}")
+    return {'uplink': uplink, 'downlink': downlink, 'frame_ms': CHUNK_DURATION_MS, 'sample_rate': RATE}
+
+
+def record_turn(recorder, trace, document):
+    """Hand a turn to the recorder once its trace is finished, so TTS latencies are included"""
+    if trace is None:
+        recorder.record(document)
+        return
+
+    def on_finish(finished_trace):
+        # Seconds spent in each stage (since the previous mark), not time since the VAD close
+        document['latencies'] = {stage: round(seconds, 4) for stage, seconds in finished_trace.stage_durations().items()}
+        document['duration'] = finished_trace.duration
+        recorder.record(document)
+
+    trace.add_finish_callback(on_finish)
+
+
+def process_input(input_queue, output_queue, user_input_queue, socketio, history=None, session_id=None, backends=None,
+                  user_id=None):
+    history = chat_history if history is None else history
+    backends = backends or VoicebotBackends()
+    voicebot_handler = backends.llm_handler_factory()
+    scheduler = backends.scheduler or get_llm_scheduler()
+    recorder = backends.recorder or get_turn_recorder()
+    overload = backends.overload or get_overload_controller()
+
+    def turn_document(user_input, response, source):
+        return {
+            'session_id': session_id,
+            'user_id': user_id,
+            'user_input': user_input,
+            'response': response,
+            'source': source,
+            'model': getattr(voicebot_handler, 'last_model', None) if source == 'llm' else None,
+            'usage': getattr(voicebot_handler, 'last_usage', None) if source == 'llm' else None,
+        }
+
+    def reply(text, trace, level):
+        """Send the bot's reply to the client and, unless TTS is shed, speak it"""
+        if level >= TEXT_ONLY:
+            socketio.emit('message', {'text': text, 'isUser': False, 'textOnly': True}, to=session_id)
+            if trace is not None:
+                trace.finish()
+        else:
+            socketio.emit('message', {'text': text, 'isUser': False}, to=session_id)
+            backends.speak(text, trace, session_id=session_id)
 
     while True:
-        user_input = input_queue.get()
+        user_input, trace = input_queue.get()
         if user_input.lower() == "exit":
             break
 
+        level = overload.level()
+        if level >= REDUCED:
+            degraded_turns_total.inc(level=LEVEL_NAMES[level])
+        if trace is not None:
+            trace.add_finish_callback(overload.observe_trace)
+
         user_input_queue.put(user_input)
-        chat_history.append({"role": "user", "content": user_input})
+        history.append({"role": "user", "content": user_input})
+
+        cached_response = response_cache.get(user_input, history)
+        if cached_response is not None:
+            history.append({"role": "assistant", "content": cached_response})
+            record_turn(recorder, trace, turn_document(user_input, cached_response, 'cache'))
+            reply(cached_response, trace, level)
+            output_queue.put((user_input, cached_response))
+            continue
+
+        # One budget covers both the wait for an LLM slot and the call itself
+        if level >= REDUCED:
+            budget = OVERLOAD_LLM_DEADLINE_SECONDS
+        else:
+            budget = getattr(voicebot_handler, 'deadline', LLM_TURN_DEADLINE_SECONDS)
+        min_window = min(LLM_MIN_WINDOW_SECONDS, budget / 2)
+        budget_started = time.perf_counter()
+        try:
+            with scheduler.slot(session_id, timeout=min(scheduler.queue_timeout, budget - min_window)):
+                remaining = budget - (time.perf_counter() - budget_started)
+                if remaining < min_window:
+                    raise SchedulerTimeout(f"Only {remaining:.1f}s of the LLM budget left for session {session_id}")
+                if level >= REDUCED:
+                    # Shorter prompts and replies, and no long retry loops, so every session still gets an answer
+                    assistant_response = voicebot_handler.get_groq_response(
+                        trim_history(history, OVERLOAD_HISTORY_MESSAGES), trace,
+                        deadline=remaining, max_tokens=OVERLOAD_MAX_TOKENS)
+                else:
+                    assistant_response = voicebot_handler.get_groq_response(history, trace, deadline=remaining)
+        except SchedulerTimeout as e:
+            # Better a fast canned reply than a turn that hangs behind other sessions
+            logging.warning(f"{e}. Sending busy reply.")
+            history.append({"role": "assistant", "content": CANNED_BUSY_REPLY})
+            record_turn(recorder, trace, turn_document(user_input, CANNED_BUSY_REPLY, 'busy'))
+            reply(CANNED_BUSY_REPLY, trace, level)
+            output_queue.put((user_input, CANNED_BUSY_REPLY))
+            continue
+        except Exception as e:
+            logging.error(f"Groq API error: {e}")
+            error_message = "Sorry, the service is currently unavailable. Please try again later."
+            record_turn(recorder, trace, turn_document(user_input, error_message, 'error'))
+            socketio.emit('message', {'text': error_message, 'isUser': False}, to=session_id)
+            output_queue.put((user_input, error_message))
+            if trace is not None:
+                trace.finish()
+            continue
 
-        attempt = 0
-        while attempt < retry_attempts:
-            try:
-                assistant_response = voicebot_handler.get_groq_response(chat_history)
-                chat_history.append({"role": "assistant", "content": assistant_response})
+        # Shortened or fallback-model replies would otherwise keep being served after the overload is over
+        if level < REDUCED and getattr(voicebot_handler, 'last_model', PRIMARY_MODEL) == PRIMARY_MODEL:
+            response_cache.put(user_input, history, assistant_response)
+        history.append({"role": "assistant", "content": assistant_response})
+        record_turn(recorder, trace, turn_document(user_input, assistant_response, 'llm'))
 
-                # Emit bot response to frontend
-                socketio.emit('message', {'text': assistant_response, 'isUser': False})
+        # Emit bot response to frontend and send it to text-to-speech
+        reply(assistant_response, trace, level)
 
-                # Send response to text-to-speech
-                speak(assistant_response)
+        output_queue.put((user_input, assistant_response))
 
-                output_queue.put((user_input, assistant_response))
-                break
-            except groq.InternalServerError as e:
-                logging.error(f"Groq API error: {e}. Retrying in {retry_delay} seconds...")
-                attempt += 1
-                time.sleep(retry_delay)
 
-        if attempt == retry_attempts:
-            error_message = "Sorry, the service is currently unavailable. Please try again later."
-            socketio.emit('message', {'text': error_message, 'isUser': False})
-            output_queue.put((user_input, error_message))
+def shared_audio_streamer_factory():
+    """Factory handing every session one AudioStreamer, probing the audio device on first use"""
+    lock = threading.Lock()
+    shared = []
 
+    def factory(session_id):
+        with lock:
+            if not shared:
+                try:
+                    shared.append(AudioStreamer())
+                except Exception as e:
+                    logging.error(f"Failed to initialize AudioStreamer: {e}")
+                    shared.append(None)
+            return shared[0]
 
-def setup_voicebot_routes(app, socketio):
-    """Set up routes for the voicebot with authentication and usage tracking"""
+    return factory
 
-    input_queue = queue.Queue()
-    output_queue = queue.Queue()
-    user_input_queue = queue.Queue()
-    stop_event = threading.Event()
 
-    try:
-        audio_streamer = AudioStreamer()
-    except Exception as e:
-        logging.error(f"Failed to initialize AudioStreamer: {e}")
-        audio_streamer = None
+def setup_voicebot_routes(app, socketio, backends=None):
+    """Set up routes for the voicebot with authentication and usage tracking"""
+
+    backends = backends or VoicebotBackends()
+    # Session state stays in this worker; with several workers the load balancer must be sticky
+    sessions = {}
+    active_sessions.set_function(lambda: len(sessions))
 
+    if backends.audio_streamer_factory is None:
+        backends.audio_streamer_factory = shared_audio_streamer_factory()
 
     @app.route('/')
     @validate_session
     def voicebot_page():
         return render_template('voicebot.html')
 
+    @app.route('/metrics')
+    def metrics():
+        return Response(REGISTRY.render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+    def warm_audio_device():
+        audio_streamer = backends.audio_streamer_factory(None)
+        if audio_streamer is None or audio_streamer.dev_mode:
+            raise RuntimeError("No usable audio input device")
+
+    def run_warmup():
+        requested = request.args.get('subsystems')
+        subsystems = [name.strip() for name in requested.split(',')] if requested else None
+        report = warm_up(subsystems, extra={'audio_device': warm_audio_device})
+        status = 200 if all(result['ok'] for result in report.values()) else 503
+        return jsonify(report), status
+
+    @app.route('/warmup', methods=['POST'])
+    def warmup():
+        """Pre-initialize subsystems: POST /warmup?subsystems=tts,stt
+
+        Admins only, or a readiness probe sending WARMUP_TOKEN in the X-Warmup-Token header.
+        The server microphone is only probed when named (subsystems=audio_device), since
+        servers without one still serve dev mode and client-streamed audio."""
+        token = request.headers.get('X-Warmup-Token', '')
+        if WARMUP_TOKEN and hmac.compare_digest(token.encode(), WARMUP_TOKEN.encode()):
+            return run_warmup()
+        return admin_required(run_warmup)()
+
+    @app.route('/debug/profile')
+    @admin_required
+    def debug_profile():
+        """Sample every thread for ?seconds= and return collapsed stacks: /debug/profile?seconds=10&interval_ms=10
+
+        ?format=json adds the run's overhead and the hot-path counters over the
+        same window; ?idle=true keeps stacks of threads that are only waiting."""
+        try:
+            seconds = float(request.args.get('seconds', 10))
+            interval_ms = max(float(request.args.get('interval_ms', PROFILE_DEFAULT_INTERVAL_MS)),
+                              PROFILE_MIN_INTERVAL_MS)
+        except ValueError:
+            return jsonify({'error': 'seconds and interval_ms must be numbers'}), 400
+        # float() accepts "nan" and "inf": both fail these range checks, so they are rejected too
+        if not 0 < seconds <= PROFILE_MAX_SECONDS:
+            return jsonify({'error': f'seconds must be between 0 and {PROFILE_MAX_SECONDS:g}'}), 400
+        if not interval_ms <= PROFILE_MAX_INTERVAL_MS:
+            return jsonify({'error': f'interval_ms must be between {PROFILE_MIN_INTERVAL_MS} '
+                                     f'and {PROFILE_MAX_INTERVAL_MS:g}'}), 400
+
+        counters_before = {counter.name: counter.total() for counter in HOT_PATH_COUNTERS}
+        try:
+            result = profiler.profile(seconds, interval_ms / 1000,
+                                      include_idle=request.args.get('idle', 'false').lower() == 'true')
+        except ProfilerBusy as e:
+            return jsonify({'error': str(e)}), 409
+        logging.info(f"Profiled {result.samples} samples over {result.seconds:.1f}s "
+                     f"({result.overhead_seconds * 1000:.1f} ms spent sampling)")
+
+        if request.args.get('format') == 'json':
+            report = result.to_dict()
+            report['counters'] = {counter.name: counter.total() - counters_before[counter.name]
+                                  for counter in HOT_PATH_COUNTERS}
+            return jsonify(report)
+        return Response(result.collapsed(), content_type='text/plain; charset=utf-8')
+
     @socketio.on('connect')
     @validate_session
-    def handle_connect():
+    def handle_connect(auth=None):
         logging.info('Client connected')
+        voice_session = VoiceSession(request.sid, None, session.get('user_id'))
+        sessions[request.sid] = voice_session
+        # Clients that stream their own microphone offer codecs in the connect payload
+        if isinstance(auth, dict) and isinstance(auth.get('codecs'), dict):
+            negotiated = configure_client_audio(voice_session, auth['codecs'], socketio)
+            if negotiated is not None:
+                emit('codec', negotiated)
+                return
+        voice_session.audio_streamer = backends.audio_streamer_factory(request.sid)
         # Notify client if we're in development mode
-        if audio_streamer and audio_streamer.dev_mode:
+        if voice_session.audio_streamer and voice_session.audio_streamer.dev_mode:
             emit('dev_mode', {'message': 'Running in development mode - audio capture disabled'})
 
     @socketio.on('disconnect')
     @validate_session
     def handle_disconnect():
         logging.info('Client disconnected')
-        stop_event.set()
+        voice_session = sessions.pop(request.sid, None)
+        if voice_session:
+            voice_session.stop_event.set()
+            # Let the input processor thread exit instead of blocking forever
+            voice_session.input_queue.put(("exit", None))
+        release_tts_engine(request.sid)
+
+    @socketio.on('audio_chunk')
+    def handle_audio_chunk(payload):
+        """Uplink audio: one binary payload, or a list of packets (one Opus packet per frame)"""
+        # No per-chunk user lookup: only sessions validated on connect are in `sessions`
+        voice_session = sessions.get(request.sid)
+        if not voice_session or voice_session.client_audio is None:
+            return
+        packets = payload if isinstance(payload, list) else [payload]
+        try:
+            for packet in packets:
+                voice_session.client_audio.write(voice_session.uplink_codec.decode(packet))
+        except Exception as e:
+            logging.error(f"Failed to decode client audio: {e}")
 
     @socketio.on('start_recording')
     @validate_session
     def handle_start_recording():
-        if not audio_streamer:
+        voice_session = sessions.get(request.sid)
+        if not voice_session or not voice_session.audio_streamer:
             emit('error', {'message': 'Audio system not available'})
             return
 
-        logging.info('Starting voice recording')
-        stop_event.clear()
+        # Sessions already talking keep going; only new ones are turned away when overloaded
+        if voice_session.processor_thread is None and not (backends.overload or get_overload_controller()).admit():
+            logging.warning(f"Refusing new voice session {request.sid}: overloaded")
+            emit('overloaded', {'message': 'The assistant is at capacity right now. Please try again shortly.',
+                                'retry_after': OVERLOAD_RETRY_AFTER_SECONDS})
+            return
 
-        if not audio_streamer.dev_mode:
-            threading.Thread(target=continuous_stt,
-                             args=(input_queue, stop_event, audio_streamer, socketio),
-                             daemon=True).start()
+        stt_thread = voice_session.stt_thread
+        if stt_thread is not None and stt_thread.is_alive():
+            if not voice_session.stop_event.is_set():
+                logging.info('Voice recording already running')
+                return
+            # Stopped but still finishing its last utterance: two readers of one stream would split its frames
+            stt_thread.join(STT_STOP_TIMEOUT_SECONDS)
+            if stt_thread.is_alive():
+                emit('error', {'message': 'Still stopping the previous recording, please try again'})
+                return
 
-        threading.Thread(target=process_input,
-                         args=(input_queue, output_queue, user_input_queue, socketio),
-                         daemon=True).start()
+        logging.info('Starting voice recording')
+        voice_session.stop_event.clear()
+
+        if not voice_session.audio_streamer.dev_mode:
+            voice_session.stt_thread = threading.Thread(
+                target=continuous_stt,
+                args=(voice_session.input_queue, voice_session.stop_event,
+                      voice_session.audio_streamer, socketio, request.sid, backends),
+                daemon=True)
+            voice_session.stt_thread.start()
+
+        # One input processor per session, reused across start/stop cycles
+        if voice_session.processor_thread is None or not voice_session.processor_thread.is_alive():
+            voice_session.processor_thread = threading.Thread(
+                target=process_input,
+                args=(voice_session.input_queue, voice_session.output_queue, voice_session.user_input_queue,
+                      socketio, voice_session.chat_history, request.sid, backends, voice_session.user_id),
+                daemon=True)
+            voice_session.processor_thread.start()
 
     @socketio.on('stop_recording')
     @validate_session
     def handle_stop_recording():
         logging.info('Stopping voice recording')
-        stop_event.set()
-        if audio_streamer:
-            audio_streamer.stop_recording()
+        voice_session = sessions.get(request.sid)
+        if voice_session:
+            voice_session.stop_event.set()
+            if voice_session.audio_streamer:
+                voice_session.audio_streamer.stop_recording()
 
     return app
 
 
-def continuous_stt(input_queue, stop_event, audio_streamer, socketio):
+def continuous_stt(input_queue, stop_event, audio_streamer, socketio, session_id=None, backends=None):
     logging.info("Starting advanced continuous STT service with automatic speech detection.")
+    backends = backends or VoicebotBackends()
+    from pydub import AudioSegment
+    recorder = None
     try:
-        for audio_data in audio_streamer.start_recording(stop_event):
+        if backends.audio_recorder_factory is not None:
+            # May return None to leave this session unrecorded
+            recorder = backends.audio_recorder_factory(session_id, RATE, CHUNK_SIZE * 2)
+        recording = audio_streamer.start_recording(stop_event, recorder=recorder)
+        for audio_data in recording:
             if stop_event.is_set():
                 break
+            trace = TurnTrace(session_id=session_id)
             audio_segment = AudioSegment(data=audio_data, sample_width=2, frame_rate=RATE, channels=CHANNELS)
             enhanced_audio = enhance_audio(audio_segment)
-            user_input = transcribe_audio(enhanced_audio.raw_data)
+            trace.mark('enhance')
+            user_input = backends.transcribe(enhanced_audio.raw_data)
+            trace.mark('stt')
             if user_input:
-                input_queue.put(user_input)
-                socketio.emit('message', {'text': user_input, 'isUser': True})
+                input_queue.put((user_input, trace))
+                socketio.emit('message', {'text': user_input, 'isUser': True}, to=session_id)
 
     except KeyboardInterrupt:
         logging.info("Stopping STT service.")
+    except RingBusy as e:
+        # Another session is reading the shared device: leave its stream running
+        logging.warning(f"STT service not started for {session_id}: {e}")
+        socketio.emit('error', {'message': 'The audio input is in use by another session'}, to=session_id)
+        audio_streamer = None
     except Exception as e:
         logging.error(f"Error in STT service: {e}")
     finally:
-        audio_streamer.stop_recording()
-        audio_streamer.close()
-
+        if audio_streamer is not None:
+            audio_streamer.stop_recording()
+            audio_streamer.close()
+        if recorder is not None:
+            recorder.close()
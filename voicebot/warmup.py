@@ -0,0 +1,104 @@
+# warmup.py
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+from utils.metrics import REGISTRY
+
+# Shared secret that lets a readiness probe call /warmup without an admin login (off when empty)
+WARMUP_TOKEN = os.getenv('WARMUP_TOKEN', '')
+# A subsystem that failed to warm up is not tried again for this long
+WARMUP_RETRY_SECONDS = float(os.getenv('WARMUP_RETRY_SECONDS', 30))
+
+warmup_seconds = REGISTRY.gauge(
+    'voicebot_warmup_seconds',
+    'Time taken to initialize each subsystem on first use',
+    labelnames=('subsystem',)
+)
+
+
+def _warm_llm():
+    import groq  # noqa: F401
+
+
+def _warm_stt():
+    import speech_recognition  # noqa: F401
+    import pydub.effects  # noqa: F401
+    import webrtcvad  # noqa: F401
+
+
+def _warm_tts():
+    import edge_tts  # noqa: F401
+    import pygame  # noqa: F401
+    from .tts import tts_service
+    tts_service.start()
+
+
+def _warm_database():
+    from config.database import get_database
+    get_database()
+
+
+# Initializers in the order warm_up() runs them; each must be safe to call more than once
+SUBSYSTEMS = OrderedDict((
+    ('llm', _warm_llm),
+    ('stt', _warm_stt),
+    ('tts', _warm_tts),
+    ('database', _warm_database),
+))
+
+_results = {}
+_running = set()
+_lock = threading.Lock()  # guards _results and _running; never held while an initializer runs
+
+
+def _run(name, initializer):
+    started = time.perf_counter()
+    try:
+        initializer()
+        result = {'ok': True, 'seconds': 0.0, 'error': None}
+    except Exception as e:
+        logging.error(f"Warm-up of {name} failed: {e}")
+        result = {'ok': False, 'seconds': 0.0, 'error': str(e)}
+    result['seconds'] = round(time.perf_counter() - started, 4)
+    result['finished_at'] = time.monotonic()
+    warmup_seconds.set(result['seconds'], subsystem=name)
+    return result
+
+
+def warm_up(subsystems=None, extra=None):
+    """Initialize the named subsystems (all by default) and return {name: {'ok', 'seconds', 'error'}}.
+
+    Heavy imports, connections and device probes otherwise happen on first use;
+    calling this ahead of traffic moves that cost out of the first voice turn.
+    Subsystems that already warmed up successfully are not initialized again, one
+    that another caller is warming up is reported as not ready rather than waited
+    for, and one that failed is only retried after WARMUP_RETRY_SECONDS.
+    `extra` adds initializers that only the caller knows about (e.g. the audio
+    device); they run only when named in `subsystems`, never by default."""
+    initializers = OrderedDict(SUBSYSTEMS)
+    initializers.update(extra or {})
+    names = list(SUBSYSTEMS) if subsystems is None else [name for name in subsystems if name in initializers]
+
+    report = {}
+    for name in names:
+        with _lock:
+            result = _results.get(name)
+            if name in _running:
+                result = {'ok': False, 'seconds': 0.0, 'error': 'warm-up in progress'}
+            elif result is None or (not result['ok'] and
+                                    time.monotonic() - result['finished_at'] >= WARMUP_RETRY_SECONDS):
+                _running.add(name)
+                result = None
+        if result is None:
+            try:
+                result = _run(name, initializers[name])
+            finally:
+                with _lock:
+                    _running.discard(name)
+                    if result is not None:
+                        _results[name] = result
+        report[name] = {key: value for key, value in result.items() if key != 'finished_at'}
+    return report